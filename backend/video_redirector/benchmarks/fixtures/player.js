@@ -0,0 +1,141 @@
+// Stand-in for the HDRezka player with the DOM layout and network behaviour the Camoufox extractors rely on:
+// - #oframecdnplayer > pjsdiv[15] > pjsdiv[3] opens the settings menu (#cdnplayer_settings), whose first
+//   item ([fid="1"]) lists the qualities as [f2id] items; choosing one fetches that quality's manifest.m3u8
+// - #cdnplayer_control_cc > pjsdiv[3] toggles the subtitles menu ([f2id] items, header first, "off" last,
+//   the active one carries an svg); choosing one fetches its .vtt
+// - clicking a #translators-list item POSTs /ajax/get_cdn_series/ and switches the player to that dub
+(function () {
+    const QUALITY_PATHS = {"1": "360p", "2": "480p", "3": "720p", "4": "1080p", "5": "1080pUltra"};
+    const QUALITY_LABELS = {"1": "360p", "2": "480p", "3": "720p", "4": "1080p", "5": "1080p Ultra"};
+    const state = {filmId: null, translatorId: null, subtitles: [], activeSubtitle: -1, menu: null};
+
+    function el(tag, attrs, text) {
+        const node = document.createElement(tag);
+        Object.entries(attrs || {}).forEach(([name, value]) => node.setAttribute(name, value));
+        if (text) node.textContent = text;
+        return node;
+    }
+
+    function parseSubtitles(raw) {
+        if (!raw) return [];
+        return Array.from(raw.matchAll(/\[([^\]]+)\]([^,\[]+)/g)).map(m => ({lang: m[1], url: m[2]}));
+    }
+
+    function loadManifest(f2id) {
+        fetch(`/cdn/${state.translatorId}/${QUALITY_PATHS[f2id]}/manifest.m3u8`);
+    }
+
+    function loadSubtitle(index) {
+        state.activeSubtitle = index;
+        if (index >= 0 && state.subtitles[index]) fetch(state.subtitles[index].url);
+    }
+
+    function closeMenu() {
+        document.getElementById("cdnplayer_settings").innerHTML = "";
+        state.menu = null;
+    }
+
+    function openMenu(name) {
+        const menu = document.getElementById("cdnplayer_settings");
+        menu.innerHTML = "";
+        state.menu = name;
+        const list = el("pjsdiv");
+        menu.appendChild(list);
+
+        if (name === "settings") {
+            const quality = el("pjsdiv", {fid: "1"}, "Качество");
+            quality.addEventListener("click", () => openMenu("quality"));
+            list.appendChild(quality);
+        } else if (name === "quality") {
+            Object.keys(QUALITY_LABELS).forEach(f2id => {
+                const item = el("pjsdiv", {f2id}, QUALITY_LABELS[f2id]);
+                item.addEventListener("click", () => { closeMenu(); loadManifest(f2id); });
+                list.appendChild(item);
+            });
+        } else if (name === "subtitles") {
+            const labels = ["Субтитры", ...state.subtitles.map(s => s.lang), "Выключить"];
+            labels.forEach((label, index) => {
+                const item = el("pjsdiv", {f2id: `s${index}`});
+                const text = el("pjsdiv", {}, label);
+                text.style.float = "left";
+                item.appendChild(text);
+                if (index - 1 === state.activeSubtitle) {
+                    item.appendChild(el("pjsdiv")).appendChild(document.createElementNS("http://www.w3.org/2000/svg", "svg"));
+                }
+                item.addEventListener("click", () => {
+                    closeMenu();
+                    if (index > 0 && index <= state.subtitles.length) loadSubtitle(index - 1);
+                });
+                list.appendChild(item);
+            });
+        }
+    }
+
+    function render() {
+        const root = document.getElementById("oframecdnplayer");
+        root.innerHTML = "";
+        for (let i = 0; i < 14; i++) root.appendChild(el("pjsdiv"));
+
+        const controls = el("pjsdiv");
+        controls.appendChild(el("pjsdiv"));
+        controls.appendChild(el("pjsdiv"));
+        const settingsButton = el("pjsdiv", {title: "Настройки"});
+        settingsButton.addEventListener("click", () => openMenu("settings"));
+        controls.appendChild(settingsButton);
+        root.appendChild(controls);
+
+        const cc = el("pjsdiv", {id: "cdnplayer_control_cc"});
+        cc.appendChild(el("pjsdiv"));
+        cc.appendChild(el("pjsdiv"));
+        const ccButton = el("pjsdiv", {title: "Субтитры"});
+        ccButton.addEventListener("click", () => state.menu === "subtitles" ? closeMenu() : openMenu("subtitles"));
+        cc.appendChild(ccButton);
+        root.appendChild(cc);
+
+        root.appendChild(el("pjsdiv", {id: "cdnplayer_settings"}));
+        updateSubtitleControl();
+    }
+
+    function updateSubtitleControl() {
+        document.getElementById("cdnplayer_control_cc").style.display = state.subtitles.length ? "block" : "none";
+    }
+
+    function switchTranslator(item) {
+        const body = new URLSearchParams({
+            id: state.filmId,
+            translator_id: item.dataset.translator_id,
+            is_camrip: item.dataset.camrip || "0",
+            is_ads: item.dataset.ads || "0",
+            is_director: item.dataset.director || "0",
+            favs: (document.getElementById("ctrl_favs") || {}).value || "",
+            action: "get_movie",
+        });
+        fetch(`/ajax/get_cdn_series/?t=${Date.now()}`, {method: "POST", body, headers: {"X-Requested-With": "XMLHttpRequest"}})
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) return;
+                document.querySelectorAll("#translators-list .b-translator__item").forEach(li => li.classList.remove("active"));
+                item.classList.add("active");
+                state.translatorId = item.dataset.translator_id;
+                state.subtitles = parseSubtitles(data.subtitle);
+                closeMenu();
+                updateSubtitleControl();
+                loadSubtitle(state.subtitles.length ? 0 : -1);
+            });
+    }
+
+    document.addEventListener("click", event => {
+        const item = event.target.closest("#translators-list .b-translator__item");
+        if (item && !item.classList.contains("active")) switchTranslator(item);
+    });
+
+    window.sof = {tv: {
+        initCDNMoviesEvents(filmId, translatorId, camrip, ads, director, host, flag, options) {
+            state.filmId = filmId;
+            state.translatorId = String(translatorId);
+            state.subtitles = parseSubtitles(options && options.subtitle);
+            render();
+            loadSubtitle(state.subtitles.length ? 0 : -1);
+        },
+    }};
+})();
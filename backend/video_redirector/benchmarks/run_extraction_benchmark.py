@@ -0,0 +1,290 @@
+"""
+Offline extraction benchmark: runs the HTTP and Camoufox extractors against the stub origin and reports
+latency p50/p95, memory per extraction and throughput at each level of parallelism.
+
+    python -m backend.video_redirector.benchmarks.run_extraction_benchmark \\
+        --extractors http-watch,http-download,browser-watch,browser-download --parallel 1,2,4 --runs 8
+
+Browser extractors need the Camoufox binary (python -m camoufox fetch) and Redis (subtitle URLs are
+stored there; REDIS_HOST/REDIS_PORT as for the app). Run it before and after a change to the extractors
+or the browser pool and compare; --no-blocking shows what request blocking saves, --json keeps the
+numbers. Extraction cache, page cache and scheduler are bypassed: this measures the extractors and the pool only.
+
+--compare-blocking runs every browser extractor with request blocking on and off at each level and prints
+goto/total p50/p95 side by side, with the requests blocked (by reason) and what the stub origin served per
+extraction; those are the numbers to quote for what blocking saves.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import psutil
+
+from backend.video_redirector.benchmarks.stub_origin import movie_url, start_stub_origin
+from backend.video_redirector.utils.extraction_timing import EXTRACTION_TIMINGS
+
+logger = logging.getLogger(__name__)
+
+MEMORY_SAMPLE_INTERVAL_SECONDS = 0.1
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _tree_rss(process: psutil.Process) -> int:
+    """RSS of this process and everything it spawned (Playwright driver, Firefox processes)"""
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total
+
+
+class MemorySampler:
+    def __init__(self):
+        self._process = psutil.Process(os.getpid())
+        self.baseline = 0
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, _tree_rss(self._process))
+            await asyncio.sleep(MEMORY_SAMPLE_INTERVAL_SECONDS)
+
+    def start(self):
+        self.baseline = self.peak = _tree_rss(self._process)
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def build_extractors(lang: str, dub: str) -> Dict[str, dict]:
+    """name -> {"kind": timing kind or None, "run": async (url, task_id) -> ok, "browser": bool}"""
+
+    async def http_watch(url: str, task_id: str) -> bool:
+        from backend.video_redirector.hdrezka.hdrezka_ajax_extractor import fast_extract_to_watch
+        result = await fast_extract_to_watch(url, lang)
+        return bool(result and result.get(lang))
+
+    async def http_download(url: str, task_id: str) -> bool:
+        from backend.video_redirector.hdrezka.hdrezka_ajax_extractor import fast_extract_to_download
+        result = await fast_extract_to_download(url, dub, lang)
+        return bool(result and result.get("url"))
+
+    async def browser_watch(url: str, task_id: str) -> bool:
+        from backend.video_redirector.hdrezka.hdrezka_extract_to_watch import extract_from_hdrezka
+        result = await extract_from_hdrezka(url, lang, task_id)
+        dubs = (result or {}).get(lang) or {}
+        return bool(dubs) and all(d.get("all_m3u8") for d in dubs.values())
+
+    async def browser_download(url: str, task_id: str) -> bool:
+        from backend.video_redirector.hdrezka.hdrezka_extract_to_download import extract_to_download_from_hdrezka
+        result = await extract_to_download_from_hdrezka(url, dub, lang, task_id)
+        return bool(result and result.get("url"))
+
+    return {
+        "http-watch": {"kind": None, "run": http_watch, "browser": False},
+        "http-download": {"kind": None, "run": http_download, "browser": False},
+        "browser-watch": {"kind": "watch", "run": browser_watch, "browser": True},
+        "browser-download": {"kind": "download", "run": browser_download, "browser": True},
+    }
+
+
+async def run_level(name: str, run: Callable[[str, str], Awaitable[bool]], base_url: str,
+                    parallel: int, runs: int) -> dict:
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def one(index: int):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await run(movie_url(base_url, index), f"bench-{name}-{index}")
+            except Exception as e:
+                logger.warning(f"[bench-{name}-{index}] {type(e).__name__}: {e}")
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(runs)))
+    wall = time.perf_counter() - started
+    await sampler.stop()
+
+    concurrent = min(parallel, runs)
+    return {
+        "extractor": name,
+        "parallel": parallel,
+        "runs": runs,
+        "failures": failures,
+        "p50_seconds": _percentile(latencies, 0.5),
+        "p95_seconds": _percentile(latencies, 0.95),
+        "throughput_per_minute": round(len(latencies) / wall * 60, 1) if wall else None,
+        "peak_rss_mb": round(sampler.peak / 2 ** 20, 1),
+        "rss_per_extraction_mb": round(max(0, sampler.peak - sampler.baseline) / concurrent / 2 ** 20, 1),
+        "wall_seconds": round(wall, 2),
+    }
+
+
+def _fmt(value, suffix: str = "") -> str:
+    return "-" if value is None else (f"{value:.2f}{suffix}" if isinstance(value, float) else f"{value}{suffix}")
+
+
+def print_report(results: List[dict]):
+    header = f"{'extractor':<18}{'par':>4}{'runs':>6}{'fail':>6}{'p50':>9}{'p95':>9}{'per min':>10}{'peak MB':>10}{'MB/extr':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        name = r["extractor"] if r.get("blocking", True) else f"{r['extractor']} -blk"
+        print(f"{name:<18}{r['parallel']:>4}{r['runs']:>6}{r['failures']:>6}"
+              f"{_fmt(r['p50_seconds'], 's'):>9}{_fmt(r['p95_seconds'], 's'):>9}{_fmt(r['throughput_per_minute']):>10}"
+              f"{_fmt(r['peak_rss_mb']):>10}{_fmt(r['rss_per_extraction_mb']):>9}")
+        for step, numbers in (r.get("steps") or {}).items():
+            print(f"{'':<22}{step:<18} p50 {numbers['p50']:.2f}s  p95 {numbers['p95']:.2f}s")
+
+
+def print_blocking_comparison(results: List[dict]):
+    """Blocking on vs off for each browser extractor and level"""
+    paired = {}
+    for r in results:
+        if "blocking" in r:
+            paired.setdefault((r["extractor"], r["parallel"]), {})[r["blocking"]] = r
+    if not paired:
+        return
+    print()
+    header = (f"{'extractor':<18}{'par':>4}{'':>10}{'goto p50':>10}{'goto p95':>10}{'p50':>9}{'p95':>9}"
+              f"{'origin req':>12}{'origin MB':>11}  blocked")
+    print(header)
+    print("-" * len(header))
+    for (name, parallel), runs in paired.items():
+        for blocking in (True, False):
+            r = runs.get(blocking)
+            if not r:
+                continue
+            goto = (r.get("steps") or {}).get("goto") or {}
+            blocked = ", ".join(f"{reason} {count}" for reason, count in sorted(r.get("blocked_requests", {}).items()))
+            print(f"{name:<18}{parallel:>4}{'blocking' if blocking else 'no block':>10}"
+                  f"{_fmt(goto.get('p50'), 's'):>10}{_fmt(goto.get('p95'), 's'):>10}"
+                  f"{_fmt(r['p50_seconds'], 's'):>9}{_fmt(r['p95_seconds'], 's'):>9}"
+                  f"{_fmt(r.get('origin_requests_per_extraction')):>12}{_fmt(r.get('origin_mb_per_extraction')):>11}"
+                  f"  {blocked or '-'}")
+
+
+async def main_async(args) -> List[dict]:
+    from backend.video_redirector.config import EXTRACTION_REQUEST_BLOCKING_CONFIG, HDREZKA_FAST_PATH_CONFIG
+    from backend.video_redirector.hdrezka.hdrezka_page_cache import HDREZKA_PAGE_CACHE
+    from backend.video_redirector.utils.redis_client import RedisClient
+    await RedisClient.init()  # The app does this at startup; extractors store subtitle URLs in Redis
+    HDREZKA_FAST_PATH_CONFIG["enabled"] = True  # http-* extractors are the fast path itself
+    if args.no_blocking:
+        EXTRACTION_REQUEST_BLOCKING_CONFIG["enabled"] = False
+    blocking_default = EXTRACTION_REQUEST_BLOCKING_CONFIG["enabled"]
+
+    runner = None
+    base_url = args.origin
+    if not base_url:
+        runner, base_url = await start_stub_origin(latency_ms=args.latency_ms)
+    extractors = build_extractors(args.lang, args.dub)
+    selected = [name.strip() for name in args.extractors.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in extractors]
+    if unknown:
+        raise SystemExit(f"Unknown extractor(s) {unknown}, choose from {list(extractors)}")
+
+    results = []
+    pool = None
+    try:
+        if any(extractors[name]["browser"] for name in selected):
+            from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
+            pool = BROWSER_POOL
+            await pool.warm_up()  # Browser launch isn't part of an extraction
+
+        origin_stats = runner.app["stats"] if runner else None
+        for name in selected:
+            extractor = extractors[name]
+            for _ in range(args.warmup):
+                await extractor["run"](movie_url(base_url), f"bench-{name}-warmup")
+            compare = args.compare_blocking and extractor["browser"]
+            for parallel in args.parallel:
+                for blocking in ((True, False) if compare else (blocking_default,)):
+                    EXTRACTION_REQUEST_BLOCKING_CONFIG["enabled"] = blocking
+                    EXTRACTION_TIMINGS.reset()
+                    HDREZKA_PAGE_CACHE.clear()  # Every level fetches its pages, like first visits of a title
+                    if pool:
+                        pool.blocked_requests.clear()
+                    if origin_stats:
+                        origin_stats.update(requests=0, bytes=0)
+                    result = await run_level(name, extractor["run"], base_url, parallel, args.runs)
+                    if extractor["kind"]:
+                        result["steps"] = (EXTRACTION_TIMINGS.stats().get(extractor["kind"]) or {}).get("steps", {})
+                    if pool:
+                        result["browser_launches"] = pool.launches
+                        result["blocked_requests"] = dict(pool.blocked_requests)
+                    if origin_stats:
+                        result["origin_requests_per_extraction"] = round(origin_stats["requests"] / args.runs, 1)
+                        result["origin_mb_per_extraction"] = round(origin_stats["bytes"] / args.runs / 2 ** 20, 2)
+                    if compare:
+                        result["blocking"] = blocking
+                    results.append(result)
+            EXTRACTION_REQUEST_BLOCKING_CONFIG["enabled"] = blocking_default
+    finally:
+        if pool:
+            await pool.close()
+        await HDREZKA_PAGE_CACHE.close()
+        await RedisClient.close()
+        if runner:
+            await runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HDRezka extractors against a local stub origin")
+    parser.add_argument("--extractors", default="http-watch,http-download,browser-watch,browser-download")
+    parser.add_argument("--parallel", default="1,2,4", help="comma separated levels of parallel extractions")
+    parser.add_argument("--runs", type=int, default=8, help="extractions per extractor and level")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed extractions per extractor")
+    parser.add_argument("--lang", default="ru")
+    parser.add_argument("--dub", default="HDrezka Studio", help="dub the download extractors pick")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay the stub adds to every response")
+    parser.add_argument("--origin", help="use an already running stub origin instead of starting one")
+    parser.add_argument("--no-blocking", action="store_true", help="disable request blocking on extraction pages")
+    parser.add_argument("--compare-blocking", action="store_true",
+                        help="run browser extractors with and without request blocking and compare them")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    args.parallel = [int(level) for level in args.parallel.split(",") if level.strip()]
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    results = asyncio.run(main_async(args))
+    print_report(results)
+    print_blocking_comparison(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
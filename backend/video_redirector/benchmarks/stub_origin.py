@@ -0,0 +1,186 @@
+"""
+Local stand-in for HDRezka and its CDN, for benchmarking the extractors offline.
+
+Serves a movie page with the structure the extractors parse (translators list, player init with
+#h-encoded streams), a fake player (fixtures/player.js), /ajax/get_cdn_series/, manifests, segments,
+VTT subtitles, and the images/fonts/trailer a real page drags along (what request blocking saves).
+
+    python -m backend.video_redirector.benchmarks.stub_origin --port 8765 --latency-ms 40
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+from string import Template
+from typing import Optional
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+FILM_ID = 51234
+# (translator_id, name): the first is the page default; names cover the ru/uk/en dub matching rules
+TRANSLATORS = [
+    (56, "Дубляж"),
+    (111, "HDrezka Studio"),
+    (238, "ЛостФильм"),
+    (354, "Украинский дубляж"),
+    (110, "Оригинал (+субтитры)"),
+]
+QUALITIES = [("360p", "360p"), ("480p", "480p"), ("720p", "720p"), ("1080p", "1080p"), ("1080p Ultra", "1080pUltra")]
+SUBTITLE_LANGS = [("Русский", "ru"), ("English", "en")]
+
+POSTERS = 6
+POSTER_BYTES = 300 * 1024
+FONT_BYTES = 120 * 1024
+TRAILER_BYTES = 2 * 1024 * 1024
+SEGMENTS_PER_MANIFEST = 6
+SEGMENT_BYTES = 64 * 1024
+
+
+def encode_streams(streams: str) -> str:
+    """The player's '#h' obfuscation: base64 with //_// separated base64 noise spliced in"""
+    encoded = base64.b64encode(streams.encode()).decode()
+    noise = base64.b64encode(b"$$#").decode()
+    middle = len(encoded) // 2
+    return f"#h{encoded[:middle]}//_//{noise}{encoded[middle:]}"
+
+
+def streams_for(origin: str, translator_id: int) -> str:
+    return ",".join(
+        f"[{label}]{origin}/cdn/{translator_id}/{path}/manifest.mp4:hls:manifest.m3u8 or {origin}/cdn/{translator_id}/{path}/manifest.mp4"
+        for label, path in QUALITIES
+    )
+
+
+def subtitles_for(origin: str, translator_id: int) -> str:
+    return ",".join(f"[{label}]{origin}/subs/{translator_id}/{code}.vtt" for label, code in SUBTITLE_LANGS)
+
+
+def create_app(latency_ms: float = 0, subtitles: bool = True) -> web.Application:
+    with open(os.path.join(FIXTURES_DIR, "movie.html"), encoding="utf-8") as f:
+        page_template = Template(f.read())
+    with open(os.path.join(FIXTURES_DIR, "player.js"), encoding="utf-8") as f:
+        player_js = f.read()
+    poster = os.urandom(POSTER_BYTES)
+    font = os.urandom(FONT_BYTES)
+    trailer = os.urandom(TRAILER_BYTES)
+    segment = os.urandom(SEGMENT_BYTES)
+    stats = {"requests": 0, "bytes": 0}
+
+    @web.middleware
+    async def network(request: web.Request, handler):
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        response = await handler(request)
+        stats["requests"] += 1
+        stats["bytes"] += response.content_length or 0
+        return response
+
+    def origin(request: web.Request) -> str:
+        return f"{request.scheme}://{request.host}"
+
+    async def movie_page(request: web.Request):
+        default_id = TRANSLATORS[0][0]
+        items = "\n".join(
+            f'            <li title="{name}" class="b-translator__item{" active" if tr_id == default_id else ""}" '
+            f'data-translator_id="{tr_id}" data-camrip="0" data-ads="0" data-director="0">{name}</li>'
+            for tr_id, name in TRANSLATORS
+        )
+        html = page_template.substitute(
+            film_id=FILM_ID,
+            default_translator_id=default_id,
+            translators=items,
+            streams=encode_streams(streams_for(origin(request), default_id)),
+            subtitle=subtitles_for(origin(request), default_id) if subtitles else "",
+            posters="".join(f'<img src="/static/poster-{i}.jpg" alt="">' for i in range(POSTERS)),
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def get_cdn_series(request: web.Request):
+        form = await request.post()
+        try:
+            translator_id = int(form.get("translator_id", ""))
+        except ValueError:
+            translator_id = None
+        if form.get("action") != "get_movie" or translator_id not in {tr_id for tr_id, _ in TRANSLATORS}:
+            return web.json_response({"success": False, "message": "Bad translator"})
+        return web.json_response({
+            "success": True,
+            "message": "",
+            "url": encode_streams(streams_for(origin(request), translator_id)),
+            "subtitle": subtitles_for(origin(request), translator_id) if subtitles else False,
+            "quality": "720p",
+        })
+
+    async def manifest(request: web.Request):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:10", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(SEGMENTS_PER_MANIFEST):
+            lines += ["#EXTINF:10.0,", f"seg-{i}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        return web.Response(text="\n".join(lines), content_type="application/vnd.apple.mpegurl")
+
+    async def ts_segment(request: web.Request):
+        return web.Response(body=segment, content_type="video/mp2t")
+
+    async def vtt(request: web.Request):
+        code = request.match_info["code"]
+        cues = "\n\n".join(f"{i}\n00:00:{i:02d}.000 --> 00:00:{i + 1:02d}.000\nLine {i} ({code})" for i in range(1, 40))
+        return web.Response(text=f"WEBVTT\n\n{cues}\n", content_type="text/vtt")
+
+    async def static_file(request: web.Request):
+        name = request.match_info["name"]
+        if name == "player.js":
+            return web.Response(text=player_js, content_type="application/javascript")
+        if name.startswith("poster-"):
+            return web.Response(body=poster, content_type="image/jpeg")
+        if name == "font.woff2":
+            return web.Response(body=font, content_type="font/woff2")
+        if name == "trailer.mp4":
+            return web.Response(body=trailer, content_type="video/mp4")
+        raise web.HTTPNotFound()
+
+    async def origin_stats(request: web.Request):
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[network])
+    app["stats"] = stats
+    app.router.add_get("/films/{slug}", movie_page)
+    app.router.add_post("/ajax/get_cdn_series/", get_cdn_series)
+    app.router.add_get("/cdn/{translator}/{quality}/{name:manifest.*}", manifest)
+    app.router.add_get("/cdn/{translator}/{quality}/{segment:seg-\\d+\\.ts}", ts_segment)
+    app.router.add_get("/subs/{translator}/{code}.vtt", vtt)
+    app.router.add_get("/static/{name}", static_file)
+    app.router.add_get("/__stats", origin_stats)
+    return app
+
+
+async def start_stub_origin(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0,
+                            subtitles: bool = True) -> tuple:
+    """Start the stub in this event loop; returns (runner, base_url). Stop with `await runner.cleanup()`"""
+    runner = web.AppRunner(create_app(latency_ms, subtitles), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]  # port=0 picks a free one
+    return runner, f"http://{host}:{bound_port}"
+
+
+def movie_url(base_url: str, index: Optional[int] = None) -> str:
+    return f"{base_url}/films/bench-movie{f'-{index}' if index is not None else ''}.html"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the HDRezka stub origin")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--no-subtitles", action="store_true")
+    args = parser.parse_args()
+    print(f"Stub origin on http://{args.host}:{args.port}, movie page: {movie_url(f'http://{args.host}:{args.port}')}")
+    web.run_app(create_app(args.latency_ms, not args.no_subtitles), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ PREMIUM_USER_DOWNLOAD_LIMIT = 3
 MAX_CONCURRENT_DOWNLOADS = 2  
 MAX_CONCURRENT_MERGES_OF_TS_INTO_MP4 = 3  
 MAX_RETRIES_FOR_DOWNLOAD = 1
+HDREZKA_WATCH_DUB_CONCURRENCY = int(os.getenv("HDREZKA_WATCH_DUB_CONCURRENCY", "3")) # dubs of one title extracted at once (pages in the same browser context)
 
 PROXY_CONFIG = {
     "enabled": os.getenv("PROXY_ENABLED", "false").lower() == "true",
@@ -17,4 +18,142 @@ PROXY_CONFIG = {
     "rate_limit_wait_threshold": int(os.getenv("PROXY_RATE_LIMIT_WAIT_THRESHOLD", "7")), # if "wait to upload big file for 7 seconds" - reload proxy IP
     "rate_limit_detection_window": int(os.getenv("PROXY_RATE_LIMIT_DETECTION_WINDOW", "10")), # if "wait to upload big file for 7 seconds" happened in last 10 minutes - reload proxy IP
     "max_rate_limit_events": int(os.getenv("PROXY_MAX_RATE_LIMIT_EVENTS", "9")), # if "wait to upload big file for 7 seconds" happened in last 10 minutes 3 times - reload proxy IP
-}
\ No newline at end of file
+    "throughput_ewma_alpha": float(os.getenv("PROXY_THROUGHPUT_EWMA_ALPHA", "0.3")), # weight of the newest upload speed / connect latency sample per proxy
+    "probe_enabled": os.getenv("PROXY_PROBE_ENABLED", "false").lower() == "true", # periodically measure connect latency of idle proxies
+    "probe_interval_seconds": int(os.getenv("PROXY_PROBE_INTERVAL_SECONDS", "600")),
+    "probe_timeout_seconds": int(os.getenv("PROXY_PROBE_TIMEOUT_SECONDS", "10")),
+    "probe_target": os.getenv("PROXY_PROBE_TARGET", "149.154.167.51:443"), # Telegram DC2, what uploads actually connect to
+}
+
+# Upload account scheduler
+UPLOAD_ACCOUNT_WAIT_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_ACCOUNT_WAIT_TIMEOUT_SECONDS", "120")) # how long an upload waits for an idle account before sharing a busy one
+UPLOAD_STATS_FLUSH_INTERVAL_SECONDS = int(os.getenv("UPLOAD_STATS_FLUSH_INTERVAL_SECONDS", "30")) # cached upload counters are written to Postgres in batches this often
+UPLOAD_ACCOUNT_BALANCE_SLACK = int(os.getenv("UPLOAD_ACCOUNT_BALANCE_SLACK", "3")) # accounts within this many uploads today count as equally used, then the faster one wins
+
+# Shared (Redis) proxy/account health and account reservation leases
+UPLOAD_HEALTH_CONFIG = {
+    "sync_interval_seconds": int(os.getenv("UPLOAD_HEALTH_SYNC_INTERVAL_SECONDS", "2")), # push local changes / pull other workers' changes this often
+    "lease_ttl_seconds": int(os.getenv("UPLOAD_LEASE_TTL_SECONDS", "120")), # reservation of a crashed worker frees itself after this; live leases are renewed
+    "blacklist_ttl_hours": int(os.getenv("UPLOAD_PROXY_BLACKLIST_TTL_HOURS", "72")), # a blacklisted proxy gets another chance after this
+    "state_ttl_hours": int(os.getenv("UPLOAD_HEALTH_STATE_TTL_HOURS", "168")), # forget health of accounts that stopped being used
+}
+
+# Adaptive part count: split deliveries wider when idle upload accounts can take the parts in parallel
+MAX_PARTS_PER_DELIVERY = int(os.getenv("MAX_PARTS_PER_DELIVERY", "8")) # most video parts a user receives for one movie
+MIN_UPLOAD_PART_MB = int(os.getenv("MIN_UPLOAD_PART_MB", "300")) # never split a file into extra parts smaller than this
+MIN_MERGE_SEGMENTS_PER_PART = int(os.getenv("MIN_MERGE_SEGMENTS_PER_PART", "60")) # ~10 minutes of HLS per merged file at least
+UPLOAD_FILE_ATTEMPTS_PER_BOT = int(os.getenv("UPLOAD_FILE_ATTEMPTS_PER_BOT", "2")) # a failed merged file is retried this many times per delivery bot before moving to the next bot
+DELIVERY_BOT_UPLOAD_BALANCING = os.getenv("DELIVERY_BOT_UPLOAD_BALANCING", "true").lower() == "true" # start each delivery on the next bot of delivery_bots.json (round robin) instead of always the first
+
+# Warm pool of connected Pyrogram clients (pre-connect the accounts the scheduler will pick next)
+UPLOAD_WARM_POOL_CONFIG = {
+    "enabled": os.getenv("UPLOAD_WARM_POOL_ENABLED", "true").lower() == "true",
+    "interval_seconds": int(os.getenv("UPLOAD_WARM_POOL_INTERVAL_SECONDS", "15")),
+    "max_warm_clients": int(os.getenv("UPLOAD_WARM_POOL_MAX_CLIENTS", "4")), # idle accounts kept connected at most
+    "merge_lead_seconds": int(os.getenv("UPLOAD_WARM_POOL_MERGE_LEAD_SECONDS", "120")), # warm clients for merges finishing within this
+    "min_idle_seconds": int(os.getenv("UPLOAD_WARM_POOL_MIN_IDLE_SECONDS", "300")), # idle timeout in hours that are usually quiet
+    "max_idle_seconds": int(os.getenv("UPLOAD_WARM_POOL_MAX_IDLE_SECONDS", "1800")), # idle timeout in busy hours / while demand is pending
+    "hourly_ewma_alpha": float(os.getenv("UPLOAD_WARM_POOL_HOURLY_EWMA_ALPHA", "0.1")), # how fast the per-hour load profile adapts
+}
+
+# Pyrogram session storage: "file" opens the .session SQLite file per client, "memory" loads it once and writes back in the background
+PYROGRAM_SESSION_STORAGE = os.getenv("PYROGRAM_SESSION_STORAGE", "file").lower()
+PYROGRAM_SESSION_WRITEBACK_SECONDS = int(os.getenv("PYROGRAM_SESSION_WRITEBACK_SECONDS", "30"))
+
+# Bandwidth governor: one NIC budget shared by live viewing (proxy), Telegram uploads and merge downloads, in that priority
+BANDWIDTH_CONFIG = {
+    "total_mbps": float(os.getenv("BANDWIDTH_TOTAL_MBPS", "0")), # 0 disables the governor
+    "min_share": {
+        "upload": float(os.getenv("BANDWIDTH_MIN_SHARE_UPLOAD", "0.25")), # uploads always keep this share of total_mbps
+        "merge": float(os.getenv("BANDWIDTH_MIN_SHARE_MERGE", "0.1")),
+    },
+    "burst_seconds": float(os.getenv("BANDWIDTH_BURST_SECONDS", "2")), # bucket size, in seconds of the class' allowed rate
+    "process_check_interval_seconds": float(os.getenv("BANDWIDTH_PROCESS_CHECK_INTERVAL_SECONDS", "0.5")), # how often ffmpeg merges are metered
+    "redis_coordination": os.getenv("BANDWIDTH_REDIS_COORDINATION", "false").lower() == "true", # share demand between worker processes
+    "sync_interval_seconds": float(os.getenv("BANDWIDTH_SYNC_INTERVAL_SECONDS", "1")),
+}
+
+# Retention cache: finished MP4s stay on disk after upload so an expired file_id is re-uploaded without a new download
+RETENTION_CACHE_CONFIG = {
+    "enabled": os.getenv("RETENTION_CACHE_ENABLED", "false").lower() == "true",
+    "dir": os.getenv("RETENTION_CACHE_DIR", "retention_cache"), # must be on the same filesystem as downloads/ (files are hard-linked, not copied)
+    "max_gb": float(os.getenv("RETENTION_CACHE_MAX_GB", "50")), # least recently used titles are evicted above this
+}
+
+# Repair of expired file_ids: re-upload from the retention cache or re-download in the priority lane, then notify waiting users
+FILE_REPAIR_CONFIG = {
+    "enabled": os.getenv("FILE_REPAIR_ENABLED", "true").lower() == "true",
+    "lock_seconds": int(os.getenv("FILE_REPAIR_LOCK_SECONDS", "10800")), # one repair per title at a time; a stuck repair frees the title after this
+}
+
+# Warm Camoufox browsers for HDRezka extraction: each extraction gets a fresh context instead of launching Firefox
+CAMOUFOX_POOL_CONFIG = {
+    "enabled": os.getenv("CAMOUFOX_POOL_ENABLED", "true").lower() == "true",
+    "size": int(os.getenv("CAMOUFOX_POOL_SIZE", "2")), # browsers kept running
+    "pages_per_browser": int(os.getenv("CAMOUFOX_POOL_PAGES_PER_BROWSER", "2")), # concurrent extractions per browser
+    "max_uses": int(os.getenv("CAMOUFOX_POOL_MAX_USES", "50")), # relaunch a browser after this many extractions (memory creep)
+    "acquire_timeout": float(os.getenv("CAMOUFOX_POOL_ACQUIRE_TIMEOUT_SECONDS", "90")), # longest wait for a free browser
+    "max_waiters": int(os.getenv("CAMOUFOX_POOL_MAX_WAITERS", "20")), # extractions allowed to wait at once, others fail fast
+    "warm_on_startup": os.getenv("CAMOUFOX_POOL_WARM_ON_STARTUP", "true").lower() == "true",
+    "health_check_interval_seconds": int(os.getenv("CAMOUFOX_POOL_HEALTH_CHECK_INTERVAL_SECONDS", "60")),
+    "humanize": os.getenv("CAMOUFOX_HUMANIZE", "true").lower() == "true", # human-like cursor movement, slower clicks but fewer bot checks
+}
+
+# Requests extraction pages never need (only player scripts and m3u8/VTT responses matter), aborted by route interception.
+# Blocking can trip the site's anti-bot checks: every part can be switched off without a redeploy
+EXTRACTION_REQUEST_BLOCKING_CONFIG = {
+    "enabled": os.getenv("EXTRACTION_BLOCKING_ENABLED", "true").lower() == "true",
+    "resource_types": [t.strip() for t in os.getenv("EXTRACTION_BLOCKED_RESOURCE_TYPES", "image,media,font").split(",") if t.strip()], # playwright resource types; "stylesheet" breaks subtitle label detection
+    "hosts": [h.strip() for h in os.getenv(
+        "EXTRACTION_BLOCKED_HOSTS",
+        "googletagmanager.com,google-analytics.com,doubleclick.net,googlesyndication.com,adservice.google.com,"
+        "mc.yandex.ru,an.yandex.ru,yandex.ru/ads,counter.yadro.ru,top-fwz1.mail.ru,ad.mail.ru,adriver.ru,"
+        "betweendigital.com,mediametrics.ru,hotjar.com,connect.facebook.net"
+    ).split(",") if h.strip()], # ad and analytics hosts, subdomains included; "host/path" entries match a path prefix
+}
+
+# Shared cache of extracted HDRezka streams (url + lang + dub), read by watch and download before launching a browser
+EXTRACTION_CACHE_CONFIG = {
+    "enabled": os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true",
+    "default_ttl_seconds": int(os.getenv("EXTRACTION_CACHE_DEFAULT_TTL_SECONDS", "1800")), # stream URLs without a readable expiry
+    "max_ttl_seconds": int(os.getenv("EXTRACTION_CACHE_MAX_TTL_SECONDS", "14400")),
+    "min_ttl_seconds": int(os.getenv("EXTRACTION_CACHE_MIN_TTL_SECONDS", "300")), # URLs expiring sooner aren't cached
+    "expiry_margin_seconds": int(os.getenv("EXTRACTION_CACHE_EXPIRY_MARGIN_SECONDS", "1800")), # a merge/playback started from the cache must finish before the URL expires
+    "url_expiry_tz": os.getenv("EXTRACTION_CACHE_URL_EXPIRY_TZ", "Europe/Moscow"), # timezone of the YYYYMMDDHH expiry in CDN URLs
+}
+
+# Resolve HDRezka streams with plain HTTP calls to the player's AJAX endpoint; Camoufox only when that fails
+HDREZKA_FAST_PATH_CONFIG = {
+    "enabled": os.getenv("HDREZKA_FAST_PATH_ENABLED", "true").lower() == "true",
+    "timeout_seconds": float(os.getenv("HDREZKA_FAST_PATH_TIMEOUT_SECONDS", "10")), # whole fast path, page + AJAX calls
+}
+
+# Movie pages are fetched over one pooled HTTP session and kept briefly, /hd/alldubs and the fast path share them
+HDREZKA_PAGE_CACHE_CONFIG = {
+    "ttl_seconds": int(os.getenv("HDREZKA_PAGE_CACHE_TTL_SECONDS", "300")), # 0 disables; pages embed signed stream URLs, keep it short
+    "max_entries": int(os.getenv("HDREZKA_PAGE_CACHE_MAX_ENTRIES", "100")), # a movie page is ~100-300 KB
+    "timeout_seconds": float(os.getenv("HDREZKA_PAGE_TIMEOUT_SECONDS", "10")), # one page or AJAX request
+    "connection_limit": int(os.getenv("HDREZKA_PAGE_CONNECTION_LIMIT", "20")), # open connections of the shared session
+}
+
+# Admission of browser extractions: a global cap, interactive watch requests ahead of download-stage ones
+EXTRACTION_SCHEDULER_CONFIG = {
+    "max_concurrent": int(os.getenv("EXTRACTION_MAX_CONCURRENT", "4")), # browser extractions at once, keep <= pool size * pages_per_browser
+    "max_queue": int(os.getenv("EXTRACTION_MAX_QUEUE", "50")), # extractions allowed to wait for a slot, others fail fast
+    "default_duration_seconds": float(os.getenv("EXTRACTION_DEFAULT_DURATION_SECONDS", "30")), # ETA estimate until real durations are known
+}
+
+# Speculative extraction of the dub a user will most likely download, started while they look at the dub list
+EXTRACTION_PREFETCH_CONFIG = {
+    "enabled": os.getenv("EXTRACTION_PREFETCH_ENABLED", "true").lower() == "true",
+    "max_concurrent": int(os.getenv("EXTRACTION_PREFETCH_MAX_CONCURRENT", "1")), # and only while the scheduler has an idle slot
+}
+
+# Camoufox extractors wait for page signals (responses, selectors, DOM changes) instead of fixed sleeps; these cap each wait
+HDREZKA_BROWSER_WAIT_CONFIG = {
+    "page_ready_timeout_ms": int(os.getenv("HDREZKA_WAIT_PAGE_READY_MS", "5000")), # translators list or player after goto
+    "menu_timeout_ms": int(os.getenv("HDREZKA_WAIT_MENU_MS", "3000")), # player menu items to render after a click
+    "dub_switch_timeout_ms": int(os.getenv("HDREZKA_WAIT_DUB_SWITCH_MS", "8000")), # player reload after choosing a dub
+    "manifest_timeout_ms": int(os.getenv("HDREZKA_WAIT_MANIFEST_MS", "8000")), # m3u8 manifest after choosing a quality
+    "subtitle_timeout_seconds": float(os.getenv("HDREZKA_WAIT_SUBTITLE_SECONDS", "10")), # .vtt after choosing a subtitle
+}
@@ -52,6 +52,17 @@ async def create_indexes():
                 ON downloaded_file_parts (downloaded_file_id)
             """))
             
+            await db.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_content_hash_file_id 
+                ON content_hashes (telegram_file_id)
+            """))
+            
+            # Columns added after the tables were first created (create_all doesn't alter tables)
+            await db.execute(text("""
+                ALTER TABLE downloaded_file_parts
+                ADD COLUMN IF NOT EXISTS tg_bot_token_file_owner VARCHAR
+            """))
+            
             await db.commit()
             print("✅ Database indexes created successfully")
             
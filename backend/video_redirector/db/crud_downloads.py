@@ -1,7 +1,8 @@
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.video_redirector.db.models import DownloadedFile, DownloadedFilePart
-from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
+from backend.video_redirector.db.models import DownloadedFile, DownloadedFilePart, ContentHash
+from datetime import datetime, timezone
 
 QUALITY_PRIORITY = {
     "1080p": 4,
@@ -24,6 +25,9 @@ async def get_file_id(session: AsyncSession, tmdb_id: int, lang: str, dub: str):
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
+async def get_downloaded_file(session: AsyncSession, db_id: int):
+    return await session.get(DownloadedFile, db_id)
+
 async def get_youtube_file_id(session: AsyncSession, tmdb_id: int, video_url: str):
     """Get existing YouTube file by tmdb_id and video_url"""
     stmt = select(DownloadedFile).where(
@@ -68,14 +72,19 @@ async def cleanup_expired_file(session: AsyncSession, telegram_file_id: str):
         dict: Cleanup result with details about what was deleted
     """
     try:
+        # Never hand the expired file_id out again for identical content
+        await session.execute(delete(ContentHash).where(ContentHash.telegram_file_id == telegram_file_id))
+
         # First, find the DownloadedFilePart with the expired telegram_file_id
+        # (deduplicated uploads can share one file_id between several downloaded files)
         stmt = select(DownloadedFilePart).where(
             DownloadedFilePart.telegram_file_id == telegram_file_id
         )
         result = await session.execute(stmt)
-        file_part = result.scalar_one_or_none()
+        file_part = result.scalars().first()
         
         if not file_part:
+            await session.commit()
             return {
                 "success": False,
                 "message": f"No file part found with telegram_file_id: {telegram_file_id}",
@@ -84,6 +93,16 @@ async def cleanup_expired_file(session: AsyncSession, telegram_file_id: str):
             }
         
         downloaded_file_id = file_part.downloaded_file_id
+        downloaded_file = await session.get(DownloadedFile, downloaded_file_id)
+        # What was lost, so the caller can get it back (retention cache, re-download)
+        file_info = {
+            "tmdb_id": downloaded_file.tmdb_id,
+            "lang": downloaded_file.lang,
+            "dub": downloaded_file.dub,
+            "movie_url": downloaded_file.movie_url,
+            "movie_title": downloaded_file.movie_title,
+            "movie_poster": downloaded_file.movie_poster,
+        } if downloaded_file else {}
         
         # Delete all parts for this downloaded file
         delete_parts_stmt = delete(DownloadedFilePart).where(
@@ -107,7 +126,8 @@ async def cleanup_expired_file(session: AsyncSession, telegram_file_id: str):
             "message": f"Successfully cleaned up expired file ID: {telegram_file_id}",
             "deleted_parts": deleted_parts_count,
             "deleted_file": deleted_file_count > 0,
-            "downloaded_file_id": downloaded_file_id
+            "downloaded_file_id": downloaded_file_id,
+            **file_info
         }
         
     except Exception as e:
@@ -147,15 +167,21 @@ async def update_file_part_file_id(session: AsyncSession, old_telegram_file_id:
             DownloadedFilePart.telegram_file_id == old_telegram_file_id
         )
         result = await session.execute(stmt)
-        part = result.scalar_one_or_none()
-        if not part:
+        parts = result.scalars().all()
+        if not parts:
             return {
                 "success": False,
                 "message": f"No file part found with telegram_file_id: {old_telegram_file_id}",
                 "updated": False
             }
 
-        part.telegram_file_id = new_telegram_file_id
+        # Deduplicated uploads can share one file_id between several downloaded files
+        for shared_part in parts:
+            shared_part.telegram_file_id = new_telegram_file_id
+        hashes = await session.execute(select(ContentHash).where(ContentHash.telegram_file_id == old_telegram_file_id))
+        for content_hash in hashes.scalars().all():
+            content_hash.telegram_file_id = new_telegram_file_id
+        part = parts[0]
         await session.commit()
 
         return {
@@ -167,4 +193,32 @@ async def update_file_part_file_id(session: AsyncSession, old_telegram_file_id:
         }
     except Exception as e:
         await session.rollback()
-        raise e
\ No newline at end of file
+        raise e
+
+async def get_file_id_by_content_hash(session: AsyncSession, content_hash: str, bot_token: str):
+    stmt = select(ContentHash.telegram_file_id).where(
+        ContentHash.content_hash == content_hash,
+        ContentHash.tg_bot_token_file_owner == bot_token
+    )
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def save_content_hash(session: AsyncSession, content_hash: str, bot_token: str, telegram_file_id: str,
+                            size_bytes: int | None = None):
+    """Insert or refresh the file_id uploaded for this content and bot"""
+    try:
+        stmt = insert(ContentHash).values(
+            content_hash=content_hash,
+            tg_bot_token_file_owner=bot_token,
+            telegram_file_id=telegram_file_id,
+            size_bytes=size_bytes,
+            created_at=datetime.now(timezone.utc)
+        ).on_conflict_do_update(
+            constraint="uq_content_hash_bot",
+            set_={"telegram_file_id": telegram_file_id, "size_bytes": size_bytes}
+        )
+        await session.execute(stmt)
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        raise e
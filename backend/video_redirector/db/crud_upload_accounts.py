@@ -2,7 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from backend.video_redirector.db.models import UploadAccountStats
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 import logging
 
 logger = logging.getLogger(__name__)
@@ -72,6 +72,51 @@ async def increment_uploads(db: AsyncSession, session_name: str, error: Optional
             pass
         return None
 
+async def increment_uploads_batch(db: AsyncSession, upload_counts: Dict[str, int]) -> bool:
+    """Apply several accounts' pending upload increments in a single transaction"""
+    if not upload_counts:
+        return True
+    try:
+        result = await db.execute(
+            select(UploadAccountStats).where(UploadAccountStats.session_name.in_(list(upload_counts.keys())))
+        )
+        existing = {stats.session_name: stats for stats in result.scalars().all()}
+        today = date.today()
+        now = datetime.now()
+
+        for session_name, count in upload_counts.items():
+            stats = existing.get(session_name)
+            if stats is None:
+                stats = UploadAccountStats(
+                    session_name=session_name,
+                    last_upload_date=today,
+                    total_uploads=0,
+                    today_uploads=0
+                )
+                db.add(stats)
+
+            if getattr(stats, 'last_upload_date', None) != today:
+                setattr(stats, 'today_uploads', 0)
+                setattr(stats, 'last_upload_date', today)
+
+            current_total = getattr(stats, 'total_uploads', 0) or 0
+            current_today = getattr(stats, 'today_uploads', 0) or 0
+
+            setattr(stats, 'total_uploads', current_total + count)
+            setattr(stats, 'today_uploads', current_today + count)
+            setattr(stats, 'last_upload_time', now)
+
+        await db.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Database error in increment_uploads_batch: {e}")
+        # Try to rollback
+        try:
+            await db.rollback()
+        except:
+            pass
+        return False
+
 async def get_least_used_accounts_today(db: AsyncSession) -> List[UploadAccountStats]:
     try:
         result = await db.execute(
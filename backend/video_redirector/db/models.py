@@ -76,6 +76,22 @@ class DownloadedFilePart(Base):
     downloaded_file_id = Column(Integer, ForeignKey("downloaded_files.id", ondelete="CASCADE"), nullable=False)
     part_number = Column(Integer, nullable=False)
     telegram_file_id = Column(Text, nullable=False)
+    tg_bot_token_file_owner = Column(String, nullable=True)  # set only when a different bot than the file's owns this part
+
+class ContentHash(Base):
+    """Telegram file_id of already uploaded media, keyed by the hash of its packets (see content_hash_index)"""
+    __tablename__ = "content_hashes"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "tg_bot_token_file_owner", name="uq_content_hash_bot"),
+        Index("idx_content_hash_file_id", "telegram_file_id"),  # Fast cleanup of expired file IDs
+    )
+
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    tg_bot_token_file_owner = Column(String, nullable=False)  # file_ids only work for the bot that received the upload
+    telegram_file_id = Column(Text, nullable=False)
+    size_bytes = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 class UploadAccountStats(Base):
     __tablename__ = "upload_account_stats"
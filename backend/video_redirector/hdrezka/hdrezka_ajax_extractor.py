@@ -0,0 +1,281 @@
+import asyncio
+import base64
+import html as html_lib
+import json
+import logging
+import re
+import time
+from itertools import product
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlparse
+
+import aiohttp
+
+from backend.video_redirector.config import HDREZKA_FAST_PATH_CONFIG
+from backend.video_redirector.exceptions import TrailerOnlyContentError
+from backend.video_redirector.hdrezka.hdrezka_page_cache import HDREZKA_PAGE_CACHE, USER_AGENT
+from backend.video_redirector.utils.extraction_cache import DOWNLOAD_QUALITY_PREFERENCE, normalize_dub
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# Browserless stream resolution: the player gets its streams from /ajax/get_cdn_series/, we ask it directly.
+# Every failure returns None so callers fall back to the Camoufox extractors.
+
+_TRANSLATOR_ITEM = re.compile(r'<(li|a)\b([^>]*\bdata-translator_id="(\d+)"[^>]*)>(.*?)</\1>', re.S)
+_MOVIE_INIT = re.compile(r"initCDNMoviesEvents\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)")
+_SERIES_INIT = re.compile(r"initCDNSeriesEvents\(")
+_EMBEDDED_STREAMS = re.compile(r'"streams"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_EMBEDDED_SUBTITLES = re.compile(r'"subtitle"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_FAVS = re.compile(r'id="ctrl_favs"[^>]*value="([^"]*)"')
+_BRACKETED = re.compile(r"\[([^\]]+)\]([^\[]+)")
+_TAGS = re.compile(r"<[^>]+>")
+
+# Base64 of every 2-3 char combination of these is spliced into the stream list as noise
+_TRASH_CODES = sorted(
+    (base64.b64encode("".join(chars).encode()).decode()
+     for size in (2, 3) for chars in product("@#!^$", repeat=size)),
+    key=len, reverse=True
+)
+
+
+def decode_streams(encoded: str) -> str:
+    """'#h<base64 with //_// separated noise>' -> '[360p]https://... or https://...,[480p]...'"""
+    if not encoded.startswith("#h"):
+        return encoded
+    data = "".join(encoded[2:].split("//_//"))
+    for code in _TRASH_CODES:
+        data = data.replace(code, "")
+    return base64.b64decode(data + "==").decode("utf-8", errors="ignore")
+
+
+def parse_stream_variants(decoded: str) -> List[dict]:
+    """[{"quality", "url"}] with the HLS manifest of each quality the account can play"""
+    variants = []
+    for label, urls in _BRACKETED.findall(decoded):
+        candidates = [u.strip().rstrip(",") for u in urls.split(" or ")]
+        candidates = [u for u in candidates if u.startswith("http")]
+        if not candidates:
+            continue  # premium-only quality
+        url = next((u for u in candidates if u.endswith(".m3u8")), candidates[0])
+        variants.append({"quality": label.replace(" ", ""), "url": url})
+    return variants
+
+
+def parse_subtitles(raw) -> List[tuple]:
+    """'[Русский]https://...vtt,[English]https://...vtt' -> [(lang, url)]"""
+    if not raw or not isinstance(raw, str):
+        return []
+    return [(lang.strip(), url.strip().rstrip(",")) for lang, url in _BRACKETED.findall(raw) if url.strip().startswith("http")]
+
+
+def _unescape_js(value: str) -> str:
+    return json.loads(f'"{value}"')
+
+
+def match_translators(translators: List[dict], user_lang: str) -> List[dict]:
+    """Same dub choice get_matching_dubs makes in the browser, on the parsed translators list"""
+    matching = []
+    for tr in translators:
+        markup = tr["html"]
+        if user_lang == "uk" and ("Украинский" in markup or "Оригинал" in markup or "Original" in markup):
+            matching.append(tr)
+        elif user_lang == "en" and ("Оригинал" in markup or "Original" in markup):
+            return [tr]
+        elif user_lang == "ru":
+            if "Украинский" in markup:
+                continue
+            if "Оригинал" in markup or "Original" in markup:
+                matching.append(tr)
+            if "HDrezka" in markup or "Дубляж" in markup:
+                matching.append(tr)
+            elif any(x in markup.lower() for x in ["лостфильм", "колдфильм", "tvshows"]):
+                matching.append(tr)
+    if not matching:
+        return translators[:1]
+    if user_lang == "uk" and len(matching) == 1:
+        name = matching[0]["name"].lower()
+        if "оригинал" in name or "original" in name:
+            matching.append(translators[0])
+    return matching
+
+
+class HdrezkaAjaxClient:
+    """One movie page plus its get_cdn_series calls, sharing cookies like the player does"""
+
+    def __init__(self, session: aiohttp.ClientSession, page_url: str):
+        self.session = session
+        self.page_url = page_url
+        parsed = urlparse(page_url)
+        self.origin = f"{parsed.scheme}://{parsed.netloc}"
+        self.film_id: Optional[str] = None
+        self.default_translator: Optional[dict] = None
+        self.translators: List[dict] = []
+        self.favs = ""
+        self.embedded_streams: Optional[str] = None
+        self.embedded_subtitles: Optional[str] = None
+
+    @property
+    def stream_headers(self) -> Dict[str, str]:
+        # What merge/proxy requests send to the CDN
+        return {"User-Agent": USER_AGENT, "Referer": f"{self.origin}/", "Origin": self.origin}
+
+    async def load_page(self, page: Optional[str] = None) -> bool:
+        """Parse the movie page, `page` if the caller already has its HTML, else from HDREZKA_PAGE_CACHE"""
+        if page is None:
+            page = await HDREZKA_PAGE_CACHE.get(self.page_url)
+            if page is None:
+                logger.info("⚡ Fast path: movie page unavailable")
+                return False
+
+        if _SERIES_INIT.search(page):
+            return False  # Series need season/episode navigation, left to the browser
+        init = _MOVIE_INIT.search(page)
+        if not init:
+            if "youtube.com/embed" in page and "translators-list" not in page:
+                raise TrailerOnlyContentError("Trailer-only content: movie not found")
+            logger.info("⚡ Fast path: player init not found on the page")
+            return False
+        self.film_id, translator_id, camrip, ads, director = init.groups()
+        self.default_translator = {
+            "id": translator_id, "camrip": camrip, "ads": ads, "director": director, "name": None, "html": ""
+        }
+        favs = _FAVS.search(page)
+        self.favs = favs.group(1) if favs else ""
+        streams = _EMBEDDED_STREAMS.search(page)
+        self.embedded_streams = _unescape_js(streams.group(1)) if streams else None
+        subtitles = _EMBEDDED_SUBTITLES.search(page)
+        self.embedded_subtitles = _unescape_js(subtitles.group(1)) if subtitles else None
+
+        translators_block = page.split('id="translators-list"', 1)
+        if len(translators_block) == 2:
+            block = translators_block[1].split("</ul>", 1)[0]
+            for _, attrs, tr_id, inner in _TRANSLATOR_ITEM.findall(block):
+                def attr(name, default="0"):
+                    m = re.search(rf'data-{name}="(\d+)"', attrs)
+                    return m.group(1) if m else default
+                title = re.search(r'\btitle="([^"]*)"', attrs)
+                name = html_lib.unescape(_TAGS.sub("", inner)).strip() or (title.group(1) if title else tr_id)
+                self.translators.append({
+                    "id": tr_id, "camrip": attr("camrip"), "ads": attr("ads"), "director": attr("director"),
+                    "name": name, "html": attrs + inner,
+                })
+        return True
+
+    async def get_streams(self, translator: dict) -> Optional[dict]:
+        """{"variants": [...], "subtitles": [(lang, url)]} for one translator, None if refused"""
+        if translator["id"] == self.default_translator["id"] and self.embedded_streams:
+            return {
+                "variants": parse_stream_variants(decode_streams(self.embedded_streams)),
+                "subtitles": parse_subtitles(self.embedded_subtitles),
+            }
+        data = {
+            "id": self.film_id,
+            "translator_id": translator["id"],
+            "is_camrip": translator["camrip"],
+            "is_ads": translator["ads"],
+            "is_director": translator["director"],
+            "favs": self.favs,
+            "action": "get_movie",
+        }
+        headers = {
+            "User-Agent": USER_AGENT,
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": self.page_url,
+            "Origin": self.origin,
+        }
+        url = f"{self.origin}/ajax/get_cdn_series/?t={int(time.time() * 1000)}"
+        async with self.session.post(url, data=data, headers=headers) as resp:
+            if resp.status != 200:
+                logger.info(f"⚡ Fast path: get_cdn_series returned {resp.status} for translator {translator['id']}")
+                return None
+            try:
+                payload = json.loads(await resp.text())
+            except ValueError:
+                logger.info("⚡ Fast path: get_cdn_series answered with non-JSON (captcha/block page?)")
+                return None
+        if not payload.get("success") or not payload.get("url"):
+            logger.info(f"⚡ Fast path: get_cdn_series refused translator {translator['id']}: {payload.get('message')}")
+            return None
+        return {
+            "variants": parse_stream_variants(decode_streams(payload["url"])),
+            "subtitles": parse_subtitles(payload.get("subtitle")),
+        }
+
+
+async def fast_extract_to_watch(url: str, user_lang: str, task_id: Optional[str] = None) -> Optional[Dict]:
+    """Same shape as extract_from_hdrezka ({lang: {dub: {"all_m3u8", "subtitles"}}}), or None to use the browser"""
+    if not HDREZKA_FAST_PATH_CONFIG.get("enabled"):
+        return None
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(HDREZKA_FAST_PATH_CONFIG.get("timeout_seconds")):
+            client = HdrezkaAjaxClient(HDREZKA_PAGE_CACHE.session, url)
+            if not await client.load_page():
+                return None
+            if client.translators:
+                chosen = [(tr["name"], tr) for tr in match_translators(client.translators, user_lang)]
+            else:
+                chosen = [("🎧 Default Dub", client.default_translator)]
+
+            result = {user_lang: {}}
+            redis = RedisClient.get_client()
+            for dub_name, translator in chosen:
+                streams = await client.get_streams(translator)
+                if not streams or not streams["variants"]:
+                    return None
+                subtitles = []
+                for sub_lang, sub_url in streams["subtitles"]:
+                    if task_id:
+                        await redis.set(f"subs:{task_id}:{quote(dub_name)}:{quote(sub_lang)}", sub_url, ex=86400)
+                        subtitles.append({"url": f"/hd/subs/{task_id}/{quote(dub_name)}/{quote(sub_lang)}.vtt", "lang": sub_lang})
+                result[user_lang][dub_name] = {
+                    "all_m3u8": [
+                        {**v, "headers": client.stream_headers, "referer": client.stream_headers["Referer"]}
+                        for v in streams["variants"]
+                    ],
+                    "subtitles": subtitles,
+                }
+    except TrailerOnlyContentError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚡ [{task_id}] Fast path failed, falling back to the browser: {type(e).__name__}: {e}")
+        return None
+    logger.info(f"⚡ [{task_id}] Resolved {len(result[user_lang])} dub(s) over HTTP in {time.perf_counter() - started:.2f}s")
+    return result
+
+
+async def fast_extract_to_download(url: str, selected_dub: str, lang: str) -> Optional[dict]:
+    """Best stream for the dub ({"quality", "url", "headers"}) like extract_to_download_from_hdrezka, or None"""
+    if not HDREZKA_FAST_PATH_CONFIG.get("enabled"):
+        return None
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(HDREZKA_FAST_PATH_CONFIG.get("timeout_seconds")):
+            client = HdrezkaAjaxClient(HDREZKA_PAGE_CACHE.session, url)
+            if not await client.load_page():
+                return None
+            translator = client.default_translator
+            if client.translators:
+                wanted = normalize_dub(selected_dub)
+                names = [(tr, normalize_dub(tr["name"])) for tr in client.translators]
+                # Exact name first, then containment, like the browser extractor
+                translator = next((tr for tr, name in names if name == wanted), None) or \
+                    next((tr for tr, name in names if wanted and wanted in name), None)
+                if translator is None:
+                    logger.info(f"⚡ Fast path: dub '{selected_dub}' not in the translators list")
+                    return None
+            streams = await client.get_streams(translator)
+            if not streams:
+                return None
+            by_quality = {v["quality"]: v for v in streams["variants"]}
+            best = next((by_quality[q] for q in DOWNLOAD_QUALITY_PREFERENCE if q in by_quality), None)
+            if not best:
+                return None
+    except TrailerOnlyContentError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚡ Fast path failed for download, falling back to the browser: {type(e).__name__}: {e}")
+        return None
+    logger.info(f"⚡ Resolved {best['quality']} stream for '{selected_dub}' over HTTP in {time.perf_counter() - started:.2f}s")
+    return {**best, "headers": client.stream_headers}
@@ -1,54 +1,62 @@
-import aiohttp
-from bs4 import BeautifulSoup
 import re
 from typing import Dict, List, Optional, Union
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
-    "Accept": "*/*",
-    "Referer": "https://hdrezka.ag/",
-    "Origin": "https://hdrezka.ag",
-    "Connection": "keep-alive",
-}
+from parsel import Selector
 
-async def scrape_dubs_for_movie(movie_url: str, lang: str) -> Dict[str, Union[List[str], bool, Optional[str]]]:
+from backend.video_redirector.hdrezka.hdrezka_page_cache import HDREZKA_PAGE_CACHE
+
+
+def parse_dub_page(html: str) -> dict:
     """
-    Extracts dub names based on user language rules.
-    - html: raw HTML from the movie page
-    - lang: 'uk', 'ru', or 'en'
-    Returns: list of filtered dub names "['Украинский одноголосый', 'Украинский (Sweet)', 'Цікава Ідея', 'Sunnysiders', 'Колодій Трейлерів', 'Оригинал (+субтитры)']"
+    Movie page -> {"trailer_only": bool, "dubs": [(text, stripped text, markup)]} of every translators list item.
+    lxml through parsel; run in a worker thread and kept with the page by HDREZKA_PAGE_CACHE.
     """
-    async with aiohttp.ClientSession(headers=headers) as session:
-        async with session.get(movie_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-            html = await response.text()
-
-    soup = BeautifulSoup(html , "html.parser")
+    selector = Selector(text=html or "<html></html>")
 
     # --- Early detection: Trailer-only pages (YouTube embed, no HDRezka player) ---
+    trailer_only = False
     try:
         # Check for YouTube embeds
         has_youtube = False
-        for tag in soup.find_all(["iframe", "embed"]):
-            src = (tag.get("src") or "") + " " + (tag.get("data-src") or "")
+        for tag in selector.css("iframe, embed"):
+            src = (tag.attrib.get("src") or "") + " " + (tag.attrib.get("data-src") or "")
             if any(x in src for x in ["youtube.com/embed", "youtu.be", "youtube-nocookie.com"]):
                 has_youtube = True
                 break
 
         # Check for presence of HDRezka player container elements
-        has_player = bool(soup.select_one("#oframecdnplayer")) or bool(soup.select_one("#cdnplayer_settings"))
-
-        if has_youtube and not has_player:
-            # Return an explicit trailer-only marker so bot can exit early
-            return {
-                "dubs": [],
-                "fallback": True,
-                "message": "trailer_only"
-            }
+        has_player = bool(selector.css("#oframecdnplayer")) or bool(selector.css("#cdnplayer_settings"))
+        trailer_only = has_youtube and not has_player
     except Exception:
         # Non-fatal; proceed with normal scraping
         pass
 
-    dub_elements = soup.select("#translators-list .b-translator__item")
+    dubs = []
+    for el in selector.css("#translators-list .b-translator__item"):
+        texts = el.xpath(".//text()").getall()
+        dubs.append(("".join(texts), "".join(t.strip() for t in texts), el.get()))
+    return {"trailer_only": trailer_only, "dubs": dubs}
+
+
+async def scrape_dubs_for_movie(movie_url: str, lang: str) -> Dict[str, Union[List[str], bool, Optional[str]]]:
+    """
+    Extracts dub names based on user language rules.
+    - movie_url: the movie page, fetched through the shared HDREZKA_PAGE_CACHE
+    - lang: 'uk', 'ru', or 'en'
+    Returns: list of filtered dub names "['Украинский одноголосый', 'Украинский (Sweet)', 'Цікава Ідея', 'Sunnysiders', 'Колодій Трейлерів', 'Оригинал (+субтитры)']"
+    """
+    # An unavailable page gets the same fallback as a page without a dub list
+    page = await HDREZKA_PAGE_CACHE.parsed(movie_url, "dubs", parse_dub_page) or {"trailer_only": False, "dubs": []}
+
+    if page["trailer_only"]:
+        # Return an explicit trailer-only marker so bot can exit early
+        return {
+            "dubs": [],
+            "fallback": True,
+            "message": "trailer_only"
+        }
+
+    dub_elements = page["dubs"]
 
     # Note: 'default_ru' is used when no dub list is found. It refers to the single default voiceover (typically RU).
     if not dub_elements:
@@ -66,10 +74,7 @@ async def scrape_dubs_for_movie(movie_url: str, lang: str) -> Dict[str, Union[Li
             }
 
     dubs = []
-    for el in dub_elements:
-        dub_text = el.get_text()
-        dub_html = str(el)
-
+    for dub_text, _, dub_html in dub_elements:
         is_ukrainian = "Украинский" in dub_html
         is_original = bool(re.search(r"Оригинал|Original", dub_html, re.IGNORECASE))
 
@@ -89,8 +94,7 @@ async def scrape_dubs_for_movie(movie_url: str, lang: str) -> Dict[str, Union[Li
     # Fallback: if lang=uk but no Ukrainian dubs found, include RU + Original + a flag
     if lang == "uk" and all(("Оригинал" in dub or "Original" in dub) for dub in dubs):
         fallback_dubs = []
-        for el in dub_elements:
-            dub_text = el.get_text(strip=True)
+        for _, dub_text, _ in dub_elements:
             fallback_dubs.append(dub_text)
         fallback_dubs = list(dict.fromkeys(fallback_dubs))
         return {
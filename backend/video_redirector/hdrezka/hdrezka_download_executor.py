@@ -5,15 +5,24 @@ import os
 from datetime import datetime, timezone
 from backend.video_redirector.db.models import DownloadedFile, DownloadedFilePart
 from backend.video_redirector.db.session import get_db
-from backend.video_redirector.hdrezka.hdrezka_extract_to_download import extract_to_download_with_recovery
-from backend.video_redirector.hdrezka.hdrezka_merge_ts_into_mp4 import merge_ts_to_mp4
+from backend.video_redirector.hdrezka.hdrezka_extract_to_download import extract_to_download_with_cache
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE
+from backend.video_redirector.hdrezka.hdrezka_merge_ts_into_mp4 import merge_ts_to_mp4, DOWNLOAD_DIR
 from backend.video_redirector.utils.upload_video_to_tg import check_size_upload_large_file
+from backend.video_redirector.utils.content_hash_index import remove_hash_sidecar
+from backend.video_redirector.utils.media_retention_cache import RETENTION_CACHE
 from backend.video_redirector.utils.notify_admin import notify_admin
 from backend.video_redirector.utils.redis_client import RedisClient
+from backend.video_redirector.config import MAX_PARTS_PER_DELIVERY, UPLOAD_FILE_ATTEMPTS_PER_BOT, DELIVERY_BOT_UPLOAD_BALANCING
 from typing import Optional
+from collections import Counter
 
 logger = logging.getLogger(__name__)
 
+DELIVERY_BOT_ROUND_ROBIN_KEY = "delivery_bots:next_upload"
+DELIVERY_BOT_STARTED_KEY = "delivery_bots:started:{tg_user_id}"  # set of ids of the delivery bots the user started, kept by the delivery bot
+_bot_usernames: dict = {}  # token -> username, filled from delivery_bots.json on first use
+
 def load_delivery_bots_config() -> list:
     """
     Load delivery bot configuration from delivery_bots.json file.
@@ -58,7 +67,7 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
     # Remove from user's active downloads set when done (success or error)
     tg_user_id = None
     try:
-        result = await extract_to_download_with_recovery(url=movie_url, selected_dub=dub, lang=lang)
+        result, from_cache = await extract_to_download_with_cache(movie_url, dub, lang, task_id=task_id)
         if not result:
             raise Exception("No playable stream found for selected dub. Or probably something went wrong")
 
@@ -66,6 +75,15 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
         
         try:
             output_files = await merge_ts_to_mp4(task_id, result["url"], result['headers'])
+            if not output_files and from_cache:
+                # Cached stream URL was refused (expired/revoked): drop it and extract fresh once
+                await EXTRACTION_CACHE.invalidate_task(task_id, "merge failed")
+                await redis.set(f"download:{task_id}:status", "extracting", ex=3600)
+                result, _ = await extract_to_download_with_cache(movie_url, dub, lang, task_id=task_id, use_cache=False)
+                if not result:
+                    raise Exception("No playable stream found for selected dub. Or probably something went wrong")
+                await redis.set(f"download:{task_id}:status", "merging", ex=3600)
+                output_files = await merge_ts_to_mp4(task_id, result["url"], result['headers'])
         except Exception as e:
             # Handle any other merge-related errors
             logger.error(f"[Download Task {task_id}] Unexpected merge error: {e}")
@@ -74,6 +92,9 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
         if not output_files:
             raise Exception("Failed to merge video segments into MP4 files - no output generated")
 
+        # Keep a hard-linked copy for re-uploads after the file_id expires (committed once saved)
+        RETENTION_CACHE.stage(task_id, output_files)
+
         await redis.set(f"download:{task_id}:status", "uploading", ex=3600)
         try:
             upload_results = await process_parallel_uploads(output_files, task_id)
@@ -87,36 +108,19 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
 
         tg_bot_token_file_owner = consolidated_result["bot_token"]
         parts = consolidated_result["parts"]
-        session_name = consolidated_result["session_name"]
-
-        # Save in DB
-        async with get_db() as session:
-            # Sanitize before persisting to DB for consistent keying
-            from backend.video_redirector.utils.hdrezka_url import sanitize_hdrezka_url
-            db_entry = DownloadedFile(
-                tmdb_id=tmdb_id,
-                lang=lang,
-                dub=dub,
-                quality=result["quality"],
-                tg_bot_token_file_owner=tg_bot_token_file_owner,
-                created_at=datetime.now(timezone.utc),
-                movie_title=movie_title,
-                movie_poster=movie_poster,
-                movie_url=sanitize_hdrezka_url(movie_url) if movie_url else None,
-                session_name=session_name
-            )
-            session.add(db_entry)
-            await session.flush()  # Get db_entry.id
-
-            db_id_to_get_parts = db_entry.id
-
-            for part in parts:
-                session.add(DownloadedFilePart(
-                    downloaded_file_id=db_entry.id,
-                    part_number=part["part"],
-                    telegram_file_id=part["file_id"]
-                ))
-            await session.commit()
+
+        # Sanitize before persisting to DB for consistent keying
+        from backend.video_redirector.utils.hdrezka_url import sanitize_hdrezka_url
+        movie_url = sanitize_hdrezka_url(movie_url) if movie_url else None
+        db_id_to_get_parts = await save_downloaded_file(
+            consolidated_result, tmdb_id, lang, dub, result["quality"], movie_title, movie_poster, movie_url
+        )
+        RETENTION_CACHE.commit(task_id, tmdb_id, lang, dub, {
+            "quality": result["quality"],
+            "movie_title": movie_title,
+            "movie_poster": movie_poster,
+            "movie_url": movie_url,
+        })
 
         await redis.set(f"download:{task_id}:status", "done", ex=3600)
 
@@ -126,6 +130,7 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
                 try:
                     if path and os.path.exists(path):
                         os.remove(path)
+                        remove_hash_sidecar(path)
                         logger.debug(f"[{task_id}] Cleaned merged output: {path}")
                 except Exception as _e:
                     logger.warning(f"[{task_id}] Couldn't remove merged output {path}: {_e}")
@@ -148,15 +153,7 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
         except Exception:
             pass
 
-        if len(parts) == 1:
-            await redis.set(f"download:{task_id}:result", json.dumps({
-                "tg_bot_token_file_owner": tg_bot_token_file_owner,
-                "telegram_file_id": parts[0]["file_id"]
-            }), ex=86400)
-        else:
-            await redis.set(f"download:{task_id}:result", json.dumps({
-                "db_id_to_get_parts": db_id_to_get_parts,
-            }), ex=86400)
+        await publish_download_result(task_id, tg_bot_token_file_owner, parts, db_id_to_get_parts)
     except Exception as e:
         logger.error(f"[Download Task {task_id}] Failed Exception: {e}")
         await redis.set(f"download:{task_id}:status", "error", ex=3600)
@@ -170,6 +167,9 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
         if tg_user_id:
             await redis.srem(f"active_downloads:{tg_user_id}", task_id)  # type: ignore
 
+        # Staged cache files of a download that wasn't saved (no-op after a commit)
+        RETENTION_CACHE.discard(task_id)
+
         # Failure cleanup (if we raised earlier): ensure output_files are deleted
         try:
             if 'output_files' in locals() and output_files:
@@ -177,18 +177,147 @@ async def handle_download_task(task_id: str, movie_url: str, tmdb_id: int, lang:
                     try:
                         if path and os.path.exists(path):
                             os.remove(path)
+                            remove_hash_sidecar(path)
                     except Exception:
                         pass
         except Exception:
             pass
 
+async def save_downloaded_file(consolidated_result: dict, tmdb_id: int, lang: str, dub: str, quality: str,
+                               movie_title: str, movie_poster: str, movie_url: Optional[str]) -> int:
+    """Persist an uploaded title and its parts; returns the DownloadedFile id"""
+    async with get_db() as session:
+        db_entry = DownloadedFile(
+            tmdb_id=tmdb_id,
+            lang=lang,
+            dub=dub,
+            quality=quality,
+            tg_bot_token_file_owner=consolidated_result["bot_token"],
+            created_at=datetime.now(timezone.utc),
+            movie_title=movie_title,
+            movie_poster=movie_poster,
+            movie_url=movie_url,
+            session_name=consolidated_result["session_name"]
+        )
+        session.add(db_entry)
+        await session.flush()  # Get db_entry.id
+
+        for part in consolidated_result["parts"]:
+            session.add(DownloadedFilePart(
+                downloaded_file_id=db_entry.id,
+                part_number=part["part"],
+                telegram_file_id=part["file_id"],
+                tg_bot_token_file_owner=part.get("bot_token")
+            ))
+        await session.commit()
+        return db_entry.id
+
+def delivery_bot_username(bot_token: str) -> Optional[str]:
+    """Username of the delivery bot with this token, so deep links open the bot that owns the file"""
+    if not _bot_usernames:
+        try:
+            for bot in load_delivery_bots_config():
+                _bot_usernames[bot["token"]] = bot["username"].lstrip("@")
+        except Exception:
+            return None
+    return _bot_usernames.get(bot_token)
+
+async def publish_download_result(task_id: str, tg_bot_token_file_owner: str, parts: list, db_id_to_get_parts: int):
+    redis = RedisClient.get_client()
+    if len(parts) == 1:
+        result = {
+            "tg_bot_token_file_owner": tg_bot_token_file_owner,
+            "telegram_file_id": parts[0]["file_id"]
+        }
+    else:
+        result = {
+            "tg_bot_token_file_owner": tg_bot_token_file_owner,
+            "db_id_to_get_parts": db_id_to_get_parts,
+        }
+    result["delivery_bot_username"] = delivery_bot_username(tg_bot_token_file_owner)
+    await redis.set(f"download:{task_id}:result", json.dumps(result), ex=86400)
+
+async def restore_from_cache(task_id: str, tmdb_id: int, lang: str, dub: str) -> bool:
+    """Re-upload a cached title and save it like a finished download (status/result under download:{task_id})"""
+    redis = RedisClient.get_client()
+    checked_out = RETENTION_CACHE.checkout(tmdb_id, lang, dub, task_id, DOWNLOAD_DIR)
+    if not checked_out:
+        return False
+    output_files, manifest = checked_out
+    logger.info(f"♻️ [{task_id}] Re-uploading tmdb_id={tmdb_id} {lang}/{dub} from the retention cache "
+                f"({len(output_files)} file(s), {manifest.get('size_bytes', 0) / (1024 ** 3):.2f} GB)")
+    try:
+        await redis.set(f"download:{task_id}:status", "uploading", ex=3600)
+        upload_results = await process_parallel_uploads(output_files, task_id)
+        consolidated_result = await consolidate_upload_results(upload_results, task_id)
+        if not consolidated_result:
+            raise Exception("Failed to consolidate upload results.")
+        db_id = await save_downloaded_file(
+            consolidated_result, tmdb_id, lang, dub, manifest.get("quality"),
+            manifest.get("movie_title"), manifest.get("movie_poster"), manifest.get("movie_url")
+        )
+        await redis.set(f"download:{task_id}:status", "done", ex=3600)
+        await publish_download_result(task_id, consolidated_result["bot_token"], consolidated_result["parts"], db_id)
+        logger.info(f"✅ [{task_id}] Restored tmdb_id={tmdb_id} {lang}/{dub} from the retention cache")
+        return True
+    except Exception as e:
+        logger.error(f"❌ [{task_id}] Restore from retention cache failed: {e}")
+        await redis.set(f"download:{task_id}:status", "error", ex=3600)
+        await redis.set(f"download:{task_id}:error", str(e), ex=3600)
+        await notify_admin(f"[Restore {task_id}] Re-upload of tmdb_id={tmdb_id} {lang}/{dub} from cache failed: {e}")
+        return False
+    finally:
+        for path in output_files:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                remove_hash_sidecar(path)
+            except Exception:
+                pass
+
+def delivery_bot_id(bot_token: str) -> str:
+    return bot_token.split(":", 1)[0]
+
+async def _receivable_bot_ids(task_id: str) -> Counter:
+    """
+    Ids of the delivery bots the users waiting for this task can receive from, with how many of them can.
+
+    A user only gets messages from bots they started, and a file_id only works through the bot that
+    uploaded it, so the upload should land on one of those bots.
+    """
+    from backend.video_redirector.utils.file_repair import REPAIR_WAITERS_KEY
+
+    redis = RedisClient.get_client()
+    receivable = Counter()
+    try:
+        users = {}  # tg_user_id -> delivery bot they were talking to
+        user_id = await redis.get(f"download:{task_id}:user_id")
+        if user_id:
+            users[str(user_id)] = None
+        for waiter in await redis.smembers(REPAIR_WAITERS_KEY.format(task_id=task_id)):  # type: ignore
+            waiter = json.loads(waiter)
+            users[str(waiter["tg_user_id"])] = waiter.get("delivery_bot_id")
+        for tg_user_id, talking_to in users.items():
+            bot_ids = set(await redis.smembers(DELIVERY_BOT_STARTED_KEY.format(tg_user_id=tg_user_id)))  # type: ignore
+            if talking_to:
+                bot_ids.add(str(talking_to))
+            receivable.update(bot_ids)
+    except Exception as e:
+        logger.warning(f"⚠️ [{task_id}] Couldn't look up the delivery bots the users started: {e}")
+    return receivable
+
 async def process_parallel_uploads(output_files: list, task_id: str) -> list:
     """
-    Process multiple MP4 files in parallel using check_size_upload_large_file()
-    with bot rotation logic - all parts use the same bot for consistency.
-    
-    Returns: List of upload results for each file
-    Raises: Exception if ALL bots fail (all-or-nothing approach)
+    Process multiple MP4 files in parallel using check_size_upload_large_file().
+
+    Files that uploaded successfully are kept. Only failed files are retried. Until a file is up, each
+    bot from delivery_bots.json gets UPLOAD_FILE_ATTEMPTS_PER_BOT attempts before the next one; after
+    that the remaining files stay on the bot that uploaded it, so all parts of a delivery have one owner.
+    Each result carries the token of the bot that owns its file_ids. Bots the requesting users have
+    started are tried first, so the owner is a bot that can actually send them the file.
+
+    Returns: List of upload results for each file, in file order
+    Raises: Exception if some file could not be uploaded with any bot
     """
     logger.info(f"🚀 [{task_id}] Starting parallel upload of {len(output_files)} files with bot rotation")
     
@@ -200,88 +329,92 @@ async def process_parallel_uploads(output_files: list, task_id: str) -> list:
     except Exception as e:
         logger.error(f"❌ [{task_id}] Failed to load delivery bots configuration: {e}")
         raise Exception(f"Failed to load delivery bots configuration: {e}")
-    
-    # Try each bot until one succeeds for all files
-    for bot_index, bot_config in enumerate(available_bots):
-        bot_username = bot_config["username"]
-        
-        logger.info(f"🔄 [{task_id}] Trying bot {bot_index + 1}/{len(available_bots)}: {bot_username}")
-        
+
+    if DELIVERY_BOT_UPLOAD_BALANCING and len(available_bots) > 1:
+        # Each delivery starts on the next bot, so no bot becomes the hot spot for Telegram's per-bot limits
+        start = await RedisClient.get_client().incr(DELIVERY_BOT_ROUND_ROBIN_KEY) % len(available_bots)
+        available_bots = available_bots[start:] + available_bots[:start]
+
+    receivable = await _receivable_bot_ids(task_id)
+    if receivable:
+        # Bots the users can receive from come first (stable sort: the rotation holds among them)
+        available_bots.sort(key=lambda bot: -receivable[delivery_bot_id(bot["token"])])
+
+    # Extra parts from splitting must keep the whole delivery within MAX_PARTS_PER_DELIVERY
+    parts_budget_per_file = max(1, MAX_PARTS_PER_DELIVERY // len(output_files))
+
+    async def upload_single_file(file_path, file_index, bot_info, keep_file_on_failure):
+        # Create unique task ID for each file
+        file_task_id = f"{task_id}_file{file_index+1}"
         try:
-            upload_tasks = []
-            for i, file_path in enumerate(output_files):
-                # Create unique task ID for each file
-                file_task_id = f"{task_id}_file{i+1}"
-                
-                # Create task with individual error handling and its own database session
-                async def upload_single_file(file_path, file_task_id, file_index, bot_info):
-                    try:
-                        # Each task gets its own database session
-                        async with get_db() as db:
-                            result = await check_size_upload_large_file(file_path, file_task_id, db, bot_info)
-                        
-                        return {
-                            "file_index": file_index,
-                            "file_path": file_path,
-                            "result": result,
-                            "success": True
-                        }
-                    except Exception as e:
-                        logger.error(f"❌ [{task_id}] File {file_index+1} upload exception with bot {bot_username}: {e}")
-                        return {
-                            "file_index": file_index,
-                            "file_path": file_path,
-                            "result": None,
-                            "success": False,
-                            "error": str(e)
-                        }
-                
-                task = asyncio.create_task(
-                    upload_single_file(file_path, file_task_id, i, bot_config)
-                )
-                upload_tasks.append(task)
-            
-            # Wait for ALL uploads to complete simultaneously with this bot
-            logger.info(f"⏳ [{task_id}] Waiting for {len(upload_tasks)} parallel uploads with bot {bot_username}...")
-            
-            results = await asyncio.gather(*upload_tasks)
-            
-            # Check if ALL uploads succeeded with this bot
-            successful_results = [r for r in results if r["success"]]
-            failed_results = [r for r in results if not r["success"]]
-            
-            if failed_results:
-                # At least one upload failed with this bot - try next bot
-                failed_files = [f"File {r['file_index']+1}" for r in failed_results]
-                logger.warning(f"⚠️ [{task_id}] Bot {bot_username} failed for {len(failed_results)} files: {failed_files}")
-                
-                # If this was the last bot, raise exception
-                if bot_index == len(available_bots) - 1:
-                    raise Exception(f"All {len(available_bots)} bots failed. "
-                                  f"Last bot {bot_username} failed for {len(failed_results)}/{len(output_files)} files. "
-                                  f"Failed files: {', '.join(failed_files)}")
-                
-                # Try next bot
-                continue
-            
-            # All uploads succeeded with this bot!
-            logger.info(f"✅ [{task_id}] Bot {bot_username} successfully uploaded all {len(successful_results)} files!")
-            
-            return successful_results
-            
+            # Each task gets its own database session
+            async with get_db() as db:
+                result = await check_size_upload_large_file(file_path, file_task_id, db, bot_info,
+                                                            max_parts=parts_budget_per_file,
+                                                            keep_file_on_failure=keep_file_on_failure)
+            if not result:
+                raise Exception("Upload returned no result")
+            return {
+                "file_index": file_index,
+                "file_path": file_path,
+                "result": result,
+                "success": True
+            }
         except Exception as e:
-            logger.error(f"❌ [{task_id}] Bot {bot_username} failed completely: {e}")
-            
-            # If this was the last bot, raise exception
-            if bot_index == len(available_bots) - 1:
-                raise Exception(f"All {len(available_bots)} bots failed. "
-                              f"Last bot {bot_username} error: {e}")
-            
-            # Try next bot
-            continue
-        
-    # This should never be reached due to the exception handling above
-    raise Exception(f"Unexpected: All {len(available_bots)} bots failed without proper error handling")
+            logger.error(f"❌ [{task_id}] File {file_index+1} upload exception with bot {bot_info['username']}: {e}")
+            return {
+                "file_index": file_index,
+                "file_path": file_path,
+                "result": None,
+                "success": False,
+                "error": str(e)
+            }
+
+    successful: dict = {}
+    pending = list(range(len(output_files)))
+    last_errors: dict = {}
+    total_attempts = len(available_bots) * UPLOAD_FILE_ATTEMPTS_PER_BOT
+    owner_bot = None  # bot that uploaded the first file; the rest of the delivery stays on it
+
+    for attempt_no in range(1, total_attempts + 1):
+        is_last_attempt = attempt_no == total_attempts
+        if owner_bot is not None:
+            # A file_id only works through the bot that uploaded it, and a user may only have started that
+            # bot: once part of the delivery is up, failed files are retried on the same bot only
+            bot_config = owner_bot
+        else:
+            bot_config = available_bots[(attempt_no - 1) // UPLOAD_FILE_ATTEMPTS_PER_BOT]
+        bot_username = bot_config["username"]
+        logger.info(f"🔄 [{task_id}] Bot {bot_username} (attempt {attempt_no}/{total_attempts}): uploading files "
+                    f"{[i + 1 for i in pending]}")
+
+        upload_tasks = [
+            asyncio.create_task(upload_single_file(output_files[i], i, bot_config, not is_last_attempt))
+            for i in pending
+        ]
+        results = await asyncio.gather(*upload_tasks)
+
+        for r in results:
+            if r["success"]:
+                successful[r["file_index"]] = r
+                last_errors.pop(r["file_index"], None)
+            else:
+                last_errors[r["file_index"]] = r.get("error")
+        pending = [r["file_index"] for r in results if not r["success"]]
+        if successful and owner_bot is None:
+            owner_bot = bot_config
+
+        if not pending:
+            logger.info(f"✅ [{task_id}] All {len(successful)} files uploaded by {bot_username}")
+            return [successful[i] for i in sorted(successful)]
+
+        logger.warning(f"⚠️ [{task_id}] Bot {bot_username} failed for files {[i + 1 for i in pending]}, "
+                       f"keeping {len(successful)} uploaded files")
+
+    # The last attempt already removed the files that failed for good
+    failed_files = ", ".join(f"File {i + 1}: {last_errors.get(i)}" for i in pending)
+    raise Exception(f"Upload failed after {total_attempts} attempts for {len(pending)}/{len(output_files)} files. "
+                    f"Failed files: {failed_files}")
 
 async def consolidate_upload_results(upload_results: list, task_id: str) -> Optional[dict]:
     """
@@ -291,38 +424,43 @@ async def consolidate_upload_results(upload_results: list, task_id: str) -> Opti
         logger.error(f"❌ [{task_id}] No successful uploads to consolidate")
         return None
     
-    # Use the first successful upload's bot token and session
+    # The bot owning most files becomes the file's owner; parts of other bots keep their own token
     first_result = upload_results[0]["result"]
+    owner_counts = Counter(r["result"]["bot_token"] for r in upload_results)
+    primary_bot_token = owner_counts.most_common(1)[0][0]
     consolidated_parts = []
 
     # Combine all parts from all files
     part_mapping = {}
+    part_owner = {}
     for upload_result in upload_results:
         part_num = list(upload_result["result"]["parts"].keys())[0]
         part_mapping[part_num] = upload_result["result"]["parts"][part_num]
+        part_owner[part_num] = upload_result["result"]["bot_token"]
 
     logger.info(f"📋 [{task_id}] Found parts: {sorted(part_mapping.keys())}")
 
+    # Number pieces consecutively (file order, then piece order): any merged file may have been
+    # split into several pieces, and part_number must stay unique per downloaded file
+    next_db_part_num = 1
     for part_num in sorted(part_mapping.keys()):
         pieces_of_this_part = part_mapping[part_num]
 
         logger.info(f"📋 [{task_id}] Processing part {part_num} with {len(pieces_of_this_part)} pieces")
 
-        correct_db_input_num = 0
-        # Add each piece from this part to consolidated_parts
-        if len(pieces_of_this_part) >= 2:
-            correct_db_input_num = part_num**2
-
-        for piece in pieces_of_this_part:
+        for piece in sorted(pieces_of_this_part, key=lambda p: p["part"]):
             consolidated_parts.append({
-                "part": piece["part"] + part_num + correct_db_input_num,
-                "file_id": piece["file_id"]
+                "part": next_db_part_num,
+                "file_id": piece["file_id"],
+                # None: owned by the file's bot (tg_bot_token_file_owner of DownloadedFile)
+                "bot_token": part_owner[part_num] if part_owner[part_num] != primary_bot_token else None
             })
+            next_db_part_num += 1
 
     logger.info(f"📋 [{task_id}] Consolidated {len(consolidated_parts)} parts from {len(upload_results)} files")
     
     return {
-        "bot_token": first_result["bot_token"],
+        "bot_token": primary_bot_token,
         "parts": consolidated_parts,
         "session_name": first_result["session_name"] #actually all parts are uploaded by different sessions, so this only shows session name of first result
     }
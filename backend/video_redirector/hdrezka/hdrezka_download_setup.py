@@ -8,6 +8,8 @@ from backend.video_redirector.utils.signed_token_manager import SignedTokenManag
 from backend.video_redirector.db.session import get_db
 from backend.video_redirector.db.crud_users import get_user_by_telegram_id
 from backend.video_redirector.config import DEFAULT_USER_DOWNLOAD_LIMIT, PREMIUM_USER_DOWNLOAD_LIMIT
+from backend.video_redirector.utils.file_repair import get_active_repair, add_repair_waiter
+from backend.video_redirector.utils.extraction_prefetch import EXTRACTION_PREFETCHER
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +69,12 @@ async def download_setup(data: str, sig: str, background_tasks: BackgroundTasks)
 
     # --- Check for duplicate downloads ---
     is_duplicate = await check_duplicate_download(tg_user_id, tmdb_id, lang, dub)
+    if not is_duplicate:
+        # An expired copy is being repaired: deliver that one instead of downloading it twice
+        repair_task_id = await get_active_repair(tmdb_id, lang, dub)
+        if repair_task_id:
+            await add_repair_waiter(repair_task_id, tg_user_id)
+            is_duplicate = True
     if is_duplicate:
         return JSONResponse({
             "error": f"🎬 You're already downloading this video in {dub} dub. Please wait for it to finish and you will enjoy content 🥰",
@@ -110,6 +118,9 @@ async def download_setup(data: str, sig: str, background_tasks: BackgroundTasks)
     # Store task data for duplicate checking
     await redis.set(f"download:{task_id}:task_data", json.dumps(task), ex=10800)
 
+    # Promote the speculative extraction of this dub, or cancel the one of a dub the user didn't pick
+    await EXTRACTION_PREFETCHER.record_choice(movie_url, lang, dub)
+
     # Enqueue the task
     position = await DownloadQueueManager.enqueue(task)
 
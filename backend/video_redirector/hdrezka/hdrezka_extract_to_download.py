@@ -1,9 +1,19 @@
 import asyncio
 import json
 import re
+import time
 import logging
-from camoufox.async_api import AsyncCamoufox
 from backend.video_redirector.exceptions import TrailerOnlyContentError
+from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE
+from backend.video_redirector.hdrezka.hdrezka_ajax_extractor import fast_extract_to_download
+from backend.video_redirector.config import HDREZKA_BROWSER_WAIT_CONFIG
+from backend.video_redirector.hdrezka.hdrezka_page_waits import (
+    PLAYER_SETTINGS_BUTTON_XPATH, wait_for_page_ready, wait_for_selector_quietly,
+    click_xpath_and_wait_for_mutation, click_and_wait_for_manifest, click_and_wait_for_dub_switch
+)
+from backend.video_redirector.utils.extraction_timing import ExtractionTimer
+from backend.video_redirector.utils.extraction_scheduler import EXTRACTION_SCHEDULER, PRIORITY_DOWNLOAD
 
 f2id_to_quality = {
     "3": "720p",
@@ -15,13 +25,28 @@ logger = logging.getLogger(__name__)
 def normalize(text: str) -> str:
     return re.sub(r"[^\w\s]", "", text).strip().lower()
 
-async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: str) -> dict:
-    async with AsyncCamoufox(window=(1280, 720), humanize=True, headless=True) as browser:
-        page = await browser.new_page()
+async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: str, task_id: str | None = None) -> dict:
+    timer = ExtractionTimer("download", task_id)
+    try:
+        result = await _extract_to_download_from_hdrezka(url, selected_dub, lang, task_id, timer)
+    except Exception:
+        timer.finish("failed")
+        raise
+    timer.finish("ok" if result else "empty")
+    return result
+
+
+async def _extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: str, task_id: str | None,
+                                            timer: ExtractionTimer) -> dict:
+    waiting_since = time.perf_counter()
+    async with BROWSER_POOL.page(task_id) as page:
+        timer.add("browser", time.perf_counter() - waiting_since)
         # Navigation logging for visibility
         page.on("framenavigated", lambda frame: logger.debug(f"Frame navigated: {frame.url}"))
 
-        await page.goto(url, wait_until="domcontentloaded")
+        with timer.step("goto"):
+            await page.goto(url, wait_until="domcontentloaded")
+            await wait_for_page_ready(page)
         # Early detection: trailer-only if YouTube embed present and no translators list
         try:
             trailer_iframe_srcs = await page.evaluate("""
@@ -43,13 +68,10 @@ async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: st
             raise
         except Exception as e:
             logger.debug(f"Trailer-only detection (download) skipped due to error: {e}")
-        # Slightly longer waits to ensure DOM readiness for translators/controls
-        try:
-            await page.wait_for_selector("#translators-list", timeout=3000)  # type: ignore
-        except Exception:
-            # Not fatal; continue with a small delay
-            pass
-        await asyncio.sleep(1)
+        # The player controls must be rendered before the quality menu can be opened
+        with timer.step("goto"):
+            await wait_for_selector_quietly(page, f"xpath={PLAYER_SETTINGS_BUTTON_XPATH}",
+                                            HDREZKA_BROWSER_WAIT_CONFIG.get("page_ready_timeout_ms"))
 
         extracted = {"all_m3u8": []}
 
@@ -84,7 +106,8 @@ async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: st
             li_items = filtered_items
 
         if not li_items:
-            await extract_best_quality_variant(page, extracted)
+            with timer.step("quality_capture"):
+                await extract_best_quality_variant(page, extracted)
             # Early return as soon as we have a playable master, to start merge sooner
             if extracted["all_m3u8"]:
                 return extracted["all_m3u8"][0]
@@ -105,27 +128,11 @@ async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: st
                     break
 
         if selected_element:
-            try:
-                await page.evaluate(
-                    """
-                            (element) => element.click()
-                        """,
-                    arg=selected_element,
-                )
-            except Exception as e:
-                # Safe single retry if navigation destroyed context
-                if "Execution context was destroyed" in str(e):
-                    await page.wait_for_load_state("domcontentloaded")
-                    await asyncio.sleep(0.3)
-                    await page.evaluate(
-                        """
-                            (element) => element.click()
-                        """,
-                        arg=selected_element,
-                    )
-            await asyncio.sleep(1)
-
-        await extract_best_quality_variant(page, extracted)
+            with timer.step("dub_click"):
+                await select_dub(page, selected_element)
+
+        with timer.step("quality_capture"):
+            await extract_best_quality_variant(page, extracted)
         # Early return if we have already captured a master m3u8
         if extracted["all_m3u8"]:
             return extracted["all_m3u8"][0]
@@ -136,6 +143,32 @@ async def extract_to_download_from_hdrezka(url: str, selected_dub: str, lang: st
         return extracted["all_m3u8"][0]  # only best one extracted
 
 
+async def select_dub(page, selected_element):
+    """Click the dub and wait until the player reloaded with it (nothing to wait for if it's already active)"""
+    try:
+        if await selected_element.evaluate("(element) => element.classList.contains('active')"):
+            return
+    except Exception as e:
+        logger.debug(f"Couldn't read active state of the selected dub: {e}")
+
+    async def click():
+        await page.evaluate(
+            """
+                (element) => element.click()
+            """,
+            arg=selected_element,
+        )
+
+    try:
+        await click_and_wait_for_dub_switch(page, click)
+    except Exception as e:
+        # Safe single retry if navigation destroyed context
+        if "Execution context was destroyed" not in str(e):
+            raise
+        await page.wait_for_load_state("domcontentloaded")
+        await click_and_wait_for_dub_switch(page, click)
+
+
 async def extract_best_quality_variant(page, extracted):
     logger.debug("🔍 Extracting best quality variant (retry up to 5x for 1080p)...")
     attempts = 0
@@ -149,7 +182,6 @@ async def extract_best_quality_variant(page, extracted):
             # fallback to clicking 720p to trigger player change
             await try_click_and_capture_m3u8(page, extracted, "3", "720p", attempts)
         attempts += 1
-        await asyncio.sleep(0.5)
 
     # If still no success after retries, try to get any of 720p or 1080p once more
     for f2id in ["4", "3"]:
@@ -158,141 +190,66 @@ async def extract_best_quality_variant(page, extracted):
             return
 
 async def try_click_and_capture_m3u8(page, extracted, f2id, quality_label, attempts):
-    quality_event = asyncio.Event()
-    options_btn = '//*[@id="oframecdnplayer"]/pjsdiv[15]/pjsdiv[3]'
+    options_btn = PLAYER_SETTINGS_BUTTON_XPATH
     quality_selector_button = '//*[@id="cdnplayer_settings"]/pjsdiv/pjsdiv[1]'
+    menu_timeout_ms = HDREZKA_BROWSER_WAIT_CONFIG.get("menu_timeout_ms")
 
-    try:
-        # Click options with one safe retry on navigation
-        for _ in range(2):
-            try:
-                await page.evaluate(
-                    """
-                        (xpath) => {
-                            const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                            if (el) el.click();
-                        }
-                    """,
-                    arg=options_btn,
-                )
-                break
-            except Exception as e:
-                if "Execution context was destroyed" in str(e):
-                    logger.debug("🔁 Options click retried after navigation")
-                    await page.wait_for_load_state("domcontentloaded")
-                    await asyncio.sleep(0.3)
-                    continue
-                raise
-        await asyncio.sleep(0.3)
-
-        # Click quality selector with one safe retry
+    async def with_navigation_retry(action, what: str):
+        # One safe retry if the click raced with a navigation
         for _ in range(2):
             try:
-                await page.evaluate(
-                    """
-                        (xpath) => {
-                            const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                            if (el) el.click();
-                        }
-                    """,
-                    arg=quality_selector_button,
-                )
-                break
+                return await action()
             except Exception as e:
                 if "Execution context was destroyed" in str(e):
-                    logger.debug("🔁 Quality selector click retried after navigation")
+                    logger.debug(f"🔁 {what} click retried after navigation")
                     await page.wait_for_load_state("domcontentloaded")
-                    await asyncio.sleep(0.3)
                     continue
                 raise
-        await asyncio.sleep(0.3)
-
-        # Wait a bit longer for quality items to render
-        try:
-            await page.wait_for_selector('[f2id]', timeout=3000)  # type: ignore
-        except Exception:
-            pass
 
-        el = await page.query_selector(f'[f2id="{f2id}"]')
-        if not el:
-            return False
+    # Open the options menu, then the quality list; each click waits for what it renders
+    await with_navigation_retry(lambda: click_xpath_and_wait_for_mutation(page, options_btn), "Options")
+    await wait_for_selector_quietly(page, f"xpath={quality_selector_button}", menu_timeout_ms)
+    await with_navigation_retry(lambda: click_xpath_and_wait_for_mutation(page, quality_selector_button), "Quality selector")
 
-        # Click specific quality with one safe retry
-        for _ in range(2):
-            try:
-                await page.evaluate(
-                    """
-                        (f2id) => {
-                            const el = document.querySelector(`[f2id="${f2id}"]`);
-                            if (el) el.click();
-                        }
-                    """,
-                    arg=f2id,
-                )
-                break
-            except Exception as e:
-                if "Execution context was destroyed" in str(e):
-                    logger.debug("🔁 Quality item click retried after navigation")
-                    await page.wait_for_load_state("domcontentloaded")
-                    await asyncio.sleep(0.3)
-                    continue
-                raise
-
-        await asyncio.sleep(0.3)
+    if not await wait_for_selector_quietly(page, f'[f2id="{f2id}"]', menu_timeout_ms):
+        return False
 
-        # Define and attach response listener AFTER clicks (original behavior),
-        # with a single safe retry if attachment races with navigation.
-        async def handle_response(response):
-            try:
-                if response.status == 200 and ".m3u8" in response.url and "manifest" in response.url:
-                    headers = dict(response.request.headers)
-                    extracted["all_m3u8"].append({
-                        "quality": quality_label,
-                        "url": response.url,
-                        "headers": headers,
-                    })
-                    logger.info(f"✅ Found {quality_label}: {response.url}")
-                    quality_event.set()
-            except Exception:
-                # Be tolerant to transient issues during navigation
-                pass
-
-        listener_attached = False
-        try:
-            if f2id == '4' or attempts >= 5:
-                try:
-                    page.on("response", handle_response)
-                    listener_attached = True
-                except Exception as e:
-                    if "Execution context was destroyed" in str(e) or "closed" in str(e).lower():
-                        await page.wait_for_load_state("domcontentloaded")
-                        await asyncio.sleep(0.2)
-                        page.on("response", handle_response)
-                        listener_attached = True
-                    else:
-                        raise
-
-            await asyncio.wait_for(quality_event.wait(), timeout=8)
-            return True
-        finally:
-            if listener_attached:
-                try:
-                    page.remove_listener("response", handle_response)
-                except Exception:
-                    pass
-    except asyncio.TimeoutError:
+    async def click_quality():
+        await page.evaluate(
+            """
+                (f2id) => {
+                    const el = document.querySelector(`[f2id="${f2id}"]`);
+                    if (el) el.click();
+                }
+            """,
+            arg=f2id,
+        )
+
+    # Clicking 720p only nudges the player before the next 1080p try: wait for its manifest but don't keep it
+    capture = f2id == '4' or attempts >= 5
+    response = await with_navigation_retry(lambda: click_and_wait_for_manifest(page, click_quality), "Quality item")
+    if response is None:
         logger.debug(f"⚠️ Timeout waiting for .m3u8 after clicking {quality_label}")
         return False
-    
+    if not capture:
+        return False
+
+    extracted["all_m3u8"].append({
+        "quality": quality_label,
+        "url": response.url,
+        "headers": dict(response.request.headers),
+    })
+    logger.info(f"✅ Found {quality_label}: {response.url}")
+    return True
 
 
-async def extract_to_download_with_recovery(url: str, selected_dub: str, lang: str) -> dict:
+async def extract_to_download_with_recovery(url: str, selected_dub: str, lang: str, task_id: str | None = None) -> dict:
     """Run extraction with recovery for transient navigation/context errors."""
     max_attempts = 5
     for attempt in range(max_attempts):
         try:
             logger.info(f"Starting download extraction attempt {attempt + 1}/{max_attempts}")
-            return await extract_to_download_from_hdrezka(url, selected_dub, lang)
+            return await extract_to_download_from_hdrezka(url, selected_dub, lang, task_id)
         except TrailerOnlyContentError as te:
             # Non-retryable: surface immediately
             logger.error(f"Trailer-only content detected (download): {te}")
@@ -311,3 +268,30 @@ async def extract_to_download_with_recovery(url: str, selected_dub: str, lang: s
             raise
     # Should not reach here
     raise Exception("All extraction attempts failed")
+
+
+async def extract_to_download_with_cache(url: str, selected_dub: str, lang: str, task_id: str | None = None,
+                                         use_cache: bool = True, priority: int = PRIORITY_DOWNLOAD) -> tuple:
+    """
+    Read-through EXTRACTION_CACHE for downloads; returns (result, from_cache).
+    use_cache=False forces a browser extraction (the cached URLs were refused) and refreshes the entry.
+    Browser extractions wait for an EXTRACTION_SCHEDULER slot, behind interactive watch requests by default.
+    """
+    if use_cache:
+        cached = await EXTRACTION_CACHE.get_download(url, lang, selected_dub, task_id)
+        if cached:
+            logger.info(f"[{task_id}] ⚡ Using cached {cached.get('quality')} stream for '{selected_dub}'")
+            return cached, True
+
+    async def extract_and_store():
+        extracted = await fast_extract_to_download(url, selected_dub, lang)
+        if not extracted:
+            async with EXTRACTION_SCHEDULER.slot(task_id, priority):
+                extracted = await extract_to_download_with_recovery(url, selected_dub, lang, task_id)
+        await EXTRACTION_CACHE.put_download(url, lang, selected_dub, extracted)
+        return extracted
+
+    result = await EXTRACTION_CACHE.single_flight(EXTRACTION_CACHE.dub_key(url, lang, selected_dub), extract_and_store)
+    if result:
+        await EXTRACTION_CACHE.track_download(task_id, url, lang, selected_dub)
+    return result, False
@@ -1,10 +1,22 @@
 import asyncio
-from camoufox.async_api import AsyncCamoufox
+import time
 from typing import Dict
 from backend.video_redirector.utils.redis_client import RedisClient
+from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE
+from backend.video_redirector.hdrezka.hdrezka_ajax_extractor import fast_extract_to_watch
 from urllib.parse import quote
 import logging
 from backend.video_redirector.exceptions import TrailerOnlyContentError
+from backend.video_redirector.config import HDREZKA_WATCH_DUB_CONCURRENCY, HDREZKA_BROWSER_WAIT_CONFIG
+from backend.video_redirector.hdrezka.hdrezka_page_waits import (
+    wait_for_page_ready, wait_for_selector_quietly, click_xpath_and_wait_for_mutation,
+    click_and_wait_for_manifest, click_and_wait_for_dub_switch
+)
+from backend.video_redirector.utils.extraction_timing import ExtractionTimer
+from backend.video_redirector.utils.extraction_scheduler import EXTRACTION_SCHEDULER, PRIORITY_WATCH
+
+SUBTITLES_BUTTON_XPATH = '//*[@id="cdnplayer_control_cc"]/pjsdiv[3]'
 
 f2id_to_quality = {
     "1": "360p",
@@ -15,17 +27,30 @@ f2id_to_quality = {
 }
 logger = logging.getLogger(__name__)
 
-async def extract_from_hdrezka(url: str, user_lang: str, task_id: str | None = None) -> Dict:
+async def extract_from_hdrezka(url: str, user_lang: str, task_id: str | None = None, on_dub_ready=None) -> Dict:
+    timer = ExtractionTimer("watch", task_id)
+    try:
+        result = await _extract_from_hdrezka(url, user_lang, task_id, on_dub_ready, timer)
+    except Exception:
+        timer.finish("failed")
+        raise
+    timer.finish()
+    return result
+
+
+async def _extract_from_hdrezka(url: str, user_lang: str, task_id: str | None, on_dub_ready,
+                                timer: ExtractionTimer) -> Dict:
     final_result = {user_lang: {}}
 
-    async with AsyncCamoufox(window=(1280, 720), humanize=True, headless=True) as browser:
-        page = await browser.new_page()
-        
+    waiting_since = time.perf_counter()
+    async with BROWSER_POOL.page(task_id) as page:
+        timer.add("browser", time.perf_counter() - waiting_since)
         # Add navigation protection
         page.on("framenavigated", lambda frame: logger.info(f"Frame navigated: {frame.url}"))
-        
-        await page.goto(url, wait_until="domcontentloaded")
-        await asyncio.sleep(0.5)
+
+        with timer.step("goto"):
+            await page.goto(url, wait_until="domcontentloaded")
+            await wait_for_page_ready(page)
 
         # --- Early detection: Trailer-only (YouTube embed) pages ---
         try:
@@ -55,79 +80,127 @@ async def extract_from_hdrezka(url: str, user_lang: str, task_id: str | None = N
         dub_elements = await get_matching_dubs(page, user_lang)
         dub_names = [dub_name for dub_name, _ in dub_elements]
 
+        # --- Step 2: Extract dubs concurrently, the first one on this page, the rest on sibling pages ---
+        workers = max(1, min(len(dub_names), HDREZKA_WATCH_DUB_CONCURRENCY))
+        pending = asyncio.Queue()
         for dub_name in dub_names:
-            logger.info(f"\n🎙️ Extracting for dub: {dub_name}")
+            pending.put_nowait(dub_name)
 
-            dub_result = {"all_m3u8": [], "subtitles": []}
+        async def worker(worker_page, is_main: bool):
+            try:
+                if not is_main:
+                    with timer.step("goto"):
+                        await worker_page.goto(url, wait_until="domcontentloaded")
+                        await wait_for_page_ready(worker_page)
+                while not pending.empty():
+                    dub_name = pending.get_nowait()
+                    dub_result = await extract_dub(worker_page, dub_name, user_lang, task_id, timer)
+                    final_result[user_lang][dub_name] = dub_result
+                    if on_dub_ready:
+                        # Publish what we have, the user can start watching while other dubs extract
+                        try:
+                            await on_dub_ready(final_result)
+                        except Exception as e:
+                            logger.warning(f"[{task_id}] Publishing partial watch config failed: {e}")
+            finally:
+                if not is_main:
+                    await worker_page.close()
+
+        sibling_pages = []
+        for _ in range(workers - 1):
+            # Same context: shares cookies with the main page and no extra pool capacity
+            sibling_pages.append(await page.context.new_page())
+        outcomes = await asyncio.gather(worker(page, True), *(worker(p, False) for p in sibling_pages),
+                                        return_exceptions=True)
+        errors = [o for o in outcomes if isinstance(o, Exception)]
+        if errors and len(final_result[user_lang]) < len(dub_names):
+            raise errors[0]
+
+        # Keep the order the site lists the dubs in
+        final_result[user_lang] = {name: final_result[user_lang][name] for name in dub_names if name in final_result[user_lang]}
+        return final_result
 
-            # Add safety check for page state
-            if page.is_closed():
-                logger.error("Page was closed during extraction")
-                raise Exception("Page closed during extraction - will retry")
 
-            vtt_handler = await start_listening_for_vtt(page, dub_result, task_id)
-            
-            # Re-query the dub element by name each time with error handling
-            li_element = await find_dub_element_by_name(page, dub_name, user_lang)
-            if li_element:
-                # Try primary click method with retry
-                primary_click_success = False
-                for attempt in range(3):
-                    try:
-                        await li_element.evaluate("(el) => el.click()")
-                        await asyncio.sleep(1)
-                        primary_click_success = True
-                        break
-                    except Exception as e:
-                        logger.warning(f"⚠️ Primary dub click attempt {attempt + 1} failed for '{dub_name}': {e}")
-                        if attempt < 2:
-                            await asyncio.sleep(0.5)
-                
-                # If primary method failed, try alternative click method with retry
-                if not primary_click_success:
-                    alternative_click_success = False
-                    for attempt in range(3):
-                        try:
-                            await page.evaluate("""
-                                (dubName) => {
-                                    const elements = document.querySelectorAll('#translators-list li, #translators-list a');
-                                    for (let el of elements) {
-                                        if (el.textContent.trim() === dubName) {
-                                            el.click();
-                                            return true;
-                                        }
-                                    }
-                                    return false;
-                                }
-                            """, arg=dub_name)
-                            await asyncio.sleep(1.5)
-                            alternative_click_success = True
-                            break
-                        except Exception as e2:
-                            logger.warning(f"⚠️ Alternative dub click attempt {attempt + 1} failed for '{dub_name}': {e2}")
-                            if attempt < 2:
-                                await asyncio.sleep(0.5)
-                    
-                    if not alternative_click_success:
-                        logger.error(f"⚠️ All dub click attempts failed for '{dub_name}'")
-
-            await extract_all_quality_variants(page, dub_result)
-            # Remove the VTT listener before extracting subtitles
-            page.remove_listener("response", vtt_handler)
-            if task_id:
-                await extract_subtitles_if_available(page, dub_result, task_id=task_id, dub_name=dub_name)
-
-            final_result[user_lang][dub_name] = dub_result
+async def extract_dub(page, dub_name: str, user_lang: str, task_id: str | None = None,
+                      timer: ExtractionTimer | None = None) -> Dict:
+    """Select one dub on the page and capture its quality variants and subtitles"""
+    logger.info(f"\n🎙️ Extracting for dub: {dub_name}")
+    timer = timer or ExtractionTimer("watch", task_id)
 
-        return final_result
+    dub_result = {"all_m3u8": [], "subtitles": []}
+
+    # Add safety check for page state
+    if page.is_closed():
+        logger.error("Page was closed during extraction")
+        raise Exception("Page closed during extraction - will retry")
+
+    vtt_handler = await start_listening_for_vtt(page, dub_result, task_id, dub_name)
+
+    # Re-query the dub element by name each time with error handling
+    li_element = await find_dub_element_by_name(page, dub_name, user_lang)
+    if li_element:
+        with timer.step("dub_click"):
+            await select_dub(page, li_element, dub_name)
+
+    with timer.step("quality_capture"):
+        await extract_all_quality_variants(page, dub_result)
+    # Remove the VTT listener before extracting subtitles
+    page.remove_listener("response", vtt_handler)
+    if task_id:
+        with timer.step("subtitles"):
+            await extract_subtitles_if_available(page, dub_result, task_id=task_id, dub_name=dub_name)
 
-async def extract_with_recovery(url: str, user_lang: str, task_id: str | None = None) -> Dict:
+    return dub_result
+
+
+async def select_dub(page, li_element, dub_name: str) -> bool:
+    """Click the dub and wait until the player reloaded with it; True once it is active"""
+    try:
+        if await li_element.evaluate("(el) => el.classList.contains('active')"):
+            return True  # The player already plays this dub, a click wouldn't reload anything
+    except Exception as e:
+        logger.debug(f"Couldn't read active state of '{dub_name}': {e}")
+
+    # Try primary click method with retry
+    for attempt in range(3):
+        try:
+            return await click_and_wait_for_dub_switch(page, lambda: li_element.evaluate("(el) => el.click()"))
+        except Exception as e:
+            logger.warning(f"⚠️ Primary dub click attempt {attempt + 1} failed for '{dub_name}': {e}")
+            await page.wait_for_load_state("domcontentloaded")
+
+    # If primary method failed, try alternative click method with retry
+    async def click_by_name():
+        await page.evaluate("""
+            (dubName) => {
+                const elements = document.querySelectorAll('#translators-list li, #translators-list a');
+                for (let el of elements) {
+                    if (el.textContent.trim() === dubName) {
+                        el.click();
+                        return true;
+                    }
+                }
+                return false;
+            }
+        """, arg=dub_name)
+
+    for attempt in range(3):
+        try:
+            return await click_and_wait_for_dub_switch(page, click_by_name)
+        except Exception as e2:
+            logger.warning(f"⚠️ Alternative dub click attempt {attempt + 1} failed for '{dub_name}': {e2}")
+            await page.wait_for_load_state("domcontentloaded")
+
+    logger.error(f"⚠️ All dub click attempts failed for '{dub_name}'")
+    return False
+
+async def extract_with_recovery(url: str, user_lang: str, task_id: str | None = None, on_dub_ready=None) -> Dict:
     """Extract with browser context recovery - 5 max attempts"""
     max_attempts = 5
     for attempt in range(max_attempts):
         try:
             logger.info(f"Starting extraction attempt {attempt + 1}/{max_attempts}")
-            return await extract_from_hdrezka(url, user_lang, task_id)
+            return await extract_from_hdrezka(url, user_lang, task_id, on_dub_ready)
         except TrailerOnlyContentError as te:
             # Non-retryable: surface immediately
             logger.error(f"Trailer-only content detected: {te}")
@@ -145,6 +218,32 @@ async def extract_with_recovery(url: str, user_lang: str, task_id: str | None =
     # This line should never be reached, but linter needs it
     raise Exception("Unexpected end of extraction attempts")
 
+async def extract_with_cache(url: str, user_lang: str, task_id: str | None = None, on_dub_ready=None,
+                             priority: int = PRIORITY_WATCH) -> Dict:
+    """
+    Read-through EXTRACTION_CACHE: titles extracted recently (by anyone) skip the browser.
+    on_dub_ready(partial_result) is awaited each time a dub finishes during a browser extraction.
+    Browser extractions wait for an EXTRACTION_SCHEDULER slot at the given priority.
+    """
+    cached = await EXTRACTION_CACHE.get_watch(url, user_lang, task_id)
+    if cached:
+        logger.info(f"[extract:{task_id}] ⚡ Served {len(cached[user_lang])} dub(s) from the extraction cache")
+        return cached
+
+    async def extract_and_store():
+        # Plain HTTP against the player's AJAX endpoint first, the browser only if that fails
+        extracted = await fast_extract_to_watch(url, user_lang, task_id)
+        if not extracted:
+            async with EXTRACTION_SCHEDULER.slot(task_id, priority):
+                extracted = await extract_with_recovery(url, user_lang, task_id, on_dub_ready)
+        await EXTRACTION_CACHE.put_watch(url, user_lang, extracted)
+        return extracted
+
+    # Users pressing "watch" on the same title at once share one browser extraction
+    result = await EXTRACTION_CACHE.single_flight(EXTRACTION_CACHE.watch_key(url, user_lang), extract_and_store)
+    await EXTRACTION_CACHE.track_watch(task_id, url, user_lang, (result.get(user_lang) or {}).keys())
+    return result
+
 async def get_matching_dubs(page, user_lang: str):
     matching = []
     li_items = await page.query_selector_all("#translators-list li")
@@ -214,7 +313,7 @@ async def select_preferred_dub(page, user_lang: str):
     logger.info("⚠️ No matching dub found for user_lang. Using default active.")
 
 
-async def start_listening_for_vtt(page, extracted: Dict, task_id):
+async def start_listening_for_vtt(page, extracted: Dict, task_id, dub_name: str):
     largest_vtt = {"size": 0, "url": None}
     
     async def handle_vtt_response(response):
@@ -226,12 +325,14 @@ async def start_listening_for_vtt(page, extracted: Dict, task_id):
         if size > largest_vtt["size"]:
             largest_vtt["size"] = size
             largest_vtt["url"] = url
-            proxy_url = f"/hd/subs/{task_id}.vtt"
+            proxy_url = f"/hd/subs/{task_id}/{quote(dub_name)}/fallback.vtt"
             logger.info(f"[🎯] Found larger subtitle VTT (initial): {url} (size: {size})")
 
-            # Save to Redis so fallback route can find it
+            # Save to Redis so fallback route can find it; per dub, dubs are extracted concurrently
             redis = RedisClient.get_client()
-            await redis.set(f"subs:{task_id}:fallback", url, ex=86400)
+            await redis.set(f"subs:{task_id}:{quote(dub_name)}:fallback", url, ex=86400)
+            # The flat /hd/subs/{task_id}.vtt route serves the dub that captured a subtitle first
+            await redis.set(f"subs:{task_id}:fallback_dub", quote(dub_name), ex=86400, nx=True)
 
             # Replace or add the subtitle in extracted["subtitles"]
             if extracted["subtitles"]:
@@ -264,14 +365,9 @@ async def extract_subtitles_if_available(page, extracted: Dict, task_id: str,dub
 
     logger.info("🟡 Subtitles detected")
 
-    # Step 2: Click the subtitles menu (CC button)
+    # Step 2: Click the subtitles menu (CC button) and wait for it to open
     try:
-        await page.evaluate("""
-            (xpath) => {
-                const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                if (el) el.click();
-            }
-        """, arg='//*[@id="cdnplayer_control_cc"]/pjsdiv[3]')
+        await click_xpath_and_wait_for_mutation(page, SUBTITLES_BUTTON_XPATH)
         logger.info("✅ Forced subtitle button click via JS")
     except Exception as e:
         logger.error(f"⚠️ Subtitle button failed to become interactable: {e}")
@@ -328,7 +424,7 @@ async def extract_subtitles_if_available(page, extracted: Dict, task_id: str,dub
                 extracted["subtitles"][0]["lang"] = lang
                 extracted["subtitles"][0]["url"] = f"/hd/subs/{task_id}/{quote(dub_name)}/{quote(lang)}.vtt"
                 redis = RedisClient.get_client()
-                fallback_url = await redis.get(f"subs:{task_id}:fallback")
+                fallback_url = await redis.get(f"subs:{task_id}:{quote(dub_name)}:fallback")
                 if fallback_url:
                     await redis.set(f"subs:{task_id}:{quote(dub_name)}:{quote(lang)}", fallback_url, ex=86400)
                 logger.info(f"resaved first captured vtt with new key in redis")
@@ -338,24 +434,12 @@ async def extract_subtitles_if_available(page, extracted: Dict, task_id: str,dub
     for idx in range(1, len(subtitle_items) - 1):
         # if currently selected subs is first in list we need to close mini menu and skip this iteration
         if index_of_already_catched_subs == 1 and index_of_already_catched_subs == idx:
-            await page.evaluate("""
-                                    (xpath) => {
-                                        const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                                        if (el) el.click();
-                                    }
-                                """, arg='//*[@id="cdnplayer_control_cc"]/pjsdiv[3]')
-            await asyncio.sleep(1)
+            await click_xpath_and_wait_for_mutation(page, SUBTITLES_BUTTON_XPATH)
             continue
 
         # Reopen subtitle menu before each click, except first iteration when it is already opened
         if idx != 1:
-            await page.evaluate("""
-                (xpath) => {
-                    const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                    if (el) el.click();
-                }
-            """, arg='//*[@id="cdnplayer_control_cc"]/pjsdiv[3]')
-            await asyncio.sleep(1)
+            await click_xpath_and_wait_for_mutation(page, SUBTITLES_BUTTON_XPATH)
 
         subtitle_items = await page.query_selector_all("[f2id]")
         fresh_item = subtitle_items[idx]
@@ -379,136 +463,73 @@ async def extract_subtitles_if_available(page, extracted: Dict, task_id: str,dub
         logger.info(f"🔍 Clicked subtitle option f2id={f2id_val} ({lang})")
 
         try:
-            await asyncio.wait_for(vtt_event.wait(), timeout=10)
+            await asyncio.wait_for(vtt_event.wait(), timeout=HDREZKA_BROWSER_WAIT_CONFIG.get("subtitle_timeout_seconds"))
         except asyncio.TimeoutError:
             logger.info(f"⚠️ No .vtt received for subtitle: {lang}")
 
-        await asyncio.sleep(0.3)
-
 
 async def extract_all_quality_variants(page, extracted: Dict):
     logger.info("📥 Extracting all quality variants...")
 
     quality_button_xpath = '//*[@id="oframecdnplayer"]/pjsdiv[15]/pjsdiv[3]'
     f2id_list = ["1", "2", "3", "4", "5"]
+    menu_timeout_ms = HDREZKA_BROWSER_WAIT_CONFIG.get("menu_timeout_ms")
 
-    async def click_xpath(xpath: str):
+    async def click_selector(selector: str) -> bool:
         try:
-            await page.evaluate("""
-                (xpath) => {
-                    const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
-                    if (el) el.click();
-                }
-            """, arg=xpath)
+            await page.evaluate("""(selector) => {
+                const el = document.querySelector(selector);
+                if (el) el.click();
+            }""", arg=selector)
         except Exception as e:
-            logger.warning(f"Failed to click xpath {xpath}: {e}")
+            logger.warning(f"Failed to click {selector}: {e}")
             return False
         return True
 
-    quality_state = {"current": None}
-    quality_event = asyncio.Event()
-
     async def try_f2id(f2idx: str):
         quality_label = f2id_to_quality.get(f2idx)
-        quality_state["current"] = quality_label
-        quality_event.clear()
 
         # Add page state check
         if page.is_closed():
             logger.error("Page closed during quality extraction")
             return False
 
-        # Click quality button with retry
-        for attempt in range(3):
-            if await click_xpath(quality_button_xpath):
-                break
-            await asyncio.sleep(0.5)
-        else:
-            logger.error(f"Failed to click quality button after 3 attempts")
-
-        await asyncio.sleep(0.5)
-
-        # Click settings button with retry
+        # Open the player menu, then its quality section; each click waits for what it renders
         for attempt in range(3):
             try:
-                await page.evaluate("""() => {
-                    const btn = document.querySelector('[fid="1"]');
-                    if (btn) btn.click();
-                }""")
+                await click_xpath_and_wait_for_mutation(page, quality_button_xpath)
                 break
             except Exception as e:
-                logger.warning(f"Settings button click attempt {attempt + 1} failed: {e}")
-                await asyncio.sleep(0.5)
+                logger.warning(f"Quality button click attempt {attempt + 1} failed: {e}")
         else:
-            logger.error("Failed to click settings button")
+            logger.error(f"Failed to click quality button after 3 attempts")
 
-        await asyncio.sleep(0.5)
+        if not await wait_for_selector_quietly(page, '[fid="1"]', menu_timeout_ms) or not await click_selector('[fid="1"]'):
+            logger.error("Failed to click settings button")
 
-        # Check if element exists with retry
-        el = None
-        for attempt in range(3):
-            try:
-                el = await page.query_selector(f'[f2id="{f2idx}"]')
-                if el:
-                    break
-                await asyncio.sleep(0.3)
-            except Exception as e:
-                logger.warning(f"Element query attempt {attempt + 1} failed: {e}")
-                await asyncio.sleep(0.3)
-        
-        if not el:
-            logger.info(f"❌ Element for f2id={f2idx} not found after retries")
+        if not await wait_for_selector_quietly(page, f'[f2id="{f2idx}"]', menu_timeout_ms):
+            logger.info(f"❌ Element for f2id={f2idx} not found")
             return False
 
-        # Click quality button with error handling
-        for attempt in range(3):
-            try:
-                await page.evaluate("""(f2idx) => {
-                    const el = document.querySelector(`[f2id="${f2idx}"]`);
-                    if (el) el.click();
-                }""", arg=f2idx)
-                break
-            except Exception as e:
-                logger.warning(f"Quality button click attempt {attempt + 1} failed: {e}")
-                if attempt < 2:
-                    await asyncio.sleep(0.5)
-                else:
-                    logger.error(f"Failed to click quality f2id={f2idx} after 3 attempts")
-
+        # Listen from just before the click, a fast CDN answers before a listener attached afterwards would
+        response = await click_and_wait_for_manifest(page, lambda: click_selector(f'[f2id="{f2idx}"]'))
         logger.info(f"[🔁] Clicked quality option f2id={f2idx} ({quality_label})")
-
-        # Attach listener only AFTER click
-        async def handle_response(response):
-            url = response.url
-            if (
-                    response.status == 200
-                    and ".m3u8" in url
-                    and "manifest" in url
-                    and quality_state["current"]
-            ):
-                headers = dict(response.request.headers)
-                m3u8_data = {
-                    "quality": quality_state["current"],
-                    "url": url,
-                    "headers": headers,
-                    "referer": headers.get("referer")
-                }
-                if m3u8_data not in extracted["all_m3u8"]:
-                    extracted["all_m3u8"].append(m3u8_data)
-                    logger.info(f"[🎥] {quality_state['current']} → {url}")
-                    quality_event.set()
-
-        page.on("response", handle_response)
-
-        try:
-            await asyncio.wait_for(quality_event.wait(), timeout=5)
-            page.remove_listener("response", handle_response)
-            return True
-        except asyncio.TimeoutError:
+        if response is None:
             logger.info(f"⚠️ Timeout waiting for .m3u8 after clicking {quality_label}")
-            page.remove_listener("response", handle_response)
             return False
 
+        headers = dict(response.request.headers)
+        m3u8_data = {
+            "quality": quality_label,
+            "url": response.url,
+            "headers": headers,
+            "referer": headers.get("referer")
+        }
+        if m3u8_data not in extracted["all_m3u8"]:
+            extracted["all_m3u8"].append(m3u8_data)
+            logger.info(f"[🎥] {quality_label} → {response.url}")
+        return True
+
     MAX_RETRIES = 3
     retry_count = 0
     missing_set = set(f2id_list)
@@ -541,8 +562,6 @@ async def extract_all_quality_variants(page, extracted: Dict):
     if missing_set:
         logger.info(f"❌ Failed to extract the following qualities after {MAX_RETRIES} retries: {sorted(missing_set)}")
 
-    quality_state["current"] = None
-
 
 async def find_dub_element_by_name(page, dub_name, lang):
     li_items = await page.query_selector_all("#translators-list li")
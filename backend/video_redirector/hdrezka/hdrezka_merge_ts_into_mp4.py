@@ -8,7 +8,10 @@ import certifi
 import aiohttp
 import ssl
 
-from backend.video_redirector.config import MAX_CONCURRENT_MERGES_OF_TS_INTO_MP4
+from backend.video_redirector.config import MAX_CONCURRENT_MERGES_OF_TS_INTO_MP4, MIN_MERGE_SEGMENTS_PER_PART
+from backend.video_redirector.utils.pyrogram_acc_manager import plan_part_count
+from backend.video_redirector.utils.content_hash_index import ffmpeg_hash_output_args, remove_hash_sidecar
+from backend.video_redirector.utils.bandwidth_governor import BANDWIDTH_GOVERNOR
 from backend.video_redirector.utils.notify_admin import notify_admin
 
 DOWNLOAD_DIR = "downloads"
@@ -19,7 +22,7 @@ status_tracker: Dict[str, Dict] = {}  # Example: {task_id: {"total": 0, "done":
 
 semaphore = asyncio.Semaphore(MAX_CONCURRENT_MERGES_OF_TS_INTO_MP4)
 
-NUM_OF_MP4_FILES_TO_CREATE = 3
+NUM_OF_MP4_FILES_TO_CREATE = 3  # minimum; more when idle upload accounts can take extra parts
 
 def get_system_metrics():
     """Get current system resource usage"""
@@ -187,10 +190,12 @@ async def monitor_parallel_merge_resources(task_id: str, merge_tasks: list, temp
         "avg_write_speed_mbps": avg_write_speed_mbps,
     }
 
-async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str]) -> Optional[list]:
+async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str], num_parts: Optional[int] = None) -> Optional[list]:
     """
-    Parallel merge strategy: split into 3 chunks, merge in parallel, return list of MP4 files
-    Returns: List of MP4 file paths [temp1.mp4, temp2.mp4, temp3.mp4] or None if failed
+    Parallel merge strategy: split into chunks, merge in parallel, return list of MP4 files
+    At least NUM_OF_MP4_FILES_TO_CREATE chunks, more if idle upload accounts can upload them in parallel
+    (pass `num_parts` to force a count).
+    Returns: List of MP4 file paths [temp1.mp4, temp2.mp4, temp3.mp4, ...] or None if failed
     """
     start_time = time.time()
 
@@ -207,6 +212,8 @@ async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str])
             async with asyncio.timeout(10):
                 async with aiohttp.ClientSession() as session:
                     async with session.get(m3u8_url, headers=headers, ssl=ssl_context) as resp:
+                        if resp.status != 200:
+                            raise Exception(f"HTTP {resp.status}")
                         m3u8_text = await resp.text()
             m3u8_time = time.time() - m3u8_start
     except Exception as e:
@@ -255,25 +262,30 @@ async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str])
             await notify_admin(f"❌ [{task_id}] No .ts segments found in playlist")
             return None
 
-        chunk_size = segment_count // NUM_OF_MP4_FILES_TO_CREATE
+        if num_parts is None:
+            num_parts = plan_part_count(NUM_OF_MP4_FILES_TO_CREATE, segment_count // MIN_MERGE_SEGMENTS_PER_PART)
+        num_parts = max(1, min(num_parts, segment_count))
+        chunk_size = segment_count // num_parts
         
         # Initialize status tracker for tracking one representative chunk (part 0)
         status_tracker[task_id] = {
             "total": chunk_size,  # Total segments in the representative chunk
             "done": 0,            # Completed segments
-            "progress": 0.0       # Progress percentage
+            "progress": 0.0,      # Progress percentage
+            "parts": num_parts,   # Files that will be uploaded when the merge finishes
+            "started_at": time.time()
         }
         
-        logger.debug(f"🔄 [{task_id}] Parallel merge: {segment_count} segments → {NUM_OF_MP4_FILES_TO_CREATE} parts "
+        logger.debug(f"🔄 [{task_id}] Parallel merge: {segment_count} segments → {num_parts} parts "
                    f"(~{chunk_size} segments per part)")
         
         # Create temporary M3U8 files for each chunk
         temp_m3u8_files = []
         temp_mp4_files = []
         
-        for part_num in range(NUM_OF_MP4_FILES_TO_CREATE):
+        for part_num in range(num_parts):
             start_idx = part_num * chunk_size
-            end_idx = start_idx + chunk_size if part_num < NUM_OF_MP4_FILES_TO_CREATE - 1 else segment_count
+            end_idx = start_idx + chunk_size if part_num < num_parts - 1 else segment_count
             
             # Create temporary M3U8 for this chunk
             temp_m3u8 = os.path.join(DOWNLOAD_DIR, f"{task_id}_part{part_num}.m3u8")
@@ -378,6 +390,7 @@ async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str])
             try:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
+                    remove_hash_sidecar(temp_file)
                     logger.debug(f"🧹 [{task_id}] Cleaned up partial file: {temp_file}")
             except Exception as cleanup_e:
                 logger.warning(f"⚠️ [{task_id}] Failed to cleanup partial file {temp_file}: {cleanup_e}")
@@ -387,6 +400,7 @@ async def merge_ts_to_mp4(task_id: str, m3u8_url: str, headers: Dict[str, str])
 async def merge_chunk_to_mp4(task_id: str, m3u8_file: str, output_file: str, headers: Dict[str, str]) -> bool:
     """Merge a single chunk M3U8 to MP4"""
     chunk_start_time = time.time()
+    governor_task = None
     try:
         # Count segments in this chunk for progress tracking
         with open(m3u8_file, 'r') as f:
@@ -419,7 +433,9 @@ async def merge_chunk_to_mp4(task_id: str, m3u8_file: str, output_file: str, hea
             "-probesize", "1M",
             "-analyzeduration", "10M",
             "-y",
-            output_file
+            output_file,
+            # Second output: content hash for upload deduplication, from the same single read
+            *ffmpeg_hash_output_args(output_file)
         ])
         
         process = await asyncio.create_subprocess_exec(
@@ -427,6 +443,8 @@ async def merge_chunk_to_mp4(task_id: str, m3u8_file: str, output_file: str, hea
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT
         )
+        # Merges get the bandwidth live viewing and uploads leave over
+        governor_task = asyncio.create_task(BANDWIDTH_GOVERNOR.govern_process(process.pid, "merge", task_id))
         
         # Monitor chunk progress and capture output
         processed_segments = 0
@@ -490,7 +508,31 @@ async def merge_chunk_to_mp4(task_id: str, m3u8_file: str, output_file: str, hea
     except Exception as e:
         logger.error(f"❌ [{task_id}] Chunk merge failed: {e}")
         return False
+    finally:
+        # Also on timeout, error or cancellation, so it doesn't keep polling a finished process
+        if governor_task is not None:
+            governor_task.cancel()
+            try:
+                await governor_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"[{task_id}] Bandwidth governor stopped with an error: {e}")
     
+def get_merge_etas() -> list:
+    """(seconds until merge done, parts it will produce) for every running merge; ETA is None until progress is known"""
+    etas = []
+    now = time.time()
+    for tracker in list(status_tracker.values()):
+        progress = tracker.get("progress", 0.0)
+        started_at = tracker.get("started_at")
+        eta = None
+        if started_at and progress > 0:
+            elapsed = now - started_at
+            eta = elapsed * (100 - progress) / progress
+        etas.append((eta, tracker.get("parts", NUM_OF_MP4_FILES_TO_CREATE)))
+    return etas
+
 def get_task_progress(task_id: str) -> Dict:
     if task_id not in status_tracker:
         return {
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import aiohttp
+
+from backend.video_redirector.config import HDREZKA_PAGE_CACHE_CONFIG
+from backend.video_redirector.utils.hdrezka_url import sanitize_hdrezka_url
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:135.0) Gecko/20100101 Firefox/135.0"
+
+
+class HdrezkaPageCache:
+    """
+    HDRezka movie pages fetched over one pooled HTTP session and kept for a few minutes per sanitized URL.
+
+    /hd/alldubs fetches a page to list its dubs, and the fast path extractors (with the download prefetch
+    they serve) need the same page moments later; other users open the same titles too. Entries also keep
+    what was parsed out of the page, so within the TTL a title is fetched and parsed once. Concurrent
+    fetches of one page are collapsed into one request.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # sanitized url -> {"html", "fetched_at", "parsed"}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Shared session for HDRezka page and AJAX requests: keep-alive connections and one cookie jar"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HDREZKA_PAGE_CACHE_CONFIG.get("connection_limit"), ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=HDREZKA_PAGE_CACHE_CONFIG.get("timeout_seconds")),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    def _entry(self, url: str) -> Optional[dict]:
+        key = sanitize_hdrezka_url(url)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["fetched_at"] > HDREZKA_PAGE_CACHE_CONFIG.get("ttl_seconds"):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, html: str):
+        if HDREZKA_PAGE_CACHE_CONFIG.get("ttl_seconds") <= 0:
+            return
+        self._entries[key] = {"html": html, "fetched_at": time.monotonic(), "parsed": {}}
+        self._entries.move_to_end(key)
+        while len(self._entries) > HDREZKA_PAGE_CACHE_CONFIG.get("max_entries"):
+            self._entries.popitem(last=False)
+
+    async def _fetch(self, url: str, key: str) -> Optional[str]:
+        started = time.perf_counter()
+        async with self.session.get(url) as resp:
+            if resp.status != 200:
+                logger.info(f"📄 Movie page {key} returned {resp.status}")
+                return None
+            html = await resp.text()
+        logger.debug(f"📄 Fetched {key} ({len(html) // 1024} KB) in {time.perf_counter() - started:.2f}s")
+        self._store(key, html)
+        return html
+
+    async def get(self, url: str) -> Optional[str]:
+        """HTML of the movie page, fetched unless a fresh copy is cached; None if the site didn't answer 200"""
+        entry = self._entry(url)
+        if entry:
+            self.hits += 1
+            return entry["html"]
+        key = sanitize_hdrezka_url(url)
+        future = self._inflight.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._fetch(url, key))
+            self._inflight[key] = future
+
+            def _done(f: asyncio.Future):
+                if self._inflight.get(key) is f:
+                    self._inflight.pop(key, None)
+                if not f.cancelled():
+                    f.exception()  # Retrieved here in case every waiter was cancelled
+
+            future.add_done_callback(_done)
+        # A cancelled caller mustn't cancel the fetch other callers wait for
+        return await asyncio.shield(future)
+
+    async def parsed(self, url: str, name: str, parse: Callable[[str], Any]) -> Any:
+        """parse(html) of the movie page, run in a worker thread and kept with the page as `name`"""
+        html = await self.get(url)
+        if html is None:
+            return None
+        entry = self._entry(url)
+        if entry and name in entry["parsed"]:
+            return entry["parsed"][name]
+        result = await asyncio.to_thread(parse, html)
+        if entry:
+            entry["parsed"][name] = result
+        return result
+
+    def clear(self):
+        self._entries.clear()
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+        }
+
+
+HDREZKA_PAGE_CACHE = HdrezkaPageCache()
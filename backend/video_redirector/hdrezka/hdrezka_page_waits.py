@@ -0,0 +1,80 @@
+import logging
+from typing import Awaitable, Callable, Optional
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from backend.video_redirector.config import HDREZKA_BROWSER_WAIT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PAGE_READY_SELECTOR = "#translators-list, #oframecdnplayer"  # single-dub pages have only the player
+PLAYER_SELECTOR = "#oframecdnplayer"
+PLAYER_SETTINGS_BUTTON_XPATH = '//*[@id="oframecdnplayer"]/pjsdiv[15]/pjsdiv[3]'
+TRANSLATOR_SWITCH_URL = "/ajax/get_cdn_series/"  # the player asks for the new streams here when a dub is chosen
+
+
+def is_manifest_response(response) -> bool:
+    return response.status == 200 and ".m3u8" in response.url and "manifest" in response.url
+
+
+async def wait_for_selector_quietly(page, selector: str, timeout_ms: int, state: str = "attached") -> bool:
+    """wait_for_selector that reports a timeout as False instead of raising"""
+    try:
+        await page.wait_for_selector(selector, timeout=timeout_ms, state=state)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+async def wait_for_page_ready(page) -> bool:
+    """After goto: the translators list or the player is in the DOM"""
+    ready = await wait_for_selector_quietly(page, PAGE_READY_SELECTOR, HDREZKA_BROWSER_WAIT_CONFIG.get("page_ready_timeout_ms"))
+    if not ready:
+        logger.warning(f"⚠️ Neither translators list nor player showed up on {page.url}")
+    return ready
+
+
+async def click_xpath_and_wait_for_mutation(page, xpath: str, root_selector: str = PLAYER_SELECTOR,
+                                            timeout_ms: Optional[int] = None) -> bool:
+    """
+    Click the element at xpath and resolve on the first DOM change under root_selector (a menu opened).
+    False if the element is missing or nothing changed within the timeout.
+    """
+    timeout_ms = timeout_ms or HDREZKA_BROWSER_WAIT_CONFIG.get("menu_timeout_ms")
+    return await page.evaluate("""
+        async ([xpath, rootSelector, timeoutMs]) => {
+            const el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            if (!el) return false;
+            const root = document.querySelector(rootSelector) || document.body;
+            const changed = new Promise(resolve => {
+                const observer = new MutationObserver(() => { observer.disconnect(); resolve(true); });
+                observer.observe(root, {subtree: true, childList: true, attributes: true});
+                setTimeout(() => { observer.disconnect(); resolve(false); }, timeoutMs);
+            });
+            el.click();
+            return await changed;
+        }
+    """, arg=[xpath, root_selector, timeout_ms])
+
+
+async def click_and_wait_for_manifest(page, click: Callable[[], Awaitable], timeout_ms: Optional[int] = None):
+    """Run click() and return the m3u8 manifest response it triggers, None on timeout"""
+    timeout_ms = timeout_ms or HDREZKA_BROWSER_WAIT_CONFIG.get("manifest_timeout_ms")
+    try:
+        async with page.expect_response(is_manifest_response, timeout=timeout_ms) as response_info:
+            await click()
+        return await response_info.value
+    except PlaywrightTimeoutError:
+        return None
+
+
+async def click_and_wait_for_dub_switch(page, click: Callable[[], Awaitable]) -> bool:
+    """Run click() on a translator and wait until the player fetched its streams and re-rendered"""
+    timeout_ms = HDREZKA_BROWSER_WAIT_CONFIG.get("dub_switch_timeout_ms")
+    try:
+        async with page.expect_response(lambda r: TRANSLATOR_SWITCH_URL in r.url, timeout=timeout_ms):
+            await click()
+    except PlaywrightTimeoutError:
+        logger.warning(f"⚠️ Player didn't ask for the new dub's streams within {timeout_ms} ms")
+        return False
+    return await wait_for_selector_quietly(page, f"xpath={PLAYER_SETTINGS_BUTTON_XPATH}", timeout_ms)
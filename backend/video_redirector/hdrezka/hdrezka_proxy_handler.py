@@ -5,6 +5,8 @@ from fastapi import Request, Response
 from starlette.responses import StreamingResponse, PlainTextResponse
 from urllib.parse import unquote, quote, urljoin
 from backend.video_redirector.utils.redis_client import RedisClient
+from backend.video_redirector.utils.bandwidth_governor import BANDWIDTH_GOVERNOR
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +55,9 @@ async def proxy_segment(movie_id: str, segment_encoded: str, request: Request) -
                 async with session.get(real_url, headers=FORWARD_HEADERS) as resp:
                     if resp.status != 200:
                         logger.warning(f"[Segment Error] {real_url} returned {resp.status} (attempt {attempt + 1}/{max_retries})")
+                        if resp.status == 403:
+                            # Signed URL expired or revoked: the next viewer must extract again
+                            await EXTRACTION_CACHE.invalidate_task(movie_id, "segment 403")
                         if attempt == max_retries - 1:
                             return PlainTextResponse(f"Segment failed after {max_retries} attempts", status_code=resp.status)
                         continue
@@ -66,6 +71,8 @@ async def proxy_segment(movie_id: str, segment_encoded: str, request: Request) -
                             return PlainTextResponse("Empty segment data", status_code=500)
                         continue
                     
+                    # Live viewing is never delayed, but its traffic makes uploads and merges yield
+                    BANDWIDTH_GOVERNOR.record("live", len(body))
                     logger.debug(f"[Segment Success] {real_url} - {len(body)} bytes")
                     return Response(content=body, media_type=content_type, status_code=200)
 
@@ -101,6 +108,8 @@ async def fetch_and_rewrite_m3u8(url: str, movie_id: str) -> Response:
             async with session.get(url, headers=FORWARD_HEADERS) as remote_response:
                 if remote_response.status != 200:
                     logger.error(f"[M3U8 Error] {url} returned {remote_response.status}")
+                    if remote_response.status == 403:
+                        await EXTRACTION_CACHE.invalidate_task(movie_id, "playlist 403")
                     return PlainTextResponse(f"Error fetching m3u8: {remote_response.status}", status_code=remote_response.status)
 
                 m3u8_text = await remote_response.text()
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from datetime import datetime
 
@@ -8,12 +9,19 @@ from pydantic import BaseModel
 from uuid import uuid4
 from urllib.parse import quote
 
-from backend.video_redirector.hdrezka.hdrezka_extract_to_watch import extract_with_recovery
+from backend.video_redirector.hdrezka.hdrezka_extract_to_watch import extract_with_cache
 from backend.video_redirector.hdrezka.hdrezka_proxy_handler import proxy_video, proxy_segment
 from backend.video_redirector.utils.templates import templates
 from backend.video_redirector.utils.redis_client import RedisClient
+from backend.video_redirector.utils.upload_progress_aggregator import UPLOAD_PROGRESS
+from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE
+from backend.video_redirector.utils.extraction_timing import EXTRACTION_TIMINGS
+from backend.video_redirector.utils.extraction_scheduler import EXTRACTION_SCHEDULER
+from backend.video_redirector.utils.extraction_prefetch import EXTRACTION_PREFETCHER
 
 from backend.video_redirector.hdrezka.hdrezka_all_dubs_scrapper import scrape_dubs_for_movie
+from backend.video_redirector.hdrezka.hdrezka_page_cache import HDREZKA_PAGE_CACHE
 from backend.video_redirector.hdrezka.hdrezka_download_setup import download_setup
 from backend.video_redirector.hdrezka.hdrezka_merge_ts_into_mp4 import get_task_progress
 
@@ -27,15 +35,51 @@ class MovieInput(BaseModel):
 
 router = APIRouter(prefix="/hd", tags=["HDRezka watch+download video"])
 
+async def publish_watch_config(task_id: str, result: dict):
+    """Store extraction result and its watch_config; the status goes to 'done' and clients can start playing"""
+    redis = RedisClient.get_client()
+    await redis.set(f"extract:{task_id}:raw", json.dumps(result), ex=3600)
+    await redis.set(f"extract:{task_id}:status", "extracted", ex=3600)
+
+    config_response = await get_watch_config(task_id)
+
+    if not config_response:
+        raise Exception("❌ watch_config was empty or None")
+
+    if isinstance(config_response, JSONResponse):
+        config = bytes(config_response.body).decode('utf-8')
+    else:
+        config = json.dumps(config_response)
+
+    if isinstance(config_response, JSONResponse):
+        body_content = bytes(config_response.body).decode('utf-8')
+        logger.info(f"[{task_id}] get_watch_config returned: {body_content}" )
+    else:
+        logger.info(f"[{task_id}] get_watch_config returned (non-JSON): {config_response}" )
+
+    await redis.set(f"extract:{task_id}:watch_config", config, ex=3600)
+    await redis.set(f"extract:{task_id}:status", "done", ex=3600)
+
+
 async def extract_and_generate_master_m3u8(task_id: str, url: str, lang: str):
     redis = RedisClient.get_client()
+    publish_lock = asyncio.Lock()
+
+    async def publish_partial(partial_result: dict):
+        # Dubs finish one by one; each publication carries all dubs ready so far
+        async with publish_lock:
+            ready = {l: dict(dubs) for l, dubs in partial_result.items()}
+            await publish_watch_config(task_id, ready)
+            logger.info(f"[extract:{task_id}] Published {sum(len(d) for d in ready.values())} ready dub(s)")
 
     try:
         # Step 1: Extraction with recovery
-        result = await extract_with_recovery(url, user_lang=lang, task_id=task_id)
-        await redis.set(f"extract:{task_id}:status", "extracted", ex=3600)
-        await redis.set(f"extract:{task_id}:raw", json.dumps(result), ex=3600)
+        result = await extract_with_cache(url, user_lang=lang, task_id=task_id, on_dub_ready=publish_partial)
         logger.info(f"[extract:{task_id}] Extraction done.")
+    except asyncio.CancelledError:
+        await redis.set(f"extract:{task_id}:status", "cancelled", ex=3600)
+        logger.info(f"[extract:{task_id}] Extraction cancelled")
+        raise
     except Exception as e:
         await redis.set(f"extract:{task_id}:status", "error", ex=3600)
         await redis.set(f"extract:{task_id}:error", str(e), ex=3600)
@@ -43,25 +87,8 @@ async def extract_and_generate_master_m3u8(task_id: str, url: str, lang: str):
         return  # Exit early if extraction failed
 
     try:
-        config_response = await get_watch_config(task_id)
-
-        if not config_response:
-            raise Exception("❌ watch_config was empty or None")
-
-        if isinstance(config_response, JSONResponse):
-            config = bytes(config_response.body).decode('utf-8')
-        else:
-            config = json.dumps(config_response)
-
-        if isinstance(config_response, JSONResponse):
-            body_content = bytes(config_response.body).decode('utf-8')
-            logger.info(f"[{task_id}] get_watch_config returned: {body_content}" )
-        else:
-            logger.info(f"[{task_id}] get_watch_config returned (non-JSON): {config_response}" )
-
-
-        await redis.set(f"extract:{task_id}:watch_config", config, ex=3600)
-        await redis.set(f"extract:{task_id}:status", "done", ex=3600)
+        async with publish_lock:
+            await publish_watch_config(task_id, result)
     except Exception as e:
         logger.info(f"[extract:{task_id}] Error building watch_config: {e}")
         await redis.set(f"extract:{task_id}:status", "error", ex=3600)
@@ -69,16 +96,32 @@ async def extract_and_generate_master_m3u8(task_id: str, url: str, lang: str):
 
 
 @router.post("/extract")
-async def extract_entry(data: MovieInput, background_tasks: BackgroundTasks):
+async def extract_entry(data: MovieInput):
     task_id = str(uuid4())
     redis = RedisClient.get_client()
     await redis.set(f"extract:{task_id}:status", "pending", ex=3600)
 
-    background_tasks.add_task(extract_and_generate_master_m3u8, task_id, data.url, data.lang)
+    # Browser work inside waits for an EXTRACTION_SCHEDULER slot; the job can be cancelled by task_id
+    EXTRACTION_SCHEDULER.submit(task_id, extract_and_generate_master_m3u8(task_id, data.url, data.lang))
     logger.info(f"[extract:{task_id}] Extraction started for {data.url}")
 
     return {"task_id": task_id, "status": "started"}
 
+@router.post("/extract/{task_id}/cancel")
+async def cancel_extraction(task_id: str):
+    """The user gave up waiting: free the queue place or the browser of this extraction"""
+    redis = RedisClient.get_client()
+    status = await redis.get(f"extract:{task_id}:status")
+    if not status:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if status in ("done", "error", "cancelled"):
+        return {"status": status, "cancelled": False}
+
+    cancelled = EXTRACTION_SCHEDULER.cancel(task_id)
+    if cancelled:
+        await redis.set(f"extract:{task_id}:status", "cancelled", ex=3600)
+    return {"status": "cancelled" if cancelled else status, "cancelled": cancelled}
+
 @router.get("/status/watch/{task_id}")
 async def check_watch_status(task_id: str):
     redis = RedisClient.get_client()
@@ -98,8 +141,13 @@ async def check_watch_status(task_id: str):
         logger.info(f"[status/watch:{task_id}] Returning error: {error}")
         return {"status": status, "error": error}
     else:
-        logger.info(f"[status/watch:{task_id}] Returning pending status: {status}")
-        return {"status": status}
+        response = {"status": status}
+        position = EXTRACTION_SCHEDULER.position(task_id)
+        if position:
+            response["queue_position"] = position
+            response["eta_seconds"] = EXTRACTION_SCHEDULER.eta_seconds(task_id)
+        logger.info(f"[status/watch:{task_id}] Returning pending status: {response}")
+        return response
 
 @router.get("/status/merge_progress/{task_id}")
 async def check_merge_status(task_id: str):
@@ -131,6 +179,9 @@ async def get_watch_config(task_id: str):
     if status == "pending":
         return JSONResponse(content={"error": "Extraction still pending"}, status_code=202)
 
+    if status == "cancelled":
+        return JSONResponse(content={"error": "Extraction was cancelled"}, status_code=410)
+
     if status == "extracted":
 
         raw_data = await redis.get(f"extract:{task_id}:raw")
@@ -276,28 +327,13 @@ async def check_full_download_status(task_id: str):
         # If uploading, add aggregated upload progress percent (slowest across parts/files)
         if status == "uploading":
             try:
-                # Aggregate percent from per-file/part progress
-                # Key is stored under parent task id; for safety, normalize any suffix
+                # Progress is kept under parent task id; for safety, normalize any suffix
                 parent_task_id = task_id.split("_file")[0] if "_file" in task_id else task_id
-                key = f"download:{parent_task_id}:upload_progress"
-                progress_map = await redis.hgetall(key)
-                try:
-                    logger.info(f"📦 [{task_id}] upload_progress hash '{key}' => {len(progress_map) if progress_map else 0} fields")
-                    if progress_map:
-                        logger.info(f"📦 [{task_id}] upload_progress sample: {list(progress_map.items())[:3]}")
-                except Exception:
-                    pass
-                if progress_map:
-                    # Values are strings; convert to ints and compute the slowest (min)
-                    percents = []
-                    for _, v in progress_map.items():
-                        try:
-                            percents.append(int(v))
-                        except Exception:
-                            continue
-                    if percents:
-                        response["upload_progress_percent"] = min(max(min(percents), 0), 100)
-                        logger.info(f"📈 [{task_id}] Aggregated upload_progress_percent={response['upload_progress_percent']}")
+                progress = await UPLOAD_PROGRESS.get_summary(parent_task_id)
+                if progress:
+                    response["upload_progress_percent"] = progress["min"]
+                    response["upload_progress_avg_percent"] = progress["avg"]
+                    logger.info(f"📈 [{task_id}] Aggregated upload progress: min={progress['min']}% avg={progress['avg']}% over {progress['parts']} parts")
             except Exception:
                 # Non-fatal if aggregation fails
                 pass
@@ -316,6 +352,12 @@ async def get_all_dubs(data: MovieInput):
         logger.info(f"Scraping dubs for URL: {data.url}, lang: {data.lang}")
         result = await scrape_dubs_for_movie(data.url, data.lang)
         logger.info(f"Scraping result: {result}")
+        if result.get("message") != "trailer_only":
+            # While the user reads the list, extract the dub they'll most likely pick
+            try:
+                await EXTRACTION_PREFETCHER.start(data.url, data.lang, result.get("dubs") or [])
+            except Exception as e:
+                logger.warning(f"Couldn't start prefetch for {data.url}: {e}")
         return JSONResponse(content=result)
     except Exception as e:
         logger.error(f"Failed to scrape dubs: {e}")
@@ -348,6 +390,18 @@ async def health_check():
             }
         )
 
+@router.get("/extraction/stats")
+async def extraction_stats():
+    """Where extraction time goes: per-step timings of the last hour, browser pool, caches and queue state"""
+    return {
+        "timings": EXTRACTION_TIMINGS.stats(),
+        "browser_pool": BROWSER_POOL.stats(),
+        "cache": EXTRACTION_CACHE.stats(),
+        "scheduler": EXTRACTION_SCHEDULER.stats(),
+        "prefetch": EXTRACTION_PREFETCHER.stats(),
+        "page_cache": HDREZKA_PAGE_CACHE.stats(),
+    }
+
 @router.get("/ping")
 async def ping():
     """Simple ping endpoint for basic connectivity check"""
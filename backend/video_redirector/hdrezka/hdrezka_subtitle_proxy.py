@@ -37,13 +37,12 @@ async def proxy_subtitle(task_id: str, dub_name: str, lang: str):
 @router.get("/subs/{task_id}.vtt")
 async def fallback_subtitle_proxy(task_id: str):
     redis = RedisClient.get_client()
-    # Your extractor saves with no dub/lang, just single flat fallback
-    keys = await redis.keys(f"subs:{task_id}:fallback")
-    if not keys:
+    # The extractor saves one fallback per dub, this serves the dub that captured one first
+    dub_key = await redis.get(f"subs:{task_id}:fallback_dub")
+    if not dub_key:
         return Response(content="Fallback subtitle not found", status_code=404)
 
-    first_key = keys[0]
-    subtitle_url = await redis.get(first_key)
+    subtitle_url = await redis.get(f"subs:{task_id}:{dub_key}:fallback")
     if not subtitle_url:
         return Response(content="Subtitle URL missing", status_code=404)
 
@@ -12,8 +12,12 @@ from backend.video_redirector.routes.mirror_search_route import  router as mirro
 from backend.video_redirector.routes.tg_id_movies import router as tg_id_route
 from backend.video_redirector.routes.user_routes import router as user_routes
 from backend.video_redirector.routes.youtube_routes import router as youtube_routes
-from backend.video_redirector.utils.pyrogram_acc_manager import UPLOAD_ACCOUNT_POOL
-from backend.video_redirector.utils.upload_video_to_tg import set_main_event_loop
+from backend.video_redirector.utils.pyrogram_acc_manager import UPLOAD_ACCOUNT_POOL, UPLOAD_SCHEDULER
+from backend.video_redirector.db.session import get_db
+from backend.video_redirector.utils.upload_health_store import UPLOAD_HEALTH_STORE
+from backend.video_redirector.utils.pyrogram_memory_session import flush_session_storages
+from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
+from backend.video_redirector.hdrezka.hdrezka_page_cache import HDREZKA_PAGE_CACHE
 
 if not logging.getLogger().hasHandlers():
     logging.basicConfig(
@@ -34,17 +38,26 @@ else:
 @asynccontextmanager
 async def lifespan(app_as: FastAPI):
     await RedisClient.init()
-    # Persist reference to the main loop so progress callbacks can schedule tasks
-    try:
-        import asyncio
-        set_main_event_loop(asyncio.get_running_loop())
-    except Exception:
-        pass
     await start_background_workers()
     yield
+    # Don't lose upload counters that are still waiting for the batched flush
+    try:
+        async with get_db() as db:
+            await UPLOAD_SCHEDULER.flush_stats(db)
+    except Exception as e:
+        logger.error(f"❌ Failed to flush upload stats on shutdown: {e}")
+    try:
+        await UPLOAD_HEALTH_STORE.sync_once()
+        await UPLOAD_HEALTH_STORE.release_all_leases()
+    except Exception as e:
+        logger.error(f"❌ Failed to persist upload health state on shutdown: {e}")
+    await BROWSER_POOL.close()
+    await HDREZKA_PAGE_CACHE.close()
     await RedisClient.close()
     for account in UPLOAD_ACCOUNT_POOL:
         await account.stop_client()
+    # After the clients stopped, so their last session changes are included
+    await flush_session_storages()
 
 app = FastAPI(lifespan=lifespan)
 
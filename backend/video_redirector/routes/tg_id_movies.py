@@ -3,9 +3,11 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.video_redirector.db.session import get_db_dep
-from backend.video_redirector.db.crud_downloads import get_file_id, get_parts_for_downloaded_file, get_files_by_tmdb_and_lang, cleanup_expired_file
+from backend.video_redirector.db.crud_downloads import get_file_id, get_downloaded_file, get_parts_for_downloaded_file, get_files_by_tmdb_and_lang, cleanup_expired_file
 from backend.video_redirector.utils.validate_tg_file_ids import validate_all_file_ids, validate_file_by_id
 from backend.video_redirector.db.crud_downloads import update_file_part_file_id
+from backend.video_redirector.utils.file_repair import schedule_file_repair
+from backend.video_redirector.hdrezka.hdrezka_download_executor import delivery_bot_username
 from pydantic import BaseModel
 from typing import Optional
 
@@ -23,6 +25,9 @@ class FileIDCreateRequest(BaseModel):
 
 class CleanupExpiredFileRequest(BaseModel):
     telegram_file_id: str
+    tg_user_id: Optional[int] = None  # user who hit the expired file; gets the title once it's repaired
+    user_lang: Optional[str] = None
+    delivery_bot_id: Optional[int] = None  # delivery bot the user was talking to, the repaired title comes through it
 
 class ValidationRequest(BaseModel):
     downloaded_file_id: Optional[int] = None  # If None, validate all files
@@ -51,7 +56,8 @@ async def get_all_movie_parts(
             "parts": [
                 {
                     "part_number": part.part_number,
-                    "telegram_file_id": part.telegram_file_id
+                    "telegram_file_id": part.telegram_file_id,
+                    "tg_bot_token_file_owner": part.tg_bot_token_file_owner or file_entry.tg_bot_token_file_owner
                 }
                 for part in parts
             ]
@@ -70,12 +76,20 @@ async def get_all_movie_parts_by_id(
     db: AsyncSession = Depends(get_db_dep),
 ):
     try:
+        file_entry = await get_downloaded_file(db, db_id)
+        if not file_entry:
+            logger.warning(f"File not found: db_id={db_id}")
+            raise HTTPException(status_code=404, detail="File not found")
+
         parts = await get_parts_for_downloaded_file(db, db_id)
+        # Same owner fallback as /all_movie_parts: parts without their own bot belong to the file's bot
         return {
+            "tg_bot_token_file_owner": file_entry.tg_bot_token_file_owner,
             "parts": [
                 {
                     "part_number": part.part_number,
-                    "telegram_file_id": part.telegram_file_id
+                    "telegram_file_id": part.telegram_file_id,
+                    "tg_bot_token_file_owner": part.tg_bot_token_file_owner or file_entry.tg_bot_token_file_owner
                 }
                 for part in parts
             ]
@@ -103,7 +117,8 @@ async def get_all_dubs_in_db_for_selected_movie_route(
                 "lang": entry.lang,
                 "dub": entry.dub,
                 "quality": entry.quality,
-                "tg_bot_token_file_owner": entry.tg_bot_token_file_owner
+                "tg_bot_token_file_owner": entry.tg_bot_token_file_owner,
+                "delivery_bot_username": delivery_bot_username(entry.tg_bot_token_file_owner)
             }
             for entry in entries
         ]
@@ -133,7 +148,8 @@ async def get_all_dubs_in_db_for_selected_movie_by_url(
                 "lang": entry.lang,
                 "dub": entry.dub,
                 "quality": entry.quality,
-                "tg_bot_token_file_owner": entry.tg_bot_token_file_owner
+                "tg_bot_token_file_owner": entry.tg_bot_token_file_owner,
+                "delivery_bot_username": delivery_bot_username(entry.tg_bot_token_file_owner)
             }
             for entry in entries
         ]
@@ -161,6 +177,14 @@ async def cleanup_expired_file_route(
         
         if result["success"]:
             logger.info(f"Successfully cleaned up expired file: {result}")
+            # Re-upload from the retention cache or re-download with priority; the user is notified when done
+            repair = await schedule_file_repair(result, payload.tg_user_id, payload.user_lang, payload.delivery_bot_id)
+            if repair:
+                logger.info(f"🛠️ Repairing tmdb_id={result['tmdb_id']} {result['lang']}/{result['dub']} "
+                            f"({repair['mode']}), task {repair['task_id']}")
+                result["repairing"] = True
+                result["repair_mode"] = repair["mode"]
+                result["repair_task_id"] = repair["task_id"]
         else:
             logger.warning(f"Cleanup failed: {result}")
             
@@ -5,12 +5,23 @@ from zoneinfo import ZoneInfo
 from backend.video_redirector.utils.download_queue_manager import DownloadQueueManager
 from backend.video_redirector.utils.pyrogram_acc_manager import (
     idle_client_cleanup, 
+    proxy_probe_worker,
     initialize_all_accounts_in_db,
-    diagnose_account_distribution
+    diagnose_account_distribution,
+    UPLOAD_SCHEDULER,
+    UPLOAD_ACCOUNT_POOL,
+    SESSION_DIR
 )
+from backend.video_redirector.utils.pyrogram_memory_session import preload_session_storages, session_writeback_worker
+from backend.video_redirector.utils.upload_health_store import UPLOAD_HEALTH_STORE
+from backend.video_redirector.utils.upload_progress_aggregator import UPLOAD_PROGRESS
+from backend.video_redirector.utils.upload_client_warm_pool import UPLOAD_WARM_POOL
+from backend.video_redirector.utils.bandwidth_governor import BANDWIDTH_GOVERNOR
+from backend.video_redirector.utils.camoufox_browser_pool import BROWSER_POOL
 from backend.video_redirector.utils.rate_limit_monitor import setup_pyrogram_rate_limit_monitoring
 from backend.video_redirector.utils.validate_tg_file_ids import validate_all_file_ids
 from backend.video_redirector.db.session import get_db
+from backend.video_redirector.config import PROXY_CONFIG, UPLOAD_WARM_POOL_CONFIG, PYROGRAM_SESSION_STORAGE, BANDWIDTH_CONFIG, CAMOUFOX_POOL_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +40,9 @@ async def initialize_accounts_in_database():
                 logger.info(f"✅ Successfully initialized {initialized_count} accounts in database")
             else:
                 logger.info("✅ All accounts already properly initialized in database")
+
+            # Seed the in-memory scheduler with today's upload counts
+            await UPLOAD_SCHEDULER.load_stats(db)
             # session context ends here
     except Exception as e:
         logger.error(f"❌ Error initializing accounts in database: {e}")
@@ -71,7 +85,28 @@ async def scheduled_file_id_validation():
 
 async def start_background_workers():
     await initialize_accounts_in_database()  # Initialize accounts in database
+    await UPLOAD_HEALTH_STORE.load_all(UPLOAD_ACCOUNT_POOL)  # Remember bad proxies / quarantines across deploys
+    asyncio.create_task(UPLOAD_HEALTH_STORE.sync_worker())  # Share health state and renew account leases
+    if PYROGRAM_SESSION_STORAGE == "memory":
+        loaded = await asyncio.to_thread(
+            preload_session_storages, SESSION_DIR, [acc.session_name for acc in UPLOAD_ACCOUNT_POOL]
+        )
+        logger.info(f"🧠 Loaded {loaded}/{len(UPLOAD_ACCOUNT_POOL)} Pyrogram sessions into memory")
+        asyncio.create_task(session_writeback_worker())  # Atomic write-back of changed sessions
     asyncio.create_task(DownloadQueueManager.queue_worker())
-    asyncio.create_task(idle_client_cleanup())
+    if UPLOAD_WARM_POOL_CONFIG.get("enabled"):
+        asyncio.create_task(UPLOAD_WARM_POOL.worker())  # Pre-connect clients ahead of demand, adaptive idle stop
+    else:
+        asyncio.create_task(idle_client_cleanup())
+    asyncio.create_task(UPLOAD_SCHEDULER.stats_flush_worker())  # Batched write-back of upload stats
+    asyncio.create_task(UPLOAD_PROGRESS.flush_worker())  # Batched Redis writes of upload progress
+    if PROXY_CONFIG.get("probe_enabled"):
+        asyncio.create_task(proxy_probe_worker())  # Measure idle proxies ahead of uploads
+    if BANDWIDTH_GOVERNOR.enabled and BANDWIDTH_CONFIG.get("redis_coordination"):
+        asyncio.create_task(BANDWIDTH_GOVERNOR.sync_worker())  # Share bandwidth demand between workers
+    if BROWSER_POOL.enabled:
+        if CAMOUFOX_POOL_CONFIG.get("warm_on_startup"):
+            asyncio.create_task(BROWSER_POOL.warm_up())  # First extraction doesn't wait for Firefox to start
+        asyncio.create_task(BROWSER_POOL.health_worker())  # Relaunch browsers that died while idle
     asyncio.create_task(scheduled_file_id_validation())  # Add file ID validation task
     setup_pyrogram_rate_limit_monitoring()
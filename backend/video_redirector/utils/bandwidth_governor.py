@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict
+
+import psutil
+
+from backend.video_redirector.config import BANDWIDTH_CONFIG
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first: a class may use whatever the classes before it don't
+TRAFFIC_CLASSES = ("live", "upload", "merge")
+DEMAND_KEY = "bandwidth:demand"  # hash: {host}:{pid}:{class} -> "{bytes_per_second}:{timestamp}"
+DEMAND_WINDOW_SECONDS = 1.0
+DEMAND_EWMA_ALPHA = 0.5
+MAX_DELAY_SECONDS = 2.0  # longest single pause; keeps ffmpeg/Telegram connections from timing out
+
+
+class BandwidthGovernor:
+    """
+    Process-wide token buckets per traffic class sharing one NIC budget (BANDWIDTH_CONFIG total_mbps).
+
+    Each class measures its recent throughput (its demand). A class is allowed the capacity left
+    over by higher-priority classes, but never less than its min share. Live viewing is only
+    measured, never delayed. Uploads are paced from the Pyrogram progress hook, which runs in an
+    executor thread and is awaited between chunks. Merges are ffmpeg processes, so they are
+    paced by briefly suspending the process when it overdraws its bucket.
+
+    With redis_coordination the demand of every worker process is shared through Redis, so a
+    viewer served by one worker slows down uploads in another.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        now = time.monotonic()
+        self._tokens: Dict[str, float] = {cls: 0.0 for cls in TRAFFIC_CLASSES}
+        self._last_refill: Dict[str, float] = {cls: now for cls in TRAFFIC_CLASSES}
+        self._demand: Dict[str, float] = {cls: 0.0 for cls in TRAFFIC_CLASSES}  # bytes/s, EWMA
+        self._window_bytes: Dict[str, int] = {cls: 0 for cls in TRAFFIC_CLASSES}
+        self._window_start = now
+        self._remote_demand: Dict[str, float] = {cls: 0.0 for cls in TRAFFIC_CLASSES}
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def enabled(self) -> bool:
+        return BANDWIDTH_CONFIG.get("total_mbps") > 0
+
+    @staticmethod
+    def _capacity() -> float:
+        return BANDWIDTH_CONFIG.get("total_mbps") * 1024 * 1024 / 8
+
+    def _roll_demand(self, now: float):
+        elapsed = now - self._window_start
+        if elapsed < DEMAND_WINDOW_SECONDS:
+            return
+        for cls in TRAFFIC_CLASSES:
+            rate = self._window_bytes[cls] / elapsed
+            self._demand[cls] = DEMAND_EWMA_ALPHA * rate + (1 - DEMAND_EWMA_ALPHA) * self._demand[cls]
+            self._window_bytes[cls] = 0
+        self._window_start = now
+
+    def allowed_rate(self, cls: str) -> float:
+        """Bytes/s this class may use now"""
+        capacity = self._capacity()
+        higher = TRAFFIC_CLASSES[:TRAFFIC_CLASSES.index(cls)]
+        used_by_higher = sum(self._demand[h] + self._remote_demand[h] for h in higher)
+        floor = BANDWIDTH_CONFIG.get("min_share", {}).get(cls, 0.0) * capacity
+        return max(floor, capacity - used_by_higher)
+
+    def _take(self, cls: str, nbytes: int) -> float:
+        """Spend tokens; returns how long the caller should wait to stay within its rate"""
+        if nbytes <= 0 or not self.enabled:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._roll_demand(now)
+            self._window_bytes[cls] += nbytes
+            rate = max(1.0, self.allowed_rate(cls))
+            burst = rate * BANDWIDTH_CONFIG.get("burst_seconds")
+            self._tokens[cls] = min(burst, self._tokens[cls] + rate * (now - self._last_refill[cls]))
+            self._last_refill[cls] = now
+            self._tokens[cls] -= nbytes
+            if self._tokens[cls] >= 0:
+                return 0.0
+            return -self._tokens[cls] / rate
+
+    def record(self, cls: str, nbytes: int):
+        """Account traffic that must not be delayed (live viewing)"""
+        self._take(cls, nbytes)
+
+    async def acquire(self, cls: str, nbytes: int):
+        delay = self._take(cls, nbytes)
+        if delay > 0:
+            await asyncio.sleep(min(delay, MAX_DELAY_SECONDS))
+
+    def throttle_blocking(self, cls: str, nbytes: int):
+        """For sync callers on worker threads (Pyrogram progress callbacks)"""
+        delay = self._take(cls, nbytes)
+        if delay > 0:
+            time.sleep(min(delay, MAX_DELAY_SECONDS))
+
+    async def govern_process(self, pid: int, cls: str, label: str = ""):
+        """Pace a subprocess by its read bytes (sockets included); run as a task until cancelled"""
+        if not self.enabled:
+            return
+        try:
+            proc = psutil.Process(pid)
+            last_read = proc.io_counters().read_chars
+        except (psutil.Error, AttributeError) as e:
+            logger.debug(f"[{label}] Can't govern process {pid}: {e}")
+            return
+        interval = BANDWIDTH_CONFIG.get("process_check_interval_seconds")
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current_read = proc.io_counters().read_chars
+            except psutil.Error:
+                return
+            delay = self._take(cls, current_read - last_read)
+            last_read = current_read
+            if delay <= 0:
+                continue
+            pause = min(delay, MAX_DELAY_SECONDS)
+            logger.debug(f"🚦 [{label}] Pausing {cls} process {pid} for {pause:.2f}s (bandwidth budget)")
+            try:
+                proc.suspend()
+                try:
+                    await asyncio.sleep(pause)
+                finally:
+                    proc.resume()
+            except psutil.Error:
+                return
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            self._roll_demand(time.monotonic())
+            return {
+                cls: {
+                    "demand_mbps": round(self._demand[cls] * 8 / (1024 * 1024), 2),
+                    "remote_demand_mbps": round(self._remote_demand[cls] * 8 / (1024 * 1024), 2),
+                    "allowed_mbps": round(self.allowed_rate(cls) * 8 / (1024 * 1024), 2) if self.enabled else None,
+                }
+                for cls in TRAFFIC_CLASSES
+            }
+
+    async def sync_once(self):
+        redis = RedisClient.get_client()
+        now = time.time()
+        with self._lock:
+            self._roll_demand(time.monotonic())
+            own = {f"{self._worker_id}:{cls}": f"{self._demand[cls]}:{now}" for cls in TRAFFIC_CLASSES}
+        pipe = redis.pipeline(transaction=False)
+        pipe.hset(DEMAND_KEY, mapping=own)
+        pipe.expire(DEMAND_KEY, 60)
+        pipe.hgetall(DEMAND_KEY)
+        _, _, all_demand = await pipe.execute()
+
+        stale_after = BANDWIDTH_CONFIG.get("sync_interval_seconds") * 5
+        remote = {cls: 0.0 for cls in TRAFFIC_CLASSES}
+        stale_fields = []
+        for field, value in (all_demand or {}).items():
+            if field.startswith(f"{self._worker_id}:"):
+                continue
+            try:
+                cls = field.rsplit(":", 1)[1]
+                rate, ts = value.split(":", 1)
+                if now - float(ts) > stale_after:
+                    stale_fields.append(field)
+                    continue
+                if cls in remote:
+                    remote[cls] += float(rate)
+            except (ValueError, IndexError):
+                stale_fields.append(field)
+        if stale_fields:
+            await redis.hdel(DEMAND_KEY, *stale_fields)
+        with self._lock:
+            self._remote_demand = remote
+
+    async def sync_worker(self):
+        interval = BANDWIDTH_CONFIG.get("sync_interval_seconds")
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.debug(f"Bandwidth demand sync failed: {e}")
+
+
+BANDWIDTH_GOVERNOR = BandwidthGovernor()
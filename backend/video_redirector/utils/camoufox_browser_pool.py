@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from camoufox.async_api import AsyncCamoufox
+
+from backend.video_redirector.config import CAMOUFOX_POOL_CONFIG, EXTRACTION_REQUEST_BLOCKING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CAMOUFOX_LAUNCH_OPTIONS = dict(window=(1280, 720), headless=True)
+
+# Messages of errors after which the browser process is not trusted anymore
+BROWSER_CRASH_MARKERS = (
+    "Target closed",
+    "Browser has been closed",
+    "Target page, context or browser has been closed",
+    "Connection closed",
+    "browser has disconnected",
+)
+
+
+def _launch_options() -> dict:
+    return dict(CAMOUFOX_LAUNCH_OPTIONS, humanize=CAMOUFOX_POOL_CONFIG.get("humanize"))
+
+
+def blocked_request_reason(resource_type: str, url: str) -> Optional[str]:
+    """Why an extraction page shouldn't load this request ("image", "host"...), None to let it through"""
+    if resource_type in EXTRACTION_REQUEST_BLOCKING_CONFIG.get("resource_types"):
+        return resource_type
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    for blocked in EXTRACTION_REQUEST_BLOCKING_CONFIG.get("hosts"):
+        blocked_host, _, blocked_path = blocked.partition("/")
+        if host != blocked_host and not host.endswith("." + blocked_host):
+            continue
+        if parsed.path.startswith("/" + blocked_path):
+            return "host"
+    return None
+
+
+class BrowserPoolBusyError(Exception):
+    """Too many extractions are already waiting for a browser"""
+    pass
+
+
+class _BrowserSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.manager: Optional[AsyncCamoufox] = None
+        self.browser = None
+        self.launched_at = 0.0
+        self.uses = 0
+        self.active = 0
+        self.retiring = False  # relaunch once the contexts still open on it are closed
+        self.lock = asyncio.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+
+class CamoufoxBrowserPool:
+    """
+    Warm Camoufox browsers shared by HDRezka extractions.
+
+    Each extraction gets a fresh browser context (own cookies and storage) on one of `size` long-lived
+    browsers instead of launching and tearing down Firefox. A browser hosts up to `pages_per_browser`
+    contexts at a time and is relaunched after `max_uses` contexts, after a crash, or when it is found
+    disconnected. Callers beyond capacity wait up to `acquire_timeout` seconds; more than `max_waiters`
+    waiting callers are turned away with BrowserPoolBusyError.
+    """
+
+    def __init__(self):
+        self._slots: List[_BrowserSlot] = [_BrowserSlot(i) for i in range(max(1, CAMOUFOX_POOL_CONFIG.get("size")))]
+        self._capacity = asyncio.Semaphore(len(self._slots) * max(1, CAMOUFOX_POOL_CONFIG.get("pages_per_browser")))
+        self._waiting = 0
+        self.launches = 0
+        self.blocked_requests = Counter()  # by reason: resource type or "host"
+
+    @property
+    def enabled(self) -> bool:
+        return CAMOUFOX_POOL_CONFIG.get("enabled")
+
+    # --- browser lifecycle ---
+
+    async def _launch(self, slot: _BrowserSlot):
+        started = time.perf_counter()
+        manager = AsyncCamoufox(**_launch_options())
+        slot.browser = await manager.__aenter__()
+        slot.manager = manager
+        slot.launched_at = time.time()
+        slot.uses = 0
+        slot.retiring = False
+        self.launches += 1
+        logger.info(f"🦊 Browser {slot.index} launched in {time.perf_counter() - started:.1f}s")
+
+    @staticmethod
+    async def _close(slot: _BrowserSlot):
+        manager, slot.manager, slot.browser = slot.manager, None, None
+        if manager is None:
+            return
+        try:
+            await manager.__aexit__(None, None, None)
+        except Exception as e:
+            logger.debug(f"Browser {slot.index} didn't close cleanly: {e}")
+
+    async def _ensure_browser(self, slot: _BrowserSlot):
+        async with slot.lock:
+            if not slot.healthy:
+                if slot.manager is not None:
+                    logger.warning(f"⚠️ Browser {slot.index} disconnected, relaunching")
+                await self._close(slot)
+                await self._launch(slot)
+            return slot.browser
+
+    async def _retire_if_idle(self, slot: _BrowserSlot):
+        async with slot.lock:
+            if slot.retiring and slot.active == 0:
+                logger.info(f"♻️ Recycling browser {slot.index} after {slot.uses} extraction(s)")
+                await self._close(slot)
+                slot.retiring = False
+
+    def _pick_slot(self) -> _BrowserSlot:
+        per_browser = CAMOUFOX_POOL_CONFIG.get("pages_per_browser")
+        candidates = [s for s in self._slots if not s.retiring and s.active < per_browser]
+        # Prefer an already running browser, then the least loaded one
+        return min(candidates or self._slots, key=lambda s: (not s.healthy, s.active))
+
+    async def _filter_request(self, route):
+        request = route.request
+        reason = blocked_request_reason(request.resource_type, request.url)
+        try:
+            if reason is None:
+                await route.continue_()
+                return
+            self.blocked_requests[reason] += 1
+            await route.abort("blockedbyclient")
+        except Exception as e:
+            # The page was closed while the request was in flight
+            logger.debug(f"Couldn't route {request.url[:80]}: {e}")
+
+    async def _block_unneeded_requests(self, target):
+        """Route interception on a context (or page) so images, fonts and trackers are never fetched"""
+        if EXTRACTION_REQUEST_BLOCKING_CONFIG.get("enabled"):
+            await target.route("**/*", self._filter_request)
+
+    @staticmethod
+    def _is_crash(error: Exception) -> bool:
+        message = str(error)
+        return any(marker.lower() in message.lower() for marker in BROWSER_CRASH_MARKERS)
+
+    # --- public API ---
+
+    @asynccontextmanager
+    async def page(self, task_id: Optional[str] = None):
+        """A new page in a fresh context of a warm browser; the context is closed on exit"""
+        prefix = f"[{task_id}] " if task_id else ""
+        if not self.enabled:
+            # Pool switched off: one throwaway browser per extraction, like before. An explicit context,
+            # browser.new_page() pages own theirs and refuse the sibling pages watch extraction opens
+            async with AsyncCamoufox(**_launch_options()) as browser:
+                context = await browser.new_context()
+                await self._block_unneeded_requests(context)
+                try:
+                    yield await context.new_page()
+                finally:
+                    await context.close()
+            return
+
+        if self._waiting >= CAMOUFOX_POOL_CONFIG.get("max_waiters"):
+            raise BrowserPoolBusyError(f"{self._waiting} extractions already waiting for a browser")
+        self._waiting += 1
+        wait_started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._capacity.acquire(), timeout=CAMOUFOX_POOL_CONFIG.get("acquire_timeout"))
+        except asyncio.TimeoutError:
+            raise BrowserPoolBusyError(f"No browser free after {CAMOUFOX_POOL_CONFIG.get('acquire_timeout')}s")
+        finally:
+            self._waiting -= 1
+        waited = time.perf_counter() - wait_started
+        if waited > 1:
+            logger.info(f"⏳ {prefix}Waited {waited:.1f}s for a browser")
+
+        slot = self._pick_slot()
+        slot.active += 1
+        context = None
+        try:
+            browser = await self._ensure_browser(slot)
+            context = await browser.new_context()
+            # On the context, so sibling pages opened by the extractors are filtered too
+            await self._block_unneeded_requests(context)
+            yield await context.new_page()
+        except Exception as e:
+            if self._is_crash(e) or not slot.healthy:
+                logger.warning(f"⚠️ {prefix}Browser {slot.index} looks broken ({e}), it will be relaunched")
+                slot.retiring = True
+            raise
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.debug(f"{prefix}Context close failed on browser {slot.index}: {e}")
+                    slot.retiring = True
+            slot.active -= 1
+            slot.uses += 1
+            if slot.uses >= CAMOUFOX_POOL_CONFIG.get("max_uses"):
+                slot.retiring = True
+            self._capacity.release()
+            await self._retire_if_idle(slot)
+
+    async def warm_up(self):
+        """Launch the browsers ahead of the first extraction"""
+        if not self.enabled:
+            return
+        for slot in self._slots:
+            try:
+                await self._ensure_browser(slot)
+            except Exception as e:
+                logger.error(f"❌ Couldn't launch browser {slot.index} for the pool: {e}")
+
+    async def health_worker(self):
+        """Relaunch idle browsers that died between extractions, so the next user doesn't pay for it"""
+        interval = CAMOUFOX_POOL_CONFIG.get("health_check_interval_seconds")
+        while True:
+            await asyncio.sleep(interval)
+            for slot in self._slots:
+                if slot.active or slot.manager is None or slot.healthy:
+                    continue
+                try:
+                    await self._ensure_browser(slot)
+                except Exception as e:
+                    logger.error(f"❌ Health check couldn't relaunch browser {slot.index}: {e}")
+
+    async def close(self):
+        for slot in self._slots:
+            async with slot.lock:
+                await self._close(slot)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "browsers": [
+                {
+                    "index": slot.index,
+                    "running": slot.healthy,
+                    "active_pages": slot.active,
+                    "uses": slot.uses,
+                    "uptime_seconds": int(time.time() - slot.launched_at) if slot.healthy else 0,
+                }
+                for slot in self._slots
+            ],
+            "waiting": self._waiting,
+            "launches": self.launches,
+            "blocked_requests": dict(self.blocked_requests),
+        }
+
+
+BROWSER_POOL = CamoufoxBrowserPool()
@@ -0,0 +1,111 @@
+import logging
+import os
+import subprocess
+from typing import Optional
+
+from backend.video_redirector.db.crud_downloads import get_file_id_by_content_hash, save_content_hash
+
+logger = logging.getLogger(__name__)
+
+HASH_SIDECAR_SUFFIX = ".sha256"
+
+
+def hash_sidecar_path(media_path: str) -> str:
+    return f"{media_path}{HASH_SIDECAR_SUFFIX}"
+
+
+def ffmpeg_hash_output_args(media_path: str, duration: Optional[float] = None) -> list:
+    """
+    Extra ffmpeg output that hashes the same packets the main output gets.
+
+    Append after the main output file: ffmpeg reads the input once and feeds both outputs, so the
+    hash costs no extra read. It is a hash of the stream packets, not of the container bytes
+    (+faststart moves the moov atom afterwards), so identical media hashes identically.
+    Output options are per output: pass the main output's -t as `duration`, or the hash runs on
+    to the end of the input.
+    """
+    duration_args = ["-t", str(int(duration))] if duration is not None else []
+    return [*duration_args, "-c", "copy", "-f", "hash", "-hash", "sha256", "-y", hash_sidecar_path(media_path)]
+
+
+def verify_content_hash(media_path: str, task_id: str) -> bool:
+    """
+    Hash the written file on its own and compare it with its sidecar; drop the sidecar on a mismatch.
+
+    For outputs cut out of a bigger input, where a wrong hash would dedupe one part onto another.
+    The file was just written, so this reads it back from the page cache.
+    """
+    expected = read_content_hash(media_path)
+    if not expected:
+        return False
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-v", "error", "-i", media_path, "-c", "copy", "-f", "hash", "-hash", "sha256", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120
+        )
+        line = result.stdout.strip()
+        actual = line.split("=", 1)[1].lower() if result.returncode == 0 and "=" in line else None
+    except Exception as e:
+        logger.debug(f"[{task_id}] Couldn't re-hash {media_path}: {e}")
+        actual = None
+    if actual == expected:
+        return True
+    logger.warning(f"⚠️ [{task_id}] Content hash of {os.path.basename(media_path)} doesn't match the file alone, "
+                   f"it won't be deduplicated")
+    remove_hash_sidecar(media_path)
+    return False
+
+
+def read_content_hash(media_path: str) -> Optional[str]:
+    """SHA256 written by ffmpeg's hash muxer ("SHA256=<hex>"), or None if there is no sidecar"""
+    try:
+        with open(hash_sidecar_path(media_path), "r") as f:
+            line = f.read().strip()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Couldn't read hash sidecar of {media_path}: {e}")
+        return None
+    if "=" not in line:
+        return None
+    algorithm, digest = line.split("=", 1)
+    if algorithm.upper() != "SHA256" or len(digest) != 64:
+        return None
+    return digest.lower()
+
+
+def remove_hash_sidecar(media_path: str):
+    try:
+        os.remove(hash_sidecar_path(media_path))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug(f"Couldn't remove hash sidecar of {media_path}: {e}")
+
+
+async def find_uploaded_duplicate(db, media_path: str, bot_token: str, task_id: str) -> Optional[str]:
+    """file_id of identical media already uploaded to this delivery bot, if any"""
+    content_hash = read_content_hash(media_path)
+    if not content_hash:
+        return None
+    try:
+        file_id = await get_file_id_by_content_hash(db, content_hash, bot_token)
+    except Exception as e:
+        logger.warning(f"⚠️ [{task_id}] Content hash lookup failed, uploading normally: {e}")
+        return None
+    if file_id:
+        size_mb = os.path.getsize(media_path) / (1024 * 1024) if os.path.exists(media_path) else 0
+        logger.info(f"♻️ [{task_id}] Identical media already uploaded (sha256 {content_hash[:12]}…), "
+                    f"skipping upload of {size_mb:.0f} MB")
+    return file_id
+
+
+async def remember_uploaded_content(db, media_path: str, bot_token: str, file_id: str, task_id: str):
+    content_hash = read_content_hash(media_path)
+    if not content_hash:
+        return
+    try:
+        size_bytes = os.path.getsize(media_path) if os.path.exists(media_path) else None
+        await save_content_hash(db, content_hash, bot_token, file_id, size_bytes)
+    except Exception as e:
+        logger.warning(f"⚠️ [{task_id}] Couldn't save content hash: {e}")
@@ -6,22 +6,32 @@ from backend.video_redirector.utils.redis_client import RedisClient
 from backend.video_redirector.hdrezka.hdrezka_download_executor import handle_download_task
 from backend.video_redirector.youtube.youtube_download_executor import handle_youtube_download_task_with_retries
 from backend.video_redirector.exceptions import RetryableDownloadError
+from backend.video_redirector.utils.file_repair import finish_file_repair
 from backend.video_redirector.config import MAX_CONCURRENT_DOWNLOADS, MAX_RETRIES_FOR_DOWNLOAD
 
 logger = logging.getLogger(__name__)
 
 QUEUE_KEY = "download_queue"
+PRIORITY_QUEUE_KEY = "download_queue:priority"  # repairs of expired files; always started before QUEUE_KEY
 ACTIVE_COUNT_KEY = "active_downloads"
 
 class DownloadQueueManager:
 
     @staticmethod
-    async def enqueue(task: dict) -> int:
+    async def enqueue(task: dict, priority: bool = False) -> int:
         redis = RedisClient.get_client()
+        if priority:
+            await redis.rpush(PRIORITY_QUEUE_KEY, json.dumps(task))
+            return await redis.llen(PRIORITY_QUEUE_KEY)
         await redis.rpush(QUEUE_KEY, json.dumps(task))
-        length = await redis.llen(QUEUE_KEY)
+        length = await redis.llen(QUEUE_KEY) + await redis.llen(PRIORITY_QUEUE_KEY)
         return length
 
+    @staticmethod
+    async def queued_count() -> int:
+        redis = RedisClient.get_client()
+        return await redis.llen(PRIORITY_QUEUE_KEY) + await redis.llen(QUEUE_KEY)
+
     @staticmethod
     async def queue_worker():
         redis = RedisClient.get_client()
@@ -34,8 +44,9 @@ class DownloadQueueManager:
             now = asyncio.get_event_loop().time()
             if now - last_log_time >= log_interval:
                 queue_length = await redis.llen(QUEUE_KEY)
+                priority_length = await redis.llen(PRIORITY_QUEUE_KEY)
                 active = int(await redis.get(ACTIVE_COUNT_KEY) or 0)
-                logger.info(f"📊 Queue status — Queue length: {queue_length}, Active downloads: {active}")
+                logger.info(f"📊 Queue status — Queue length: {queue_length}, Repairs queued: {priority_length}, Active downloads: {active}")
                 last_log_time = now
 
             active = int(await redis.get(ACTIVE_COUNT_KEY) or 0)
@@ -43,7 +54,7 @@ class DownloadQueueManager:
                 await asyncio.sleep(5)
                 continue
 
-            task_data = await redis.lpop(QUEUE_KEY)
+            task_data = await redis.lpop(PRIORITY_QUEUE_KEY) or await redis.lpop(QUEUE_KEY)
             if not task_data:
                 await asyncio.sleep(3)
                 continue
@@ -65,6 +76,7 @@ class DownloadQueueManager:
     async def wrap_download(task: dict):
         redis = RedisClient.get_client()
         task_id = task["task_id"]
+        requeued = False
 
         try:
             # Convert tmdb_id to integer with error handling
@@ -119,7 +131,8 @@ class DownloadQueueManager:
                 await asyncio.sleep(10)
                 logger.warning(f"🔁 Retrying task {task_id} due to retryable error: {e}")
                 await redis.set(f"download:{task_id}:retries", retries + 1, ex=3600)
-                await redis.rpush(QUEUE_KEY, json.dumps(task))
+                await redis.rpush(PRIORITY_QUEUE_KEY if task.get("repair") else QUEUE_KEY, json.dumps(task))
+                requeued = True
             else:
                 logger.error(f"❌ Final retry failed for task {task_id}: {e}")
         except Exception as e:
@@ -130,11 +143,15 @@ class DownloadQueueManager:
         finally:
             await redis.delete(f"download:{task_id}:retries")
             await redis.decr(ACTIVE_COUNT_KEY)
+            if task.get("repair") and not requeued:
+                status = await redis.get(f"download:{task_id}:status")
+                await finish_file_repair(task_id, status == "done")
 
     @staticmethod
     async def get_position_by_task_id(task_id: str) -> Optional[int]:
         redis = RedisClient.get_client()
-        queue = await redis.lrange(QUEUE_KEY, 0, -1)
+        # Repairs are started first, so they count as ahead of every regular download
+        queue = await redis.lrange(PRIORITY_QUEUE_KEY, 0, -1) + await redis.lrange(QUEUE_KEY, 0, -1)
         for i, item in enumerate(queue):
             try:
                 task = json.loads(item)
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+from backend.video_redirector.config import EXTRACTION_CACHE_CONFIG
+from backend.video_redirector.utils.hdrezka_url import sanitize_hdrezka_url
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+DUB_KEY = "extract_cache:dub:{digest}"  # JSON {"dub", "variants": "all"|"best", "data": {"all_m3u8", "subtitles"}}
+WATCH_INDEX_KEY = "extract_cache:watch:{digest}"  # JSON list of dub names a full watch extraction found for url+lang
+TASK_KEYS_KEY = "extract:{task_id}:cache_keys"  # cache entries a watch/download task is playing from
+
+# The CDN signs stream URLs with their expiry: ".../<hash>:2025101812:<...>/..." (YYYYMMDDHH) or ?expires=<unix>
+_URL_EXPIRY_HOUR = re.compile(r":(20\d{2})(\d{2})(\d{2})(\d{2}):")
+_EXPIRY_QUERY_PARAMS = ("expires", "exp", "e")
+
+DOWNLOAD_QUALITY_PREFERENCE = ("1080p", "720p", "480p", "360p")  # what download extraction goes for
+
+
+def normalize_dub(text: str) -> str:
+    # Same normalization download extraction uses to match a dub against the translators list
+    return re.sub(r"[^\w\s]", "", text or "").strip().lower()
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+
+
+def stream_url_expiry(url: str) -> Optional[float]:
+    """Unix time the CDN stops accepting this stream URL, None if the URL doesn't say"""
+    try:
+        query = parse_qs(urlparse(url).query)
+        for name in _EXPIRY_QUERY_PARAMS:
+            if name in query and query[name][0].isdigit():
+                return float(query[name][0])
+        match = _URL_EXPIRY_HOUR.search(url)
+        if match:
+            year, month, day, hour = (int(g) for g in match.groups())
+            tz = ZoneInfo(EXTRACTION_CACHE_CONFIG.get("url_expiry_tz"))
+            return datetime(year, month, day, hour, tzinfo=tz).timestamp()
+    except Exception as e:
+        logger.debug(f"Couldn't read expiry of {url[:80]}: {e}")
+    return None
+
+
+class ExtractionCache:
+    """
+    Extracted HDRezka streams shared between users, keyed by sanitized URL, language and dub.
+
+    Watch extraction stores every dub it found (all qualities and subtitles) plus the list of dubs, so a
+    later watch request for the same title is answered without a browser; download extraction reads the
+    dub it needs from the same entries. An entry lives until shortly before the earliest expiry signed
+    into its stream URLs and is dropped as soon as the CDN answers a playback or merge request with 403.
+    Concurrent extractions of the same title in this process are collapsed into one.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, dict] = {}  # key -> {"future", "waiters"}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return EXTRACTION_CACHE_CONFIG.get("enabled")
+
+    @staticmethod
+    def dub_key(url: str, lang: str, dub: str) -> str:
+        return DUB_KEY.format(digest=_digest(sanitize_hdrezka_url(url), lang, normalize_dub(dub)))
+
+    @staticmethod
+    def watch_key(url: str, lang: str) -> str:
+        return WATCH_INDEX_KEY.format(digest=_digest(sanitize_hdrezka_url(url), lang))
+
+    @staticmethod
+    def _ttl(variants: list) -> Optional[int]:
+        """Seconds an entry may live, None if its URLs expire too soon to be worth caching"""
+        expiries = [e for e in (stream_url_expiry(v.get("url", "")) for v in variants) if e]
+        if expiries:
+            ttl = min(expiries) - time.time() - EXTRACTION_CACHE_CONFIG.get("expiry_margin_seconds")
+        else:
+            ttl = EXTRACTION_CACHE_CONFIG.get("default_ttl_seconds")
+        ttl = min(ttl, EXTRACTION_CACHE_CONFIG.get("max_ttl_seconds"))
+        if ttl < EXTRACTION_CACHE_CONFIG.get("min_ttl_seconds"):
+            return None
+        return int(ttl)
+
+    async def _remember_for_task(self, task_id: Optional[str], keys: list):
+        if not self.enabled or not task_id or not keys:
+            return
+        redis = RedisClient.get_client()
+        key = TASK_KEYS_KEY.format(task_id=task_id)
+        await redis.sadd(key, *keys)  # type: ignore
+        await redis.expire(key, 28800)
+
+    # --- watch ---
+
+    async def get_watch(self, url: str, lang: str, task_id: Optional[str] = None) -> Optional[dict]:
+        """{lang: {dub: {"all_m3u8", "subtitles"}}} like extract_from_hdrezka returns, or None"""
+        if not self.enabled:
+            return None
+        redis = RedisClient.get_client()
+        dubs_json = await redis.get(self.watch_key(url, lang))
+        if not dubs_json:
+            self.misses += 1
+            return None
+        dubs = json.loads(dubs_json)
+        keys = [self.dub_key(url, lang, dub) for dub in dubs]
+        entries = await redis.mget(keys) if keys else []
+        result = {lang: {}}
+        for dub, entry_json in zip(dubs, entries):
+            entry = json.loads(entry_json) if entry_json else None
+            if not entry or entry.get("variants") != "all":
+                self.misses += 1
+                return None
+            result[lang][dub] = entry["data"]
+        self.hits += 1
+        await self.track_watch(task_id, url, lang, dubs)
+        return result
+
+    async def track_watch(self, task_id: Optional[str], url: str, lang: str, dubs):
+        """Tie a watch task to the entries of these dubs, so a 403 while it plays drops them"""
+        keys = [self.dub_key(url, lang, dub) for dub in dubs]
+        await self._remember_for_task(task_id, keys + [self.watch_key(url, lang)])
+
+    async def put_watch(self, url: str, lang: str, result: dict):
+        if not self.enabled:
+            return
+        dubs = result.get(lang) or {}
+        ttls = []
+        for dub_data in dubs.values():
+            ttl = self._ttl(dub_data.get("all_m3u8") or [])
+            if ttl is None or not dub_data.get("all_m3u8"):
+                return  # One dub without usable streams: don't cache a partial title
+            ttls.append(ttl)
+        if not ttls:
+            return
+        redis = RedisClient.get_client()
+        pipe = redis.pipeline(transaction=False)
+        for dub, dub_data in dubs.items():
+            key = self.dub_key(url, lang, dub)
+            # Subtitle URLs keep pointing at the extracting task, its subs:* keys outlive the entry
+            pipe.set(key, json.dumps({"dub": dub, "variants": "all", "data": dub_data}), ex=min(ttls))
+        pipe.set(self.watch_key(url, lang), json.dumps(list(dubs.keys())), ex=min(ttls))
+        await pipe.execute()
+        logger.info(f"🗃️ Cached {len(dubs)} dub(s) of {sanitize_hdrezka_url(url)} ({lang}) for {min(ttls) // 60} min")
+
+    # --- download ---
+
+    async def get_download(self, url: str, lang: str, dub: str, task_id: Optional[str] = None) -> Optional[dict]:
+        """Best stream for this dub ({"quality", "url", "headers"}) like extract_to_download_from_hdrezka returns"""
+        if not self.enabled:
+            return None
+        key = self.dub_key(url, lang, dub)
+        entry_json = await RedisClient.get_client().get(key)
+        if not entry_json:
+            self.misses += 1
+            return None
+        variants = json.loads(entry_json)["data"].get("all_m3u8") or []
+        by_quality = {v.get("quality"): v for v in variants}
+        best = next((by_quality[q] for q in DOWNLOAD_QUALITY_PREFERENCE if q in by_quality), None)
+        if not best:
+            self.misses += 1
+            return None
+        self.hits += 1
+        await self.track_download(task_id, url, lang, dub)
+        return best
+
+    async def put_download(self, url: str, lang: str, dub: str, variant: dict):
+        if not self.enabled or not variant or not variant.get("url"):
+            return
+        ttl = self._ttl([variant])
+        if ttl is None:
+            return
+        key = self.dub_key(url, lang, dub)
+        # nx: never replace the full set of qualities a watch extraction stored with this single one
+        entry = {"dub": dub, "variants": "best", "data": {"all_m3u8": [variant], "subtitles": []}}
+        await RedisClient.get_client().set(key, json.dumps(entry), ex=ttl, nx=True)
+
+    async def track_download(self, task_id: Optional[str], url: str, lang: str, dub: str):
+        await self._remember_for_task(task_id, [self.dub_key(url, lang, dub)])
+
+    # --- invalidation ---
+
+    async def invalidate_task(self, task_id: str, reason: str = ""):
+        """Drop every entry this task played or merged from (the CDN refused its URLs)"""
+        redis = RedisClient.get_client()
+        task_key = TASK_KEYS_KEY.format(task_id=task_id)
+        keys = await redis.smembers(task_key)  # type: ignore
+        if not keys:
+            return
+        await redis.delete(*keys, task_key)
+        logger.warning(f"🗑️ [{task_id}] Dropped {len(keys)} cached extraction entr{'y' if len(keys) == 1 else 'ies'}"
+                       f"{f' ({reason})' if reason else ''}")
+
+    # --- single flight ---
+
+    async def single_flight(self, key: str, factory: Callable[[], Awaitable]):
+        """
+        Run factory() once for concurrent callers with the same key; everyone gets its result.
+        A caller that is cancelled stops waiting; the last one to go cancels the shared run.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = {"future": asyncio.ensure_future(factory()), "waiters": 0}
+            self._inflight[key] = flight
+            flight["future"].add_done_callback(
+                lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is flight else None
+            )
+        future = flight["future"]
+        flight["waiters"] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if flight["waiters"] == 1 and not future.done():
+                future.cancel()
+            raise
+        finally:
+            flight["waiters"] -= 1
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "inflight": len(self._inflight)}
+
+
+EXTRACTION_CACHE = ExtractionCache()
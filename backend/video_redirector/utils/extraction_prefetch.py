@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from backend.video_redirector.config import EXTRACTION_PREFETCH_CONFIG
+from backend.video_redirector.utils.extraction_cache import EXTRACTION_CACHE, normalize_dub
+from backend.video_redirector.utils.extraction_scheduler import EXTRACTION_SCHEDULER, PRIORITY_DOWNLOAD, PRIORITY_PREFETCH
+from backend.video_redirector.utils.hdrezka_url import sanitize_hdrezka_url
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+DUB_PICKS_KEY = "prefetch:dub_picks:{lang}"  # hash: normalized dub -> how many downloads users started with it
+
+
+class ExtractionPrefetcher:
+    """
+    Speculative download extraction of the dub a user is most likely to pick.
+
+    When the dub list of a title is scraped, the dub most often downloaded in that language (or the first
+    one listed) is extracted at the lowest scheduler priority into EXTRACTION_CACHE, so the download that
+    usually follows finds its stream ready. Prefetches only start while the scheduler has an idle slot.
+    When a user picks a dub, a prefetch of that dub is promoted to download priority. A pick of another
+    dub cancels the prefetch only once no other user shown the title's dub list may still pick it, and
+    never after a download joined it.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, dict] = {}  # url + lang -> {"task_id", "dub", "viewers", "promoted"}
+        self.started = 0
+        self.promoted = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def _title_key(url: str, lang: str) -> str:
+        return f"{sanitize_hdrezka_url(url)}|{lang}"
+
+    async def predict_dub(self, lang: str, dubs: List[str]) -> Optional[str]:
+        """The offered dub picked most often in this language, the first one listed without history"""
+        if not dubs:
+            return None
+        try:
+            picks = await RedisClient.get_client().hmget(DUB_PICKS_KEY.format(lang=lang), [normalize_dub(d) for d in dubs])
+        except Exception as e:
+            logger.debug(f"Couldn't read dub pick history for {lang}: {e}")
+            picks = []
+        counts = [int(count or 0) for count in picks] or [0] * len(dubs)
+        best = max(range(len(dubs)), key=lambda i: (counts[i], -i))
+        return dubs[best]
+
+    async def start(self, url: str, lang: str, dubs: List[str]):
+        """Prefetch the likely dub of a title whose dub list a user was just shown"""
+        if not EXTRACTION_PREFETCH_CONFIG.get("enabled") or not dubs:
+            return
+        title_key = self._title_key(url, lang)
+        if title_key in self._inflight:
+            # One more user may pick the prefetched dub, a pick of another dub mustn't cancel it for them
+            self._inflight[title_key]["viewers"] += 1
+            return
+        if len(self._inflight) >= EXTRACTION_PREFETCH_CONFIG.get("max_concurrent") or not EXTRACTION_SCHEDULER.has_idle_slot():
+            logger.debug(f"Skipping prefetch of {title_key}: no idle extraction capacity")
+            return
+        # Claim the title before awaiting, two users opening its dub list at once start one prefetch
+        self._inflight[title_key] = {"task_id": None, "dub": None, "viewers": 1, "promoted": False}
+        try:
+            dub = await self.predict_dub(lang, dubs)
+            cached = dub and await RedisClient.get_client().exists(EXTRACTION_CACHE.dub_key(url, lang, dub))
+        except Exception:
+            self._inflight.pop(title_key, None)
+            raise
+        if not dub or cached:
+            self._inflight.pop(title_key, None)
+            return
+
+        task_id = f"prefetch-{uuid4()}"
+        self._inflight[title_key].update({"task_id": task_id, "dub": dub})
+        self.started += 1
+        logger.info(f"🔮 [{task_id}] Prefetching '{dub}' ({lang}) of {sanitize_hdrezka_url(url)}")
+        task = EXTRACTION_SCHEDULER.submit(task_id, self._prefetch(task_id, url, lang, dub))
+        task.add_done_callback(lambda _: self._inflight.pop(title_key, None))
+
+    @staticmethod
+    async def _prefetch(task_id: str, url: str, lang: str, dub: str):
+        from backend.video_redirector.hdrezka.hdrezka_extract_to_download import extract_to_download_with_cache
+        try:
+            result, _ = await extract_to_download_with_cache(url, dub, lang, task_id=task_id, priority=PRIORITY_PREFETCH)
+            logger.info(f"🔮 [{task_id}] Prefetch of '{dub}' {'cached' if result else 'found no stream'}")
+        except asyncio.CancelledError:
+            logger.info(f"🔮 [{task_id}] Prefetch of '{dub}' cancelled")
+            raise
+        except Exception as e:
+            logger.warning(f"🔮 [{task_id}] Prefetch of '{dub}' failed: {e}")
+
+    async def record_choice(self, url: str, lang: str, dub: str):
+        """A user started a download: learn from the pick and settle the prefetch of this title"""
+        try:
+            await RedisClient.get_client().hincrby(DUB_PICKS_KEY.format(lang=lang), normalize_dub(dub), 1)
+        except Exception as e:
+            logger.debug(f"Couldn't record dub pick for {lang}: {e}")
+
+        prefetch = self._inflight.get(self._title_key(url, lang))
+        if not prefetch or not prefetch["task_id"]:
+            return
+        prefetch["viewers"] -= 1
+        if normalize_dub(prefetch["dub"]) == normalize_dub(dub):
+            # The download joins the prefetch's extraction (same cache single flight), let it jump the queue
+            EXTRACTION_SCHEDULER.promote(prefetch["task_id"], PRIORITY_DOWNLOAD)
+            prefetch["promoted"] = True
+            self.promoted += 1
+            logger.info(f"🔮 [{prefetch['task_id']}] Prefetch guessed '{dub}' right")
+        elif prefetch["promoted"] or prefetch["viewers"] > 0:
+            logger.info(f"🔮 [{prefetch['task_id']}] User picked '{dub}' instead of '{prefetch['dub']}', "
+                        f"prefetch kept for {'the download that joined it' if prefetch['promoted'] else 'other users'}")
+        elif EXTRACTION_SCHEDULER.cancel(prefetch["task_id"]):
+            self.cancelled += 1
+            logger.info(f"🔮 [{prefetch['task_id']}] User picked '{dub}' instead of '{prefetch['dub']}', prefetch cancelled")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": EXTRACTION_PREFETCH_CONFIG.get("enabled"),
+            "inflight": len(self._inflight),
+            "started": self.started,
+            "promoted": self.promoted,
+            "cancelled": self.cancelled,
+        }
+
+
+EXTRACTION_PREFETCHER = ExtractionPrefetcher()
@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Coroutine, Dict, List, Optional
+
+from backend.video_redirector.config import EXTRACTION_SCHEDULER_CONFIG
+from backend.video_redirector.utils.sliding_window_counter import SlidingWindowCounter
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_WATCH = 0  # a user is staring at the loading gif
+PRIORITY_DOWNLOAD = 1  # download-stage extraction, the user already waits minutes for merge and upload
+PRIORITY_PREFETCH = 2  # speculative, nobody is waiting for it yet
+
+
+class ExtractionQueueFullError(Exception):
+    """Too many extractions are already waiting for a slot"""
+    pass
+
+
+class _Ticket:
+    def __init__(self, task_id: Optional[str], priority: int, seq: int):
+        self.task_id = task_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.admitted = asyncio.Event()
+
+
+class ExtractionScheduler:
+    """
+    Admission control for browser extractions.
+
+    At most `max_concurrent` extractions hold a slot; the rest wait in priority order (watch before
+    download, FIFO within a priority) and see their position and an ETA through /hd/status/watch.
+    Jobs submitted with a task_id can be cancelled: a queued one leaves the queue, a running one is
+    cancelled and gives its browser back.
+    """
+
+    def __init__(self):
+        self._running = 0
+        self._waiting: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._durations = SlidingWindowCounter(window_seconds=3600, max_events=200)
+        self.cancelled = 0
+
+    @property
+    def _max_concurrent(self) -> int:
+        return max(1, EXTRACTION_SCHEDULER_CONFIG.get("max_concurrent"))
+
+    # --- slots ---
+
+    def _admit(self):
+        while self._waiting and self._running < self._max_concurrent:
+            ticket = self._waiting.pop(0)
+            self._running += 1
+            ticket.admitted.set()
+
+    def _release(self):
+        self._running -= 1
+        self._admit()
+
+    @asynccontextmanager
+    async def slot(self, task_id: Optional[str], priority: int = PRIORITY_WATCH):
+        """Hold one of the extraction slots for the duration of the block"""
+        ticket = _Ticket(task_id, priority, next(self._seq))
+        if self._running < self._max_concurrent and not self._waiting:
+            self._running += 1
+        else:
+            if len(self._waiting) >= EXTRACTION_SCHEDULER_CONFIG.get("max_queue"):
+                raise ExtractionQueueFullError(f"{len(self._waiting)} extractions already queued")
+            self._waiting.append(ticket)
+            self._waiting.sort(key=lambda t: (t.priority, t.seq))
+            logger.info(f"🚦 [{task_id}] Extraction queued at position {self.position(task_id)} (priority {priority})")
+            try:
+                await ticket.admitted.wait()
+            except asyncio.CancelledError:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                else:
+                    self._release()  # Admitted in the same loop iteration as the cancel
+                raise
+            logger.info(f"🚦 [{task_id}] Extraction admitted after {time.time() - ticket.enqueued_at:.1f}s in queue")
+
+        started = time.time()
+        try:
+            yield
+        finally:
+            self._durations.add(time.time() - started)
+            self._release()
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based place in the queue, None if the task isn't waiting"""
+        for index, ticket in enumerate(self._waiting):
+            if ticket.task_id == task_id:
+                return index + 1
+        return None
+
+    def has_idle_slot(self) -> bool:
+        return self._running < self._max_concurrent and not self._waiting
+
+    def promote(self, task_id: str, priority: int) -> bool:
+        """Move a queued task up to a more urgent priority (a user now waits for it)"""
+        for ticket in self._waiting:
+            if ticket.task_id == task_id and priority < ticket.priority:
+                ticket.priority = priority
+                self._waiting.sort(key=lambda t: (t.priority, t.seq))
+                return True
+        return False
+
+    def eta_seconds(self, task_id: str) -> Optional[int]:
+        """Rough wait until the task gets a slot, from the average slot time of recent extractions"""
+        position = self.position(task_id)
+        if position is None:
+            return None
+        durations = self._durations.values()
+        average = sum(durations) / len(durations) if durations else EXTRACTION_SCHEDULER_CONFIG.get("default_duration_seconds")
+        return int(math.ceil(position / self._max_concurrent) * average)
+
+    # --- cancellable jobs ---
+
+    def submit(self, task_id: str, coro: Coroutine) -> asyncio.Task:
+        """Run coro in the background, cancellable with cancel(task_id)"""
+        task = asyncio.create_task(coro)
+        self._jobs[task_id] = task
+        task.add_done_callback(lambda _: self._jobs.pop(task_id, None))
+        return task
+
+    def cancel(self, task_id: str) -> bool:
+        task = self._jobs.get(task_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        self.cancelled += 1
+        logger.info(f"🛑 [{task_id}] Extraction cancelled")
+        return True
+
+    def stats(self) -> dict:
+        durations = self._durations.values()
+        return {
+            "max_concurrent": self._max_concurrent,
+            "running": self._running,
+            "waiting": len(self._waiting),
+            "jobs": len(self._jobs),
+            "cancelled": self.cancelled,
+            "avg_slot_seconds": round(sum(durations) / len(durations), 1) if durations else None,
+        }
+
+
+EXTRACTION_SCHEDULER = ExtractionScheduler()
@@ -0,0 +1,96 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from backend.video_redirector.utils.sliding_window_counter import SlidingWindowCounter
+
+logger = logging.getLogger(__name__)
+
+TIMING_WINDOW_SECONDS = 3600  # stats() covers the extractions of the last hour
+TIMING_MAX_SAMPLES = 500  # per kind and step
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ExtractionTimer:
+    """
+    Wall time one browser extraction spends in each step (goto, dub_click, quality_capture, subtitles...).
+
+    Steps of dubs extracted on parallel pages add up, so their sum can exceed the total.
+    """
+
+    def __init__(self, kind: str, task_id: Optional[str] = None):
+        self.kind = kind
+        self.task_id = task_id
+        self.started = time.perf_counter()
+        self.steps: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.steps[name] = self.steps.get(name, 0.0) + seconds
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def finish(self, outcome: str = "ok") -> dict:
+        total = time.perf_counter() - self.started
+        breakdown = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.steps.items())
+        logger.info(f"⏱️ [{self.task_id}] {self.kind} extraction {outcome} in {total:.1f}s ({breakdown or 'no steps'})")
+        EXTRACTION_TIMINGS.record(self.kind, self.steps, total, outcome)
+        return {"total": total, **self.steps}
+
+
+class ExtractionTimings:
+    """Rolling per-step timings of recent extractions, by kind (watch/download)"""
+
+    def __init__(self):
+        self._samples: Dict[str, Dict[str, SlidingWindowCounter]] = {}
+        self._failures: Dict[str, SlidingWindowCounter] = {}
+
+    def _counter(self, kind: str, name: str) -> SlidingWindowCounter:
+        steps = self._samples.setdefault(kind, {})
+        if name not in steps:
+            steps[name] = SlidingWindowCounter(TIMING_WINDOW_SECONDS, TIMING_MAX_SAMPLES)
+        return steps[name]
+
+    def reset(self):
+        self._samples.clear()
+        self._failures.clear()
+
+    def record(self, kind: str, steps: Dict[str, float], total: float, outcome: str):
+        if outcome != "ok":
+            failures = self._failures.setdefault(kind, SlidingWindowCounter(TIMING_WINDOW_SECONDS, TIMING_MAX_SAMPLES))
+            failures.add()
+            return
+        self._counter(kind, "total").add(total)
+        for name, seconds in steps.items():
+            self._counter(kind, name).add(seconds)
+
+    def stats(self) -> dict:
+        result = {}
+        for kind in set(self._samples) | set(self._failures):
+            summary = {}
+            for name, counter in self._samples.get(kind, {}).items():
+                values = counter.values()
+                if not values:
+                    continue
+                summary[name] = {
+                    "count": len(values),
+                    "avg": round(sum(values) / len(values), 2),
+                    "p50": round(_percentile(values, 0.5), 2),
+                    "p95": round(_percentile(values, 0.95), 2),
+                }
+            failures = self._failures.get(kind)
+            result[kind] = {"failures": failures.count() if failures else 0, "steps": summary}
+        return result
+
+
+EXTRACTION_TIMINGS = ExtractionTimings()
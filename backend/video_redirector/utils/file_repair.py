@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+from uuid import uuid4
+
+from backend.video_redirector.config import FILE_REPAIR_CONFIG
+from backend.video_redirector.hdrezka.hdrezka_download_executor import restore_from_cache
+from backend.video_redirector.utils.media_retention_cache import RETENTION_CACHE
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+REPAIR_LOCK_KEY = "repair:{tmdb_id}:{lang}:{dub}"  # -> task_id of the repair in progress
+REPAIR_INFO_KEY = "repair:{task_id}:info"  # JSON of the title being repaired
+REPAIR_WAITERS_KEY = "repair:{task_id}:waiters"  # set of JSON {"tg_user_id", "user_lang", "delivery_bot_id"}
+REPAIR_NOTIFICATIONS_KEY = "repair:notifications"  # list consumed by the delivery bot
+
+
+def _lock_key(tmdb_id: int, lang: str, dub: str) -> str:
+    return REPAIR_LOCK_KEY.format(tmdb_id=tmdb_id, lang=lang, dub=dub)
+
+
+def _is_youtube_url(url: str) -> bool:
+    return "youtube.com" in url or "youtu.be" in url
+
+
+async def get_active_repair(tmdb_id: int, lang: str, dub: str) -> Optional[str]:
+    return await RedisClient.get_client().get(_lock_key(tmdb_id, lang, dub))
+
+
+async def add_repair_waiter(task_id: str, tg_user_id, user_lang: Optional[str] = None,
+                            delivery_bot_id: Optional[int] = None):
+    """Deliver the title to this user when the repair finishes, through the delivery bot they were talking to"""
+    if not tg_user_id:
+        return
+    redis = RedisClient.get_client()
+    key = REPAIR_WAITERS_KEY.format(task_id=task_id)
+    waiter = {"tg_user_id": str(tg_user_id), "user_lang": user_lang, "delivery_bot_id": delivery_bot_id}
+    await redis.sadd(key, json.dumps(waiter))  # type: ignore
+    await redis.expire(key, FILE_REPAIR_CONFIG.get("lock_seconds"))
+
+
+async def _enqueue_reacquisition(task_id: str, file_info: dict) -> bool:
+    from backend.video_redirector.utils.download_queue_manager import DownloadQueueManager
+
+    url = file_info.get("movie_url")
+    if not url:
+        return False
+    if _is_youtube_url(url):
+        task = {
+            "video_url": url,
+            "video_title": file_info.get("movie_title") or "YouTube Video",
+            "video_poster": file_info.get("movie_poster") or "",
+            "source_type": "youtube",
+        }
+    else:
+        task = {
+            "movie_url": url,
+            "movie_title": file_info.get("movie_title"),
+            "movie_poster": file_info.get("movie_poster"),
+            "source_type": "hdrezka",
+        }
+    task.update({
+        "task_id": task_id,
+        "tmdb_id": file_info["tmdb_id"],
+        "lang": file_info["lang"],
+        "dub": file_info["dub"],
+        "repair": True,
+    })
+
+    redis = RedisClient.get_client()
+    await redis.set(f"download:{task_id}:status", "queued", ex=3600)
+    await redis.set(f"download:{task_id}:retries", 0, ex=3600)
+    position = await DownloadQueueManager.enqueue(task, priority=True)
+    logger.info(f"🛠️ [{task_id}] Re-acquisition of tmdb_id={file_info['tmdb_id']} {file_info['lang']}/{file_info['dub']} "
+                f"queued in the priority lane (position {position})")
+    return True
+
+
+async def _run_restore(task_id: str, file_info: dict):
+    restored = await restore_from_cache(task_id, file_info["tmdb_id"], file_info["lang"], file_info["dub"])
+    if restored:
+        await finish_file_repair(task_id, True)
+        return
+    # Cache entry gone or re-upload failed: fall back to downloading it again
+    if not await _enqueue_reacquisition(task_id, file_info):
+        await finish_file_repair(task_id, False)
+
+
+async def schedule_file_repair(file_info: dict, tg_user_id=None, user_lang: Optional[str] = None,
+                               delivery_bot_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Get an expired title back without the user starting over.
+
+    `file_info` is what cleanup_expired_file returns about the deleted DownloadedFile
+    (tmdb_id, lang, dub, movie_url, movie_title, movie_poster). The title is re-uploaded from the
+    retention cache when possible, otherwise re-downloaded in the priority lane of the download
+    queue. One repair runs per title; later callers are only added as waiters.
+
+    Returns {"task_id", "mode"} ("restore" | "reacquire"), or None if the title can't be repaired.
+    """
+    if not FILE_REPAIR_CONFIG.get("enabled") or file_info.get("tmdb_id") is None:
+        return None
+    tmdb_id, lang, dub = file_info["tmdb_id"], file_info["lang"], file_info["dub"]
+    redis = RedisClient.get_client()
+    lock_key = _lock_key(tmdb_id, lang, dub)
+    lock_seconds = FILE_REPAIR_CONFIG.get("lock_seconds")
+
+    task_id = f"repair-{uuid4().hex[:12]}"
+    if not await redis.set(lock_key, task_id, nx=True, ex=lock_seconds):
+        existing_task_id = await redis.get(lock_key)
+        if not existing_task_id:
+            return None
+        await add_repair_waiter(existing_task_id, tg_user_id, user_lang, delivery_bot_id)
+        info = json.loads(await redis.get(REPAIR_INFO_KEY.format(task_id=existing_task_id)) or "{}")
+        return {"task_id": existing_task_id, "mode": info.get("mode")}
+
+    mode = "restore" if RETENTION_CACHE.lookup(tmdb_id, lang, dub) else "reacquire"
+    await redis.set(REPAIR_INFO_KEY.format(task_id=task_id), json.dumps({**file_info, "mode": mode}), ex=lock_seconds)
+    await add_repair_waiter(task_id, tg_user_id, user_lang, delivery_bot_id)
+
+    if mode == "restore":
+        asyncio.create_task(_run_restore(task_id, file_info))
+    elif not await _enqueue_reacquisition(task_id, file_info):
+        logger.warning(f"⚠️ Can't repair tmdb_id={tmdb_id} {lang}/{dub}: not cached and no source URL")
+        await redis.delete(lock_key, REPAIR_INFO_KEY.format(task_id=task_id), REPAIR_WAITERS_KEY.format(task_id=task_id))
+        return None
+    return {"task_id": task_id, "mode": mode}
+
+
+async def finish_file_repair(task_id: str, success: bool):
+    """Release the title and hand every waiting user to the delivery bot"""
+    redis = RedisClient.get_client()
+    info = json.loads(await redis.get(REPAIR_INFO_KEY.format(task_id=task_id)) or "{}")
+    waiters = await redis.smembers(REPAIR_WAITERS_KEY.format(task_id=task_id))  # type: ignore
+
+    pipe = redis.pipeline(transaction=False)
+    for waiter in waiters:
+        pipe.rpush(REPAIR_NOTIFICATIONS_KEY, json.dumps({
+            **json.loads(waiter),
+            "tmdb_id": info.get("tmdb_id"),
+            "lang": info.get("lang"),
+            "dub": info.get("dub"),
+            "movie_title": info.get("movie_title"),
+            "success": success,
+        }))
+    pipe.expire(REPAIR_NOTIFICATIONS_KEY, 86400)
+    pipe.delete(REPAIR_INFO_KEY.format(task_id=task_id), REPAIR_WAITERS_KEY.format(task_id=task_id))
+    await pipe.execute()
+
+    if info.get("tmdb_id") is not None:
+        lock_key = _lock_key(info["tmdb_id"], info["lang"], info["dub"])
+        if await redis.get(lock_key) == task_id:
+            await redis.delete(lock_key)
+
+    logger.info(f"{'✅' if success else '❌'} [{task_id}] Repair of tmdb_id={info.get('tmdb_id')} "
+                f"{info.get('lang')}/{info.get('dub')} {'finished' if success else 'failed'}, "
+                f"{len(waiters)} waiting user(s) notified")
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+from backend.video_redirector.config import RETENTION_CACHE_CONFIG
+from backend.video_redirector.utils.content_hash_index import hash_sidecar_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+STAGING_PREFIX = ".staging-"
+STALE_STAGING_SECONDS = 6 * 3600  # staging of a crashed download
+
+
+class MediaRetentionCache:
+    """
+    Finished MP4s kept on disk after upload, keyed by (tmdb_id, lang, dub).
+
+    When a Telegram file_id expires the title can be re-uploaded from here instead of going
+    through extraction, HLS download and merge again. Files are hard-linked into a staging
+    directory right after the merge (no copy; the upload only removes its own link) and become
+    an entry once the upload is saved in the DB. Entries are evicted least recently used first
+    when the cache grows above max_gb.
+    """
+
+    @property
+    def enabled(self) -> bool:
+        return RETENTION_CACHE_CONFIG.get("enabled")
+
+    @staticmethod
+    def _root() -> str:
+        return RETENTION_CACHE_CONFIG.get("dir")
+
+    def _entry_dir(self, tmdb_id: int, lang: str, dub: str) -> str:
+        digest = hashlib.sha1(f"{tmdb_id}|{lang}|{dub}".encode()).hexdigest()[:16]
+        return os.path.join(self._root(), f"{tmdb_id}_{lang}_{digest}")
+
+    def _staging_dir(self, task_id: str) -> str:
+        return os.path.join(self._root(), f"{STAGING_PREFIX}{task_id}")
+
+    @staticmethod
+    def _write_manifest(entry_dir: str, manifest: dict):
+        path = os.path.join(entry_dir, MANIFEST_NAME)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read_manifest(entry_dir: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(entry_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except Exception as e:
+            logger.debug(f"Unreadable retention manifest in {entry_dir}: {e}")
+            return None
+
+    # --- writing ---
+
+    def stage(self, task_id: str, files: List[str]) -> bool:
+        """Hard-link freshly merged files (and their hash sidecars) before the upload consumes them"""
+        if not self.enabled or not files:
+            return False
+        staging = self._staging_dir(task_id)
+        try:
+            os.makedirs(staging, exist_ok=True)
+            for index, path in enumerate(files):
+                target = os.path.join(staging, f"part{index + 1}.mp4")
+                os.link(path, target)
+                if os.path.exists(hash_sidecar_path(path)):
+                    os.link(hash_sidecar_path(path), hash_sidecar_path(target))
+            return True
+        except OSError as e:
+            logger.warning(f"⚠️ [{task_id}] Couldn't keep merged files in the retention cache "
+                           f"(is {self._root()} on the same filesystem as the downloads?): {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+
+    def commit(self, task_id: str, tmdb_id: int, lang: str, dub: str, info: dict) -> bool:
+        """Publish staged files as the entry for this title (replacing an older one) once the upload is saved"""
+        staging = self._staging_dir(task_id)
+        if not self.enabled or not os.path.isdir(staging):
+            return False
+        try:
+            files = sorted(
+                (name for name in os.listdir(staging) if name.endswith(".mp4")),
+                key=lambda name: int(name[len("part"):-len(".mp4")])
+            )
+            now = time.time()
+            manifest = {
+                **info,
+                "tmdb_id": tmdb_id,
+                "lang": lang,
+                "dub": dub,
+                "files": files,
+                "size_bytes": sum(os.path.getsize(os.path.join(staging, name)) for name in files),
+                "created_at": now,
+                "last_used": now,
+            }
+            self._write_manifest(staging, manifest)
+
+            entry_dir = self._entry_dir(tmdb_id, lang, dub)
+            if os.path.exists(entry_dir):
+                retired = f"{staging}.old"
+                os.replace(entry_dir, retired)
+                shutil.rmtree(retired, ignore_errors=True)
+            os.replace(staging, entry_dir)
+            logger.info(f"🗄️ [{task_id}] Kept {len(files)} file(s), {manifest['size_bytes'] / (1024 ** 3):.2f} GB "
+                        f"in the retention cache for tmdb_id={tmdb_id} {lang}/{dub}")
+        except Exception as e:
+            logger.warning(f"⚠️ [{task_id}] Retention cache commit failed: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+        self.evict()
+        return True
+
+    def discard(self, task_id: str):
+        shutil.rmtree(self._staging_dir(task_id), ignore_errors=True)
+
+    def remove(self, tmdb_id: int, lang: str, dub: str):
+        shutil.rmtree(self._entry_dir(tmdb_id, lang, dub), ignore_errors=True)
+
+    # --- reading ---
+
+    def lookup(self, tmdb_id: int, lang: str, dub: str) -> Optional[dict]:
+        """Manifest of the cached title if all its files are still on disk"""
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(tmdb_id, lang, dub)
+        manifest = self._read_manifest(entry_dir)
+        if not manifest or manifest.get("dub") != dub:
+            return None
+        if not all(os.path.exists(os.path.join(entry_dir, name)) for name in manifest.get("files", [])):
+            logger.warning(f"⚠️ Retention cache entry for tmdb_id={tmdb_id} {lang}/{dub} is incomplete, dropping it")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        return manifest
+
+    def checkout(self, tmdb_id: int, lang: str, dub: str, task_id: str,
+                 dest_dir: str) -> Optional[Tuple[List[str], dict]]:
+        """Hard-link the cached files into dest_dir for an upload (which deletes its copies); marks the entry used"""
+        manifest = self.lookup(tmdb_id, lang, dub)
+        if not manifest:
+            return None
+        entry_dir = self._entry_dir(tmdb_id, lang, dub)
+        paths = []
+        try:
+            for index, name in enumerate(manifest["files"]):
+                source = os.path.join(entry_dir, name)
+                target = os.path.join(dest_dir, f"{task_id}_part{index + 1}.mp4")
+                os.link(source, target)
+                paths.append(target)
+                if os.path.exists(hash_sidecar_path(source)):
+                    os.link(hash_sidecar_path(source), hash_sidecar_path(target))
+            manifest["last_used"] = time.time()
+            self._write_manifest(entry_dir, manifest)
+        except OSError as e:
+            logger.warning(f"⚠️ [{task_id}] Couldn't check out cached files: {e}")
+            for path in paths:
+                for leftover in (path, hash_sidecar_path(path)):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            return None
+        return paths, manifest
+
+    # --- eviction ---
+
+    def _entries(self) -> List[Tuple[str, dict]]:
+        root = self._root()
+        if not os.path.isdir(root):
+            return []
+        entries = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith(STAGING_PREFIX):
+                # Staging of a download that died before commit/discard
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_STAGING_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+                continue
+            manifest = self._read_manifest(path)
+            if manifest:
+                entries.append((path, manifest))
+        return entries
+
+    def evict(self):
+        budget = RETENTION_CACHE_CONFIG.get("max_gb") * 1024 ** 3
+        entries = sorted(self._entries(), key=lambda entry: entry[1].get("last_used", 0))
+        total = sum(manifest.get("size_bytes", 0) for _, manifest in entries)
+        for path, manifest in entries:
+            if total <= budget:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= manifest.get("size_bytes", 0)
+            logger.info(f"🧹 Evicted tmdb_id={manifest.get('tmdb_id')} {manifest.get('lang')}/{manifest.get('dub')} "
+                        f"from the retention cache ({total / (1024 ** 3):.1f} GB left)")
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "entries": len(entries),
+            "size_gb": round(sum(m.get("size_bytes", 0) for _, m in entries) / (1024 ** 3), 2),
+            "max_gb": RETENTION_CACHE_CONFIG.get("max_gb"),
+        }
+
+
+RETENTION_CACHE = MediaRetentionCache()
@@ -1,20 +1,22 @@
 import os
 import json
 import asyncio
+import math
 import time
 from pathlib import Path
 import sqlite3
 from pyrogram.client import Client
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.video_redirector.db.crud_upload_accounts import (
-    increment_uploads,
-    get_account_stats_by_session_name,
-    get_least_used_accounts_today,
     create_or_get_account_stats,
     get_all_stats,
 )
 import logging
-from backend.video_redirector.config import PROXY_CONFIG
+from backend.video_redirector.config import PROXY_CONFIG, UPLOAD_ACCOUNT_WAIT_TIMEOUT_SECONDS, MAX_PARTS_PER_DELIVERY, PYROGRAM_SESSION_STORAGE
+from backend.video_redirector.utils.upload_account_scheduler import UploadAccountScheduler
+from backend.video_redirector.utils.upload_health_store import UPLOAD_HEALTH_STORE
+from backend.video_redirector.utils.pyrogram_memory_session import get_session_storage
+from backend.video_redirector.utils.sliding_window_counter import SlidingWindowCounter
 from backend.video_redirector.utils.notify_admin import notify_admin
 from backend.video_redirector.config import PROXY_CONFIG
 
@@ -31,21 +33,17 @@ MULTI_ACCOUNT_CONFIG_PATH = Path('/app/backend/video_redirector/utils/upload_acc
 SESSION_DIR = "/app/backend/session_files"
 
 # Per-account rate limit tracking
-_account_rate_limit_events = {}  # Track per account instead of global
+_account_rate_limit_events = {}  # account -> SlidingWindowCounter of flood wait seconds
+RATE_LIMIT_EVENTS_MAX = 256  # per account; bounds memory under flood-wait storms
 
 # Global upload management
 _active_uploads = set()  # Track active upload task IDs
-_account_upload_counters = {}  # Track concurrent uploads per account
+_account_upload_counters = {}  # This worker's concurrent uploads per account (cross-worker: Redis leases)
 MAX_CONCURRENT_UPLOADS_PER_ACCOUNT = 1  # Maximum concurrent uploads per account
 
 # Quarantine configuration for session DB issues
 ACCOUNT_QUARANTINE_SECONDS = 5 * 60  # 5 minutes
 
-# 🔒 Global lock for account selection to prevent race conditions
-# This ensures that only one task can select an account at a time,
-# preventing race conditions where multiple tasks could select the same account
-_account_selection_lock = asyncio.Lock()
-
 # Initialize UPLOAD_ACCOUNTS with fallback
 logger.debug(f"🔍 Looking for upload accounts config at: {MULTI_ACCOUNT_CONFIG_PATH}")
 logger.debug(f"🔍 Current working directory: {os.getcwd()}")
@@ -104,7 +102,8 @@ class UploadAccount:
         self.proxy_failure_count = {i: 0 for i in range(len(self.proxy_pool))}
         self.proxy_consecutive_failures = {i: 0 for i in range(len(self.proxy_pool))}  # Track consecutive failures
         self.proxy_cooldowns = {}  # Temporary cooldowns
-        self.blacklisted_proxies = set()  # Permanent blacklist
+        self.blacklisted_proxies = set()  # Permanent blacklist (shared via Redis, expires after blacklist_ttl_hours)
+        self.blacklisted_at = {}  # proxy index -> time it was blacklisted
         self.current_proxy_index = 0
         self.connection_attempts = 0  # Track connection attempts for current proxy
 
@@ -114,6 +113,10 @@ class UploadAccount:
         # When rate-limit threshold is reached mid-upload, we flag the currently used proxy
         # to be cooled down AFTER the upload completes (avoid interrupting in-flight upload)
         self.pending_post_upload_cooldown_proxy_index: int | None = None
+
+        # Measured performance per proxy (EWMA): upload speed and Telegram connect latency
+        self.proxy_upload_mbps: dict[int, float] = {}
+        self.proxy_connect_latency: dict[int, float] = {}
         
         # Configurable settings
         proxy_settings = config.get("proxy_settings", {})
@@ -126,8 +129,13 @@ class UploadAccount:
     def is_quarantined(self) -> bool:
         return time.time() < self.quarantine_until
 
+    def mark_health_dirty(self):
+        """Schedule this account's cooldowns/blacklist/counters for the shared Redis health store"""
+        UPLOAD_HEALTH_STORE.mark_dirty(self.session_name)
+
     def quarantine(self, reason: str, seconds: int = ACCOUNT_QUARANTINE_SECONDS):
         self.quarantine_until = time.time() + seconds
+        self.mark_health_dirty()
         cooldown_until = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.quarantine_until))
         logger.warning(f"🚧 [{self.session_name}] Account quarantined for {seconds}s (until {cooldown_until}) due to: {reason}")
         asyncio.create_task(notify_admin_async(
@@ -135,8 +143,38 @@ class UploadAccount:
             f"Action: investigate or regenerate session file"
         ))
 
+    def _ewma_update(self, samples: dict, proxy_index: int, value: float, weight: float = 1.0):
+        alpha = min(1.0, PROXY_CONFIG.get("throughput_ewma_alpha") * weight)
+        previous = samples.get(proxy_index)
+        samples[proxy_index] = value if previous is None else previous + alpha * (value - previous)
+
+    def record_proxy_throughput(self, proxy_index: int | None, mbps: float, weight: float = 1.0):
+        """Feed an upload speed sample; `weight` < 1 for partial (mid-upload) samples"""
+        if proxy_index is None or proxy_index >= len(self.proxy_pool) or mbps <= 0:
+            return
+        self._ewma_update(self.proxy_upload_mbps, proxy_index, mbps, weight)
+
+    def record_proxy_latency(self, proxy_index: int | None, seconds: float):
+        if proxy_index is None or proxy_index >= len(self.proxy_pool) or seconds < 0:
+            return
+        self._ewma_update(self.proxy_connect_latency, proxy_index, seconds)
+
+    def expected_proxy_mbps(self, proxy_index: int) -> float:
+        """
+        Measured upload speed; unmeasured proxies get the neutral prior, so accounts that were never
+        measured don't jump ahead of fast measured ones (select_best_proxy tries each proxy once itself)
+        """
+        measured = self.proxy_upload_mbps.get(proxy_index)
+        return measured if measured is not None else neutral_upload_mbps()
+
+    def expected_upload_mbps(self) -> float:
+        """Speed the next upload on this account should get: current proxy if connected, else the best usable one"""
+        if self.client is not None:
+            return self.expected_proxy_mbps(self.current_proxy_index)
+        return max((self.expected_proxy_mbps(i) for i in self.available_proxy_indexes()), default=0.0)
+
     def select_best_proxy(self) -> int:
-        """Select proxy with lowest usage count, then highest success rate"""
+        """Select the fastest measured proxy (weighted by success rate), then lowest latency and usage"""
         available_proxies = []
         
         for i in range(len(self.proxy_pool)):
@@ -157,23 +195,40 @@ class UploadAccount:
             total_attempts = self.proxy_success_count[i] + self.proxy_failure_count[i]
             success_rate = self.proxy_success_count[i] / total_attempts if total_attempts > 0 else 0.5
             
+            # Untried proxies rank ahead of measured ones so each gets tried once; the rest by measured
+            # speed weighted by success rate (a proxy that only failed has no measurement and ranks last)
+            untried = total_attempts == 0 and i not in self.proxy_upload_mbps
+            reliability = success_rate if total_attempts > 0 else 1.0
+            expected_mbps = self.proxy_upload_mbps.get(i, 0.0) * reliability
+            if math.isnan(expected_mbps):
+                expected_mbps = 0.0
+            
             available_proxies.append({
                 'index': i,
                 'usage_count': self.proxy_usage_count[i],
                 'success_rate': success_rate,
-                'total_attempts': total_attempts
+                'total_attempts': total_attempts,
+                'untried': untried,
+                'expected_mbps': expected_mbps,
+                'latency': self.proxy_connect_latency.get(i, float("inf"))
             })
         
         if not available_proxies:
             raise AllProxiesExhaustedError(f"Account {self.session_name}: All proxies unavailable")
         
-        # Sort by usage count first, then by success rate
-        available_proxies.sort(key=lambda x: (x['usage_count'], -x['success_rate']))
+        # Untried first, then fastest expected path; latency and usage only break ties
+        available_proxies.sort(key=lambda x: (not x['untried'], -x['expected_mbps'], x['latency'], x['usage_count']))
         selected = available_proxies[0]
         
         proxy_key = f"{self.proxy_pool[selected['index']]['ip']}:{self.proxy_pool[selected['index']]['port']}"
+        measured_mbps = self.proxy_upload_mbps.get(selected['index'])
+        measured_latency = self.proxy_connect_latency.get(selected['index'])
         logger.info(f"🎯 [{self.session_name}] Selected proxy: {proxy_key}")
-        logger.info(f"   Usage: {selected['usage_count']}, Success rate: {selected['success_rate']:.1%}")
+        logger.info(
+            f"   Usage: {selected['usage_count']}, Success rate: {selected['success_rate']:.1%}, "
+            f"Speed: {f'{measured_mbps:.1f} Mbps' if measured_mbps is not None else 'unmeasured'}, "
+            f"Latency: {f'{measured_latency:.2f}s' if measured_latency is not None else 'unmeasured'}"
+        )
         
         return selected['index']
 
@@ -183,6 +238,7 @@ class UploadAccount:
         self.proxy_usage_count[proxy_index] += 1
         self.proxy_consecutive_failures[proxy_index] = 0  # Reset consecutive failures
         self.connection_attempts = 0  # Reset connection attempts
+        self.mark_health_dirty()
         
         proxy_key = f"{self.proxy_pool[proxy_index]['ip']}:{self.proxy_pool[proxy_index]['port']}"
         logger.info(f"🟢 [{self.session_name}] Proxy {proxy_key} successful (consecutive failures reset)")
@@ -191,6 +247,7 @@ class UploadAccount:
         """Mark proxy as failed - handle cooldown/blacklist logic"""
         self.proxy_failure_count[proxy_index] += 1
         self.proxy_consecutive_failures[proxy_index] += 1  # Increment consecutive failures
+        self.mark_health_dirty()
         proxy_key = f"{self.proxy_pool[proxy_index]['ip']}:{self.proxy_pool[proxy_index]['port']}"
         
         # Check if this is a significant event (rate limit, network issue, timeout)
@@ -228,6 +285,7 @@ class UploadAccount:
             
         cooldown_until = time.time() + (self.cooldown_hours * 3600)
         self.proxy_cooldowns[proxy_index] = cooldown_until
+        self.mark_health_dirty()
         
         # Check if we need to notify admin about low proxy count
         # Count proxies that are neither blacklisted nor in cooldown
@@ -244,6 +302,8 @@ class UploadAccount:
             return
             
         self.blacklisted_proxies.add(proxy_index)
+        self.blacklisted_at[proxy_index] = time.time()
+        self.mark_health_dirty()
         
         # Remove from cooldowns if present (blacklisted proxies don't need cooldowns)
         if proxy_index in self.proxy_cooldowns:
@@ -318,12 +378,10 @@ Action: Consider adding more proxies or investigating issues
             logger.debug(f"Client health check failed for {self.session_name}: {type(e).__name__}: {e}")
             return False
     
-    def has_available_proxies(self) -> bool:
-        """Check if this account has any available proxies"""
-        if not self.proxy_pool:
-            return False
-        
+    def available_proxy_indexes(self) -> list[int]:
+        """Indexes of proxies that are neither blacklisted nor in cooldown"""
         current_time = time.time()
+        available = []
         for i in range(len(self.proxy_pool)):
             # Skip blacklisted proxies
             if i in self.blacklisted_proxies:
@@ -335,10 +393,13 @@ Action: Consider adding more proxies or investigating issues
                 if current_time < cooldown_until:
                     continue
             
-            # Found at least one available proxy
-            return True
+            available.append(i)
         
-        return False
+        return available
+
+    def has_available_proxies(self) -> bool:
+        """Check if this account has any available proxies"""
+        return bool(self.available_proxy_indexes())
 
     async def ensure_client_ready_with_retry(self):
         """Ensure client is ready with connection retry logic"""
@@ -382,8 +443,8 @@ Action: Consider adding more proxies or investigating issues
             raise AllProxiesExhaustedError(f"Account {self.session_name}: All proxies exhausted")
         return None
 
-    async def ensure_client_ready(self):
-        """Ensure client is ready for use, start if needed"""
+    async def ensure_client_ready(self, checkout: bool = True):
+        """Ensure client is ready for use, start if needed; checkout=False only connects it (warm-up)"""
         async with self.lock:
             current_time = time.time()
 
@@ -461,14 +522,22 @@ Action: Consider adding more proxies or investigating issues
                     else:
                         return None
 
+                    if PYROGRAM_SESSION_STORAGE == "memory":
+                        # Session state lives in memory; the .session file is only written back in the background
+                        self.client.storage = get_session_storage(self.session_name, session_path)
+
                     # Prevent indefinite hang on bad proxies during client start
+                    start_began = time.monotonic()
                     try:
                         await asyncio.wait_for(self.client.start(), timeout=30)
                     except asyncio.TimeoutError:
                         self.client = None
+                        self.record_proxy_latency(self.current_proxy_index, 30.0)
                         logger.error(f"❌ [{self.session_name}] Client.start() timed out")
                         return None
-                    logger.info(f"✅ [{self.session_name}] Client started successfully")
+                    start_seconds = time.monotonic() - start_began
+                    self.record_proxy_latency(self.current_proxy_index, start_seconds)
+                    logger.info(f"✅ [{self.session_name}] Client started successfully in {start_seconds:.1f}s")
 
                     self.last_client_creation = current_time
 
@@ -499,7 +568,8 @@ Action: Consider adding more proxies or investigating issues
                     self.client = None
                     return None
 
-            self.last_used = time.time()
+            if checkout:
+                self.last_used = time.time()
             return self.client
 
     async def rotate_proxy(self, reason: str) -> bool:
@@ -549,6 +619,13 @@ Action required: Add new proxies or investigate account issues
 
 UPLOAD_ACCOUNT_POOL = [UploadAccount(cfg) for cfg in UPLOAD_ACCOUNTS]
 
+
+def neutral_upload_mbps() -> float:
+    """Prior for proxies without a measurement: the median measured speed over all upload accounts"""
+    measured = sorted(mbps for acc in UPLOAD_ACCOUNT_POOL for mbps in acc.proxy_upload_mbps.values())
+    return measured[len(measured) // 2] if measured else 0.0
+
+
 # Validate that we have at least one account
 if not UPLOAD_ACCOUNT_POOL:
     logger.critical("🚨 No upload accounts available! Application cannot start.")
@@ -558,6 +635,14 @@ if not UPLOAD_ACCOUNT_POOL:
 
 logger.info(f"✅ Initialized {len(UPLOAD_ACCOUNT_POOL)} upload accounts: {[acc.session_name for acc in UPLOAD_ACCOUNT_POOL]}")
 
+# 🗓️ In-memory scheduler: reservations, waiting for released accounts and cached daily stats
+UPLOAD_SCHEDULER = UploadAccountScheduler(
+    UPLOAD_ACCOUNT_POOL,
+    _account_upload_counters,
+    max_concurrent_per_account=MAX_CONCURRENT_UPLOADS_PER_ACCOUNT,
+    lease_store=UPLOAD_HEALTH_STORE
+)
+
 # Log proxy-related configuration at startup to verify runtime thresholds
 try:
     logger.info(
@@ -587,15 +672,9 @@ async def register_upload_end(task_id: str):
     logger.debug(f"✅ Upload {task_id} completed and unregistered")
 
 def release_account_reservation(account_session_name: str):
-    """Release the account reservation (decrement counter)"""
-    global _account_upload_counters
-    
+    """Release the account reservation and wake one upload waiting for an account"""
     try:
-        if account_session_name in _account_upload_counters:
-            _account_upload_counters[account_session_name] = max(0, _account_upload_counters[account_session_name] - 1)
-            logger.info(f"🔓 [{account_session_name}] Released account reservation (active: {_account_upload_counters[account_session_name]})")
-        else:
-            logger.warning(f"⚠️ [{account_session_name}] Attempted to release reservation for account not in counters")
+        UPLOAD_SCHEDULER.release(account_session_name)
     except Exception as e:
         logger.error(f"❌ [{account_session_name}] Error releasing account reservation: {e}")
 
@@ -673,161 +752,53 @@ async def diagnose_account_distribution(db: AsyncSession):
         }
 
 async def increment_daily_stat(db: AsyncSession, session_name: str):
-    await increment_uploads(db, session_name)
+    """Count an upload in the scheduler cache; it reaches the DB with the next batched flush"""
+    UPLOAD_SCHEDULER.record_upload(session_name)
 
 async def get_daily_stat(db: AsyncSession, session_name: str) -> int:
-    stats = await get_account_stats_by_session_name(db, session_name)
-    value = getattr(stats, 'today_uploads', 0)
-    return value if isinstance(value, int) else 0
-
-async def get_least_used_accounts(db: AsyncSession):
-    accounts = await get_least_used_accounts_today(db)
-    if not accounts:
-        return list(range(len(UPLOAD_ACCOUNT_POOL)))
-    min_uploads = getattr(accounts[0], 'today_uploads', 0)
-    if not isinstance(min_uploads, int):
-        min_uploads = 0
-    least_used_names = [acc.session_name for acc in accounts if getattr(acc, 'today_uploads', 0) == min_uploads]
-    return [i for i, acc in enumerate(UPLOAD_ACCOUNT_POOL) if acc.session_name in least_used_names]
-
-async def select_upload_account(db: AsyncSession):
+    return UPLOAD_SCHEDULER.today_uploads(session_name)
+
+async def select_upload_account(db: AsyncSession, wait_seconds: float = UPLOAD_ACCOUNT_WAIT_TIMEOUT_SECONDS,
+                                exclude: set | None = None):
     """
-    Select the best available upload account with atomic reservation to prevent race conditions.
-    
-    This function:
-    1. Uses a global lock to prevent race conditions during account selection
-    2. Atomically reserves the selected account by incrementing its counter
-    3. Returns the account index and account object
-    4. Ensures truly non-blocking concurrent uploads across different accounts
-    
+    Reserve the best available upload account.
+
+    Selection is done by UPLOAD_SCHEDULER in memory: the idle account with the fewest uploads
+    today and the healthiest proxy pool wins. If every account is busy we wait for a release
+    (up to `wait_seconds`) and then share the least loaded account.
+
+    `db` is kept for call-site compatibility; daily stats come from the scheduler cache.
     The caller is responsible for calling release_account_reservation() when done.
     """
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            # 🔒 Global lock prevents selection race conditions
-            async with _account_selection_lock:
-                # First try to get least used accounts
-                least_used = await get_least_used_accounts(db)
-                
-                # Check least used accounts first - prioritize non-uploading accounts
-                for idx in least_used:
-                    acc = UPLOAD_ACCOUNT_POOL[idx]
-                    
-                    # Skip accounts without available proxies
-                    if not acc.has_available_proxies():
-                        logger.debug(f"⏭️ Skipping account {acc.session_name}: no available proxies")
-                        continue
-                    
-                    # Check if account is currently uploading using the counter system
-                    is_currently_uploading = _account_upload_counters.get(acc.session_name, 0) > 0
-                    
-                    if not is_currently_uploading:
-                        # Check if account was recently used (within last 30 seconds)
-                        if time.time() - acc.last_used > 30:
-                            # Only check health if client exists, don't create new connections
-                            if acc.client is None or await acc.is_client_healthy():
-                                # 🔒 ATOMICALLY reserve this account
-                                _account_upload_counters[acc.session_name] = _account_upload_counters.get(acc.session_name, 0) + 1
-                                logger.info(f"✅ Selected least used account {acc.session_name} (not currently uploading)")
-                                return idx, acc
-                            else:
-                                # Client is unhealthy, stop it and continue
-                                logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
-                                await acc.stop_client()
-                
-                # If no non-uploading least used accounts available, try any non-uploading account
-                for idx, acc in enumerate(UPLOAD_ACCOUNT_POOL):
-                    # Skip accounts without available proxies
-                    if not acc.has_available_proxies():
-                        logger.debug(f"⏭️ Skipping account {acc.session_name}: no available proxies")
-                        continue
-                    
-                    # Check if account is currently uploading using the counter system
-                    is_currently_uploading = _account_upload_counters.get(acc.session_name, 0) > 0
-                    
-                    if not is_currently_uploading:
-                        # Check if account was recently used (within last 30 seconds)
-                        if time.time() - acc.last_used > 30:
-                            # Only check health if client exists, don't create new connections
-                            if acc.client is None or await acc.is_client_healthy():
-                                # 🔒 ATOMICALLY reserve this account
-                                _account_upload_counters[acc.session_name] = _account_upload_counters.get(acc.session_name, 0) + 1
-                                logger.info(f"✅ Selected available account {acc.session_name} (not currently uploading)")
-                                return idx, acc
-                            else:
-                                # Client is unhealthy, stop it and continue
-                                logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
-                                await acc.stop_client()
-                
-                # Before queuing, try any non-uploading account (even if recently used) to maximize parallelism
-                logger.info("No non-uploading accounts after cooldown available, trying any non-uploading account...")
-                for idx, acc in enumerate(UPLOAD_ACCOUNT_POOL):
-                    # Check if account is currently uploading using the counter system
-                    is_currently_uploading = _account_upload_counters.get(acc.session_name, 0) > 0
-                    
-                    if not is_currently_uploading:
-                        # Skip the 30-second cooldown check - use any non-uploading account
-                        # Only check health if client exists, don't create new connections
-                        if acc.client is None or await acc.is_client_healthy():
-                            # 🔒 ATOMICALLY reserve this account
-                            _account_upload_counters[acc.session_name] = _account_upload_counters.get(acc.session_name, 0) + 1
-                            logger.info(f"✅ Selected non-uploading account {acc.session_name} (bypassing cooldown)")
-                            return idx, acc
-                        else:
-                            # Client is unhealthy, stop it and continue
-                            logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
-                            await acc.stop_client()
-                
-                # If all accounts are currently uploading, find the one with least uploads and queue there
-                logger.warning("All upload accounts are currently uploading, selecting least used for queuing...")
-                
-                # Among currently uploading accounts, select the one with least uploads
-                for idx in least_used:
-                    acc = UPLOAD_ACCOUNT_POOL[idx]
-                    # Check if account was recently used (within last 30 seconds)
-                    if time.time() - acc.last_used > 30:
-                        # Only check health if client exists, don't create new connections
-                        if acc.client is None or await acc.is_client_healthy():
-                            # 🔒 ATOMICALLY reserve this account
-                            _account_upload_counters[acc.session_name] = _account_upload_counters.get(acc.session_name, 0) + 1
-                            logger.info(f"⏳ Selected least used account {acc.session_name} for queuing (currently uploading)")
-                            return idx, acc
-                        else:
-                            # Client is unhealthy, stop it and continue
-                            logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
-                            await acc.stop_client()
-                
-                # If all least used accounts are unhealthy, try any account
-                for idx, acc in enumerate(UPLOAD_ACCOUNT_POOL):
-                    # Check if account was recently used (within last 30 seconds)
-                    if time.time() - acc.last_used > 30:
-                        # Only check health if client exists, don't create new connections
-                        if acc.client is None or await acc.is_client_healthy():
-                            # 🔒 ATOMICALLY reserve this account
-                            _account_upload_counters[acc.session_name] = _account_upload_counters.get(acc.session_name, 0) + 1
-                            logger.info(f"⏳ Selected available account {acc.session_name} for queuing (currently uploading)")
-                            return idx, acc
-                        else:
-                            # Client is unhealthy, stop it and continue
-                            logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
-                            await acc.stop_client()
-                
-                # If all accounts are unhealthy or recently used, wait a bit and return the first one
-                logger.warning("All upload accounts are unhealthy or recently used, waiting...")
-                await asyncio.sleep(10)  # Wait 10 seconds
-                # 🔒 ATOMICALLY reserve the first account
-                _account_upload_counters[UPLOAD_ACCOUNT_POOL[0].session_name] = _account_upload_counters.get(UPLOAD_ACCOUNT_POOL[0].session_name, 0) + 1
-                return 0, UPLOAD_ACCOUNT_POOL[0]
-            
-        except Exception as e:
-            if attempt < max_retries - 1:
-                logger.warning(f"Database error in select_upload_account (attempt {attempt + 1}): {e}")
-                await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
-                continue
-            else:
-                 logger.error(f"Database error in select_upload_account after {max_retries} attempts: {e}")
-                 raise Exception(f"Failed to select upload account after {max_retries} attempts: {e}")
+    picked = await UPLOAD_SCHEDULER.acquire(wait_seconds, exclude=exclude)
+    if picked is None:
+        raise Exception("No upload account available for selection")
+
+    idx, acc = picked
+    logger.info(f"✅ Selected upload account {acc.session_name} ({UPLOAD_SCHEDULER.today_uploads(acc.session_name)} uploads today)")
+
+    # Health check happens after the reservation, so it never delays other selections
+    if acc.client is not None and time.time() - acc.last_used > 30:
+        if not await acc.is_client_healthy():
+            logger.warning(f"Account {acc.session_name} has unhealthy client, stopping it")
+            await acc.stop_client()
+    return idx, acc
+
+def plan_part_count(required_parts: int, max_useful_parts: int, cap: int = MAX_PARTS_PER_DELIVERY) -> int:
+    """
+    How many parts to cut a delivery into.
+
+    Per-account upload bandwidth is the bottleneck, so when more accounts are idle than
+    `required_parts` we cut more (smaller) parts and upload them in parallel. Extra parts are
+    bounded by `cap` (parts the user receives) and `max_useful_parts` (don't make tiny parts);
+    `required_parts` always wins, it is what the content itself needs.
+    """
+    idle = len(UPLOAD_SCHEDULER.idle_accounts())
+    parallel = min(idle, cap, max_useful_parts)
+    planned = max(required_parts, parallel)
+    if planned != required_parts:
+        logger.info(f"🧩 {idle} idle upload accounts: splitting into {planned} parts instead of {required_parts}")
+    return planned
 
 async def idle_client_cleanup():
     while True:
@@ -837,45 +808,89 @@ async def idle_client_cleanup():
                 await account.stop_client()
         await asyncio.sleep(300)  # Check every 5 minutes
 
+# --- Active proxy probing ---
+
+async def probe_proxy_latency(account: UploadAccount, proxy_index: int) -> float | None:
+    """Time a SOCKS handshake through the proxy to a Telegram DC; no MTProto session is created"""
+    from python_socks.async_.asyncio import Proxy
+
+    proxy_info = account.proxy_pool[proxy_index]
+    scheme = proxy_info.get("type", "socks5")
+    proxy = Proxy.from_url(
+        f"{scheme}://{proxy_info['username']}:{proxy_info['password']}@{proxy_info['ip']}:{proxy_info['port']}"
+    )
+    target_host, target_port = PROXY_CONFIG.get("probe_target").rsplit(":", 1)
+    timeout = PROXY_CONFIG.get("probe_timeout_seconds")
+
+    started = time.monotonic()
+    try:
+        stream = await asyncio.wait_for(proxy.connect(dest_host=target_host, dest_port=int(target_port)), timeout=timeout)
+    except Exception as e:
+        logger.debug(f"[{account.session_name}] Probe of proxy {proxy_info['ip']}:{proxy_info['port']} failed: {type(e).__name__}: {e}")
+        # Count a failed probe as the worst latency, but never cool down or blacklist on a probe
+        account.record_proxy_latency(proxy_index, float(timeout))
+        return None
+    latency = time.monotonic() - started
+
+    try:
+        closed = stream.close()
+        if asyncio.iscoroutine(closed):
+            await closed
+    except Exception:
+        pass
+
+    account.record_proxy_latency(proxy_index, latency)
+    return latency
+
+async def proxy_probe_worker():
+    """Periodically measure idle proxies so selection has data before the first upload through them"""
+    try:
+        import python_socks  # noqa: F401 - installed with aiohttp-socks
+    except ImportError:
+        logger.warning("⚠️ python-socks is not installed, proxy probing is disabled")
+        return
+
+    interval = PROXY_CONFIG.get("probe_interval_seconds")
+    logger.info(f"📡 Proxy prober started (every {interval}s, target {PROXY_CONFIG.get('probe_target')})")
+    while True:
+        for account in UPLOAD_ACCOUNT_POOL:
+            for proxy_index in account.available_proxy_indexes():
+                # Leave the proxy an active client is using alone
+                if account.client is not None and proxy_index == account.current_proxy_index:
+                    continue
+                latency = await probe_proxy_latency(account, proxy_index)
+                if latency is not None:
+                    logger.debug(f"📡 [{account.session_name}] Proxy {proxy_index} latency {latency:.2f}s "
+                                 f"(ewma {account.proxy_connect_latency.get(proxy_index, latency):.2f}s)")
+        await asyncio.sleep(interval)
+
 # --- Per-account rate limit tracking functions ---
 
 def reset_rate_limit_events_for_account(account_session_name: str):
     """Reset rate limit event counter after successful proxy rotation"""
     if account_session_name in _account_rate_limit_events:
         old_count = len(_account_rate_limit_events[account_session_name])
-        _account_rate_limit_events[account_session_name] = []
+        _account_rate_limit_events[account_session_name].clear()
         logger.info(f"🔄 [{account_session_name}] Rate limit events reset after proxy rotation (cleared {old_count} events)")
     else:
         logger.info(f"🔄 [{account_session_name}] Rate limit events reset (no events to clear)")
 
 def track_rate_limit_event_per_account(account_session_name: str, wait_seconds: int):
     """Track rate limit events per account (adapted from current global tracking)"""
-    if account_session_name not in _account_rate_limit_events:
-        _account_rate_limit_events[account_session_name] = []
-    
-    current_time = time.time()
-    
-    # Add the rate limit event
-    _account_rate_limit_events[account_session_name].append({
-        "timestamp": current_time,
-        "wait_seconds": wait_seconds
-    })
-    
-    # Keep only events within detection window
-    cutoff_time = current_time - (PROXY_CONFIG.get("rate_limit_detection_window") * 60)
-    _account_rate_limit_events[account_session_name] = [
-        event for event in _account_rate_limit_events[account_session_name] 
-        if event["timestamp"] > cutoff_time
-    ]
+    events = _account_rate_limit_events.get(account_session_name)
+    if events is None:
+        events = _account_rate_limit_events[account_session_name] = SlidingWindowCounter(
+            PROXY_CONFIG.get("rate_limit_detection_window") * 60, RATE_LIMIT_EVENTS_MAX
+        )
+
+    # Add the rate limit event; events outside the detection window drop off
+    events.add(wait_seconds)
     
     # Check if we should trigger rotation for this specific account
-    significant_events = [
-        event for event in _account_rate_limit_events[account_session_name]
-        if event["wait_seconds"] >= PROXY_CONFIG.get("rate_limit_wait_threshold")
-    ]
+    significant_events = events.count(min_value=PROXY_CONFIG.get("rate_limit_wait_threshold"))
     
-    if len(significant_events) >= PROXY_CONFIG.get("max_rate_limit_events"):
-        logger.warning(f"🚨 [{account_session_name}] Smart rotation triggered: {len(significant_events)} significant events")
+    if significant_events >= PROXY_CONFIG.get("max_rate_limit_events"):
+        logger.warning(f"🚨 [{account_session_name}] Smart rotation triggered: {significant_events} significant events")
         return True
     
     return False
@@ -892,16 +907,16 @@ def get_rate_limit_stats_per_account(account_session_name: str):
         }
     
     events = _account_rate_limit_events[account_session_name]
+    wait_times = events.values()
     significant_events = [
-        event for event in events 
-        if event["wait_seconds"] >= PROXY_CONFIG.get("rate_limit_wait_threshold")
+        wait for wait in wait_times
+        if wait >= PROXY_CONFIG.get("rate_limit_wait_threshold")
     ]
-    wait_times = [event["wait_seconds"] for event in events]
     
     return {
-        "total_events": len(events),
+        "total_events": len(wait_times),
         "significant_events": len(significant_events),
         "max_wait_time": max(wait_times) if wait_times else 0,
         "average_wait_time": sum(wait_times) / len(wait_times) if wait_times else 0,
-        "events_in_window": len(events)
+        "events_in_window": len(wait_times)
     }
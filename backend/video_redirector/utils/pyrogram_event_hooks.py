@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from pyrogram.connection.transport import TCP
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+logger = logging.getLogger(__name__)
+
+
+class PyrogramNetEvent(NamedTuple):
+    kind: str  # "flood_wait" | "timeout" | "network_issue"
+    session_name: Optional[str]  # upload account (session file name), None if it couldn't be told
+    query: Optional[str]  # e.g. "upload.SaveBigFilePart"
+    wait_seconds: int
+    timestamp: float
+
+
+# Session.start() runs the connect, so transport errors are attributed through this context var
+_current_session_name = contextvars.ContextVar("pyrogram_session_name", default=None)
+
+_listeners: List[Callable[[PyrogramNetEvent], None]] = []
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+_installed = False
+
+
+def _session_name(session) -> Optional[str]:
+    name = getattr(getattr(session, "client", None), "name", None)
+    # Clients are created with the session file path: /app/backend/session_files/session5
+    return os.path.basename(str(name)) if name else None
+
+
+def _query_name(query) -> Optional[str]:
+    # Unwrap InvokeWithLayer / InvokeWithoutUpdates / InvokeWithTakeout
+    while getattr(query, "query", None) is not None:
+        query = query.query
+    qualname = getattr(query, "QUALNAME", None)
+    return ".".join(qualname.split(".")[1:]) if qualname else None
+
+
+def _emit(kind: str, session_name: Optional[str], query: Optional[str] = None, wait_seconds: int = 0):
+    loop = _main_loop
+    if loop is None or loop.is_closed() or not _listeners:
+        return
+    event = PyrogramNetEvent(kind, session_name, query, int(wait_seconds), time.time())
+    for listener in _listeners:
+        # Pyrogram may run on another loop/thread; listeners always run on the main loop
+        loop.call_soon_threadsafe(listener, event)
+
+
+_original_session_send = Session.send
+_original_session_start = Session.start
+_original_tcp_connect = TCP.connect
+
+
+async def _session_send_with_events(self, data, *args, **kwargs):
+    try:
+        return await _original_session_send(self, data, *args, **kwargs)
+    except FloodWait as e:
+        # send() calls itself again on BadServerSalt; report each error once
+        if not getattr(e, "_net_event_emitted", False):
+            e._net_event_emitted = True
+            _emit("flood_wait", _session_name(self), _query_name(data), e.value)
+        raise
+    except TimeoutError as e:
+        if not getattr(e, "_net_event_emitted", False):
+            e._net_event_emitted = True
+            _emit("timeout", _session_name(self), _query_name(data))
+        raise
+
+
+async def _session_start_with_context(self, *args, **kwargs):
+    token = _current_session_name.set(_session_name(self))
+    try:
+        return await _original_session_start(self, *args, **kwargs)
+    finally:
+        _current_session_name.reset(token)
+
+
+async def _tcp_connect_with_events(self, *args, **kwargs):
+    try:
+        return await _original_tcp_connect(self, *args, **kwargs)
+    except OSError:
+        _emit("network_issue", _current_session_name.get())
+        raise
+
+
+def add_pyrogram_event_listener(listener: Callable[[PyrogramNetEvent], None]):
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def install_pyrogram_event_hooks(loop: asyncio.AbstractEventLoop):
+    """Wrap Pyrogram's send/connect paths so flood waits, timeouts and socket errors become events (idempotent)"""
+    global _main_loop, _installed
+    _main_loop = loop
+    if _installed:
+        return
+    Session.send = _session_send_with_events
+    Session.start = _session_start_with_context
+    TCP.connect = _tcp_connect_with_events
+    _installed = True
+    logger.info("✅ Pyrogram flood wait / timeout / network event hooks installed")
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import Dict
+
+from pyrogram.storage import MemoryStorage
+
+from backend.video_redirector.config import PYROGRAM_SESSION_WRITEBACK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotMemoryStorage(MemoryStorage):
+    """
+    Pyrogram storage that lives in memory but is seeded from, and written back to, a .session file.
+
+    The file is copied into an in-memory SQLite database once (sqlite backup API, read-only), so
+    uploads never open the session file and can't hit "database is locked". Changes (auth key,
+    dc, peers) are serialized on the event loop and written back by session_writeback_worker()
+    through a temp file + os.replace, so the .session file is never seen half-written.
+
+    Client.stop() closes its storage; here that only commits, so the next client created for the
+    same account (e.g. after a proxy rotation) reuses the already loaded state.
+    """
+
+    def __init__(self, name: str, session_file: str):
+        super().__init__(name)
+        self.session_file = session_file
+        self.conn = None
+        self._saved_changes = 0
+
+    def load(self):
+        if self.conn is not None:
+            return
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        source = sqlite3.connect(f"file:{self.session_file}?mode=ro", uri=True)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        self.conn = conn
+        self._saved_changes = conn.total_changes
+
+    async def open(self):
+        self.load()
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+
+    async def delete(self):
+        pass
+
+    def has_unsaved_changes(self) -> bool:
+        return self.conn is not None and self.conn.total_changes != self._saved_changes
+
+    async def write_back(self) -> bool:
+        """Persist the in-memory session to its file; returns True if something was written"""
+        if not self.has_unsaved_changes():
+            return False
+        self.conn.commit()
+        changes = self.conn.total_changes
+        data = self.conn.serialize()
+        await asyncio.to_thread(_atomic_write, self.session_file, data)
+        self._saved_changes = changes
+        return True
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+_SESSION_STORAGES: Dict[str, SnapshotMemoryStorage] = {}
+
+
+def get_session_storage(session_name: str, session_path: str) -> SnapshotMemoryStorage:
+    """The account's in-memory session, loaded from `{session_path}.session` on first use"""
+    storage = _SESSION_STORAGES.get(session_name)
+    if storage is None:
+        storage = SnapshotMemoryStorage(session_name, f"{session_path}.session")
+        storage.load()
+        _SESSION_STORAGES[session_name] = storage
+        logger.info(f"🧠 [{session_name}] Session loaded into memory from {storage.session_file}")
+    return storage
+
+
+def preload_session_storages(session_dir: str, session_names: list) -> int:
+    """Load every account's session at startup; accounts whose file can't be read load lazily later"""
+    loaded = 0
+    for session_name in session_names:
+        try:
+            get_session_storage(session_name, os.path.join(session_dir, session_name))
+            loaded += 1
+        except Exception as e:
+            logger.error(f"❌ [{session_name}] Could not load session into memory: {e}")
+    return loaded
+
+
+async def flush_session_storages():
+    for session_name, storage in list(_SESSION_STORAGES.items()):
+        try:
+            if await storage.write_back():
+                logger.debug(f"💾 [{session_name}] Session written back to {storage.session_file}")
+        except Exception as e:
+            logger.error(f"❌ [{session_name}] Session write-back failed: {e}")
+
+
+async def session_writeback_worker():
+    while True:
+        await asyncio.sleep(PYROGRAM_SESSION_WRITEBACK_SECONDS)
+        await flush_session_storages()
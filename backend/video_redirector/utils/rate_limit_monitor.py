@@ -1,4 +1,3 @@
-import re
 import logging
 import asyncio
 import time
@@ -10,23 +9,18 @@ from backend.video_redirector.utils.pyrogram_acc_manager import (
     AllProxiesExhaustedError,
     reset_rate_limit_events_for_account
 )
+from backend.video_redirector.utils.pyrogram_event_hooks import (
+    PyrogramNetEvent,
+    add_pyrogram_event_listener,
+    install_pyrogram_event_hooks
+)
+from backend.video_redirector.utils.sliding_window_counter import SlidingWindowCounter
 from backend.video_redirector.utils.notify_admin import notify_admin
 
 logger = logging.getLogger(__name__)
 
-# Regex patterns to match Pyrogram messages
-RATE_LIMIT_PATTERN = re.compile(
-    r'Waiting for (\d+) seconds before continuing \(required by "upload\.SaveBigFilePart"\)'
-)
-
-# Network issues and timeouts patterns
-NETWORK_ISSUE_PATTERN = re.compile(
-    r'Unable to connect due to network issues: Socket error'
-)
-
-REQUEST_TIMEOUT_PATTERN = re.compile(
-    r'Retrying "upload\.SaveBigFilePart" due to: Request timed out'
-)
+# Flood waits and timeouts only count against the account when they hit file uploads
+UPLOAD_QUERIES = {"upload.SaveBigFilePart", "upload.SaveFilePart"}
 
 # Track which account is currently uploading (will be set by upload process)
 _upload_contexts = {}
@@ -43,52 +37,27 @@ _rotation_suppression_until = {}  # account_name -> timestamp
 ROTATION_SUPPRESSION_WINDOW = 20  # seconds to suppress repeated actions after rotation trigger
 
 # Track network/timeout failures for threshold-based rotation
-_network_failure_counts = {}  # account_name -> {event_type: count}
-_network_failure_timestamps = {}  # account_name -> {event_type: [timestamps]}
+_network_failures = {}  # account_name -> {event_type: SlidingWindowCounter}
 NETWORK_FAILURE_THRESHOLD = 3  # Failures before rotation
 NETWORK_FAILURE_WINDOW = 60   # seconds to track failures
+NETWORK_FAILURE_MAX_EVENTS = 32  # per account and event type; only the threshold matters
 
-class RateLimitLogHandler(logging.Handler):
-    """Enhanced log handler for Pyrogram rate limiting, network issues, and timeout detection"""
+class RateLimitEventMonitor:
+    """Acts on typed Pyrogram events (flood waits, request timeouts, connect errors); always called on the main loop"""
     
-    def emit(self, record):
+    def on_event(self, event: PyrogramNetEvent):
         try:
-            message = record.getMessage()
-            
-            # Attempt to extract session name from messages like:
-            # [/app/backend/session_files/session5] Waiting for 7 seconds before continuing (required by "upload.SaveBigFilePart")
-            session_match = re.search(r"\[(?:.+/)?session_files/([^\]]+)\]", message)
-            session_from_message = session_match.group(1) if session_match else None
-            
-            # Check for rate limiting (primary mechanism)
-            if (
-                record.name == "pyrogram.session.session"
-                and "Waiting for" in message
-                and "upload.SaveBigFilePart" in message
-            ):
-                match = re.search(r'Waiting for (\d+) seconds', message)
-                if match:
-                    wait_seconds = int(match.group(1))
-                    # Use asyncio to avoid blocking; act only on the emitting session if available
-                    asyncio.create_task(self._handle_rate_limit(wait_seconds, session_from_message))
-            
-            # Check for network issues (proactive handling)
-            elif (
-                record.name == "pyrogram.connection.connection"
-                and NETWORK_ISSUE_PATTERN.search(message)
-            ):
-                # Try to act on the emitting session if present; fallback to current upload contexts
-                asyncio.create_task(self._handle_network_issue(session_from_message))
-            
-            # Check for request timeouts (proactive handling)
-            elif (
-                record.name == "pyrogram.session.session"
-                and REQUEST_TIMEOUT_PATTERN.search(message)
-            ):
-                asyncio.create_task(self._handle_request_timeout(session_from_message))
-
+            if event.kind == "flood_wait":
+                if event.query in UPLOAD_QUERIES:
+                    asyncio.create_task(self._handle_rate_limit(event.wait_seconds, event.session_name))
+            elif event.kind == "timeout":
+                if event.query in UPLOAD_QUERIES:
+                    asyncio.create_task(self._handle_request_timeout(event.session_name))
+            elif event.kind == "network_issue":
+                # Connect errors during auth carry no session; those fall back to current upload contexts
+                asyncio.create_task(self._handle_network_issue(event.session_name))
         except Exception as e:
-            logger.debug(f"Error in log handler: {e}")
+            logger.debug(f"Error dispatching Pyrogram event {event.kind}: {e}")
     
     async def _handle_rate_limit(self, wait_seconds: int, account_session_name: str | None = None):
         """Handle rate limiting events proactively without direct rotation, targeting only the emitting session when provided"""
@@ -146,6 +115,7 @@ class RateLimitLogHandler(logging.Handler):
                                         account.proxy_threshold_strikes = {current_proxy_idx: 1}
                                     else:
                                         account.proxy_threshold_strikes[current_proxy_idx] = 1
+                                account.mark_health_dirty()
                             else:
                                 logger.info(
                                     f"[{account_session_name}] Threshold already scheduled for proxy index {current_proxy_idx} in this upload; not incrementing strikes"
@@ -286,40 +256,21 @@ class RateLimitLogHandler(logging.Handler):
 
     def _track_network_failure(self, account_name: str, event_type: str) -> int:
         """Track network/timeout failures and return current count within window"""
-        current_time = time.time()
-        
-        # Initialize tracking for this account if needed
-        if account_name not in _network_failure_counts:
-            _network_failure_counts[account_name] = {}
-            _network_failure_timestamps[account_name] = {}
-        
-        if event_type not in _network_failure_counts[account_name]:
-            _network_failure_counts[account_name][event_type] = 0
-            _network_failure_timestamps[account_name][event_type] = []
-        
-        # Add current failure
-        _network_failure_timestamps[account_name][event_type].append(current_time)
-        _network_failure_counts[account_name][event_type] += 1
-        
-        # Clean up old failures outside the window
-        cutoff_time = current_time - NETWORK_FAILURE_WINDOW
-        _network_failure_timestamps[account_name][event_type] = [
-            ts for ts in _network_failure_timestamps[account_name][event_type]
-            if ts > cutoff_time
-        ]
-        
-        # Update count to reflect only failures within window
-        _network_failure_counts[account_name][event_type] = len(_network_failure_timestamps[account_name][event_type])
-        
-        return _network_failure_counts[account_name][event_type]
+        counters = _network_failures.setdefault(account_name, {})
+        counter = counters.get(event_type)
+        if counter is None:
+            counter = counters[event_type] = SlidingWindowCounter(NETWORK_FAILURE_WINDOW, NETWORK_FAILURE_MAX_EVENTS)
+        return counter.add()
 
     def _reset_network_failures(self, account_name: str, event_type: str):
         """Reset failure count for an account/event type (called on successful operations)"""
-        if account_name in _network_failure_counts and event_type in _network_failure_counts[account_name]:
-            _network_failure_counts[account_name][event_type] = 0
-            _network_failure_timestamps[account_name][event_type] = []
+        counter = _network_failures.get(account_name, {}).get(event_type)
+        if counter is not None:
+            counter.clear()
             logger.debug(f"🔄 [{account_name}] Reset {event_type} failure count")
 
+RATE_LIMIT_MONITOR = RateLimitEventMonitor()
+
 def set_current_uploading_account(task_id: str, account_session_name: str):
     """Set the account that is currently uploading for rate limit tracking"""
     global _upload_contexts
@@ -338,12 +289,9 @@ def clear_current_uploading_account(task_id: str):
 
 def reset_network_failures_for_account(account_name: str):
     """Reset network failure counts for an account (called on successful uploads)"""
-    global _network_failure_counts, _network_failure_timestamps
-    
-    if account_name in _network_failure_counts:
-        for event_type in _network_failure_counts[account_name]:
-            _network_failure_counts[account_name][event_type] = 0
-            _network_failure_timestamps[account_name][event_type] = []
+    if account_name in _network_failures:
+        for counter in _network_failures[account_name].values():
+            counter.clear()
         logger.info(f"🔄 [{account_name}] Reset all network failure counts after successful upload")
 
 def get_current_uploading_account(task_id: str):
@@ -355,37 +303,15 @@ def get_all_current_uploading_accounts():
     return _upload_contexts.copy()
 
 def setup_pyrogram_rate_limit_monitoring():
-    """Attach the custom handler to Pyrogram's loggers (safe, idempotent)"""
-    # Setup for session logger (existing)
-    pyrogram_session_logger = logging.getLogger("pyrogram.session.session")
-    session_handler_exists = any(isinstance(h, RateLimitLogHandler) for h in pyrogram_session_logger.handlers)
-    
-    # Setup for connection logger (new)
-    pyrogram_connection_logger = logging.getLogger("pyrogram.connection.connection")
-    connection_handler_exists = any(isinstance(h, RateLimitLogHandler) for h in pyrogram_connection_logger.handlers)
-    
-    # Create handler if it doesn't exist
-    if not session_handler_exists or not connection_handler_exists:
-        handler = RateLimitLogHandler()
-        
-        # Add to session logger if not already present
-        if not session_handler_exists:
-            pyrogram_session_logger.addHandler(handler)
-            logger.info("✅ Pyrogram session rate limit monitoring enabled")
-        
-        # Add to connection logger if not already present
-        if not connection_handler_exists:
-            pyrogram_connection_logger.addHandler(handler)
-            logger.info("✅ Pyrogram connection monitoring enabled")
-        
-        return handler
-    
-    # Return existing handler
-    for handler in pyrogram_session_logger.handlers:
-        if isinstance(handler, RateLimitLogHandler):
-            return handler
-    
-    return None
+    """Hook Pyrogram's send/connect paths and route their events to the monitor (safe, idempotent)"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = asyncio.get_event_loop()
+    install_pyrogram_event_hooks(loop)
+    add_pyrogram_event_listener(RATE_LIMIT_MONITOR.on_event)
+    logger.info("✅ Pyrogram rate limit / network monitoring enabled")
+    return RATE_LIMIT_MONITOR
 
 def get_rate_limit_summary():
     """Get a summary of current rate limiting status for all accounts"""
@@ -424,11 +350,11 @@ def get_network_failure_summary():
     
     for account in UPLOAD_ACCOUNT_POOL:
         account_name = account.session_name
-        if account_name in _network_failure_counts:
+        if account_name in _network_failures:
             summary[account_name] = {}
-            for event_type, count in _network_failure_counts[account_name].items():
+            for event_type, counter in _network_failures[account_name].items():
                 summary[account_name][event_type] = {
-                    "current_count": count,
+                    "current_count": counter.count(),
                     "threshold": NETWORK_FAILURE_THRESHOLD,
                     "window_seconds": NETWORK_FAILURE_WINDOW
                 }
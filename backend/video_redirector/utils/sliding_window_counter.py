@@ -0,0 +1,44 @@
+import time
+from collections import deque
+from typing import Optional
+
+
+class SlidingWindowCounter:
+    """
+    Events (timestamp, value) of the last `window_seconds`, never more than `max_events`.
+
+    Old events are dropped from the left on every access, so memory and the cost of a count stay
+    bounded no matter how many events arrive.
+    """
+
+    def __init__(self, window_seconds: float, max_events: int):
+        self.window_seconds = window_seconds
+        self._events = deque(maxlen=max_events)
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._events and self._events[0][0] <= cutoff:
+            self._events.popleft()
+
+    def add(self, value: float = 0.0, now: Optional[float] = None) -> int:
+        """Record an event; returns how many events are in the window now"""
+        now = time.time() if now is None else now
+        self._events.append((now, value))
+        self._expire(now)
+        return len(self._events)
+
+    def count(self, min_value: Optional[float] = None, now: Optional[float] = None) -> int:
+        self._expire(time.time() if now is None else now)
+        if min_value is None:
+            return len(self._events)
+        return sum(1 for _, value in self._events if value >= min_value)
+
+    def values(self, now: Optional[float] = None) -> list:
+        self._expire(time.time() if now is None else now)
+        return [value for _, value in self._events]
+
+    def clear(self):
+        self._events.clear()
+
+    def __len__(self) -> int:
+        return self.count()
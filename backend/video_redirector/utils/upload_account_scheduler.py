@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.video_redirector.db.crud_upload_accounts import get_all_stats, increment_uploads_batch
+from backend.video_redirector.db.session import get_db
+from backend.video_redirector.config import UPLOAD_STATS_FLUSH_INTERVAL_SECONDS, UPLOAD_ACCOUNT_BALANCE_SLACK
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting upload re-checks accounts that were idle but had no usable proxy
+# (cooldowns and quarantines expire with time, not with a release)
+AVAILABILITY_RECHECK_SECONDS = 5
+
+
+class UploadAccountScheduler:
+    """
+    In-memory scheduler for upload accounts.
+
+    Idle accounts live in a priority heap ordered by today's uploads (bucketed by
+    UPLOAD_ACCOUNT_BALANCE_SLACK), measured upload speed, proxy health and release time. Picking an account is a handful of heap pops done synchronously on the
+    event loop, so there is no lock and no awaiting while selecting. Callers that find no
+    idle account wait on a future that is resolved by release().
+
+    Daily upload counters are cached here and flushed to UploadAccountStats in batches.
+
+    With a `lease_store` every local reservation is backed by a Redis lease, so several
+    worker processes never book the same account.
+    """
+
+    def __init__(self, accounts: Iterable, upload_counters: Dict[str, int], max_concurrent_per_account: int = 1,
+                 lease_store=None):
+        self._accounts: Dict[str, Tuple[int, object]] = {
+            acc.session_name: (idx, acc) for idx, acc in enumerate(accounts)
+        }
+        self._counters = upload_counters  # shared with pyrogram_acc_manager
+        self._max_concurrent = max_concurrent_per_account
+        self._lease_store = lease_store
+        self._remote_busy_until: Dict[str, float] = {}  # accounts another worker holds
+
+        self._heap: list = []
+        self._versions: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._waiters: deque = deque()
+
+        self._stats_day = date.today()
+        self._today_uploads: Dict[str, int] = {name: 0 for name in self._accounts}
+        self._pending_increments: Dict[str, int] = {}
+
+        for name in self._accounts:
+            self._counters.setdefault(name, 0)
+            self._push(name)
+
+    # --- heap helpers ---
+
+    @staticmethod
+    def _proxy_health(acc) -> float:
+        """Share of the account's proxy pool that is neither blacklisted nor cooling down"""
+        pool_size = len(acc.proxy_pool)
+        if not pool_size:
+            return 0.0
+        now = time.time()
+        cooling = sum(1 for i, until in acc.proxy_cooldowns.items() if until > now and i not in acc.blacklisted_proxies)
+        return (pool_size - len(acc.blacklisted_proxies) - cooling) / pool_size
+
+    def _push(self, name: str):
+        _, acc = self._accounts[name]
+        version = self._versions.get(name, 0) + 1
+        self._versions[name] = version
+        uploads_bucket = self._today_uploads.get(name, 0) // max(1, UPLOAD_ACCOUNT_BALANCE_SLACK)
+        priority = (uploads_bucket, -acc.expected_upload_mbps(), -self._proxy_health(acc), next(self._seq))
+        heapq.heappush(self._heap, (priority, name, version))
+
+    def _is_idle(self, name: str) -> bool:
+        return self._counters.get(name, 0) < self._max_concurrent
+
+    def _roll_day_if_needed(self):
+        today = date.today()
+        if today == self._stats_day:
+            return
+        logger.info(f"📅 New upload day {today}, resetting cached daily counters")
+        self._stats_day = today
+        self._today_uploads = {name: 0 for name in self._accounts}
+        self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = []
+        for name in self._accounts:
+            if self._is_idle(name):
+                self._push(name)
+
+    def _reserve(self, name: str) -> Tuple[int, object]:
+        self._counters[name] = self._counters.get(name, 0) + 1
+        if self._is_idle(name):
+            # Still has free slots (MAX_CONCURRENT_UPLOADS_PER_ACCOUNT > 1)
+            self._push(name)
+        return self._accounts[name]
+
+    def _wake_one_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    # --- selection ---
+
+    def try_acquire(self, exclude: Optional[set] = None) -> Optional[Tuple[int, object]]:
+        """Reserve the best idle account with a usable proxy, or return None without waiting"""
+        self._roll_day_if_needed()
+        deferred = []
+        selected = None
+
+        while self._heap:
+            _, name, version = heapq.heappop(self._heap)
+            if self._versions.get(name) != version or not self._is_idle(name):
+                continue  # stale entry
+            _, acc = self._accounts[name]
+            if ((exclude and name in exclude) or acc.is_quarantined() or not acc.has_available_proxies()
+                    or self._remote_busy_until.get(name, 0) > time.monotonic()):
+                deferred.append(name)
+                continue
+            selected = name
+            break
+
+        for name in deferred:
+            self._push(name)
+
+        if selected is None:
+            return None
+        return self._reserve(selected)
+
+    def _unreserve(self, name: str):
+        """Undo a local reservation whose Redis lease was refused (no waiter wake-up)"""
+        self._counters[name] = max(0, self._counters.get(name, 0) - 1)
+        self._push(name)
+
+    async def _try_acquire_leased(self, exclude: Optional[set] = None) -> Optional[Tuple[int, object]]:
+        skipped = set(exclude or ())
+        while True:
+            picked = self.try_acquire(skipped)
+            if picked is None or self._lease_store is None:
+                return picked
+            name = picked[1].session_name
+            if await self._lease_store.acquire_lease(name, self._max_concurrent):
+                return picked
+            logger.debug(f"[{name}] Account is busy in another worker, trying the next one")
+            self._unreserve(name)
+            self._remote_busy_until[name] = time.monotonic() + AVAILABILITY_RECHECK_SECONDS
+            skipped.add(name)
+
+    def _acquire_overflow(self, exclude: Optional[set] = None) -> Optional[Tuple[int, object]]:
+        """Share a busy account when nothing became idle in time (previous behaviour: queue on least used)"""
+        candidates = [
+            (name, acc) for name, (_, acc) in self._accounts.items()
+            if not (exclude and name in exclude)
+        ]
+        if not candidates:
+            return None
+        usable = [(name, acc) for name, acc in candidates if acc.has_available_proxies() and not acc.is_quarantined()]
+        pool = usable or candidates
+        name, _ = min(pool, key=lambda item: (self._counters.get(item[0], 0), self._today_uploads.get(item[0], 0)))
+        return self._reserve(name)
+
+    async def acquire(self, timeout: float, exclude: Optional[set] = None) -> Optional[Tuple[int, object]]:
+        """
+        Reserve an account, waiting up to `timeout` seconds for one to be released.
+
+        After the timeout the least loaded account is shared so uploads never stall forever.
+        Returns None only when every account is excluded.
+        """
+        picked = await self._try_acquire_leased(exclude)
+        if picked:
+            return picked
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, timeout)
+        if timeout > 0:
+            logger.info(f"⏳ No idle upload account, waiting up to {timeout:.0f}s for a release ({len(self._waiters)} already waiting)")
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=min(remaining, AVAILABILITY_RECHECK_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            picked = await self._try_acquire_leased(exclude)
+            if picked:
+                return picked
+
+        picked = self._acquire_overflow(exclude)
+        if picked:
+            if self._lease_store is not None:
+                # Sharing is deliberate here, so take the lease even over the limit
+                await self._lease_store.acquire_lease(picked[1].session_name, self._max_concurrent, force=True)
+            logger.warning(f"⚠️ No upload account became idle in {timeout:.0f}s, sharing busy account {picked[1].session_name}")
+        return picked
+
+    def release(self, name: str):
+        if name not in self._accounts:
+            logger.warning(f"⚠️ [{name}] Attempted to release reservation for unknown account")
+            return
+        if self._counters.get(name, 0) <= 0:
+            logger.warning(f"⚠️ [{name}] Release without an active reservation, ignoring")
+            return
+        self._counters[name] -= 1
+        if self._lease_store is not None:
+            self._lease_store.release_lease_soon(name)
+        # Re-push with a fresh priority: today's uploads changed while the account was busy
+        self._push(name)
+        logger.info(f"🔓 [{name}] Released account reservation (active: {self._counters[name]})")
+        self._wake_one_waiter()
+
+    def idle_accounts(self) -> list:
+        """Accounts that could take an upload right now, best first (no reservation is made)"""
+        ordered = sorted(
+            (entry for entry in self._heap if self._versions.get(entry[1]) == entry[2] and self._is_idle(entry[1])),
+            key=lambda entry: entry[0]
+        )
+        result = []
+        for _, name, _ in ordered:
+            _, acc = self._accounts[name]
+            if not acc.is_quarantined() and acc.has_available_proxies():
+                result.append(acc)
+        return result
+
+    def active_reservations(self, name: Optional[str] = None) -> int:
+        """Uploads currently holding `name` (or any account when name is None)"""
+        if name is not None:
+            return self._counters.get(name, 0)
+        return sum(self._counters.get(n, 0) for n in self._accounts)
+
+    # --- cached daily stats ---
+
+    def today_uploads(self, name: str) -> int:
+        self._roll_day_if_needed()
+        return self._today_uploads.get(name, 0)
+
+    def record_upload(self, name: str):
+        self._roll_day_if_needed()
+        self._today_uploads[name] = self._today_uploads.get(name, 0) + 1
+        self._pending_increments[name] = self._pending_increments.get(name, 0) + 1
+
+    async def load_stats(self, db: AsyncSession):
+        """Seed the cache from UploadAccountStats (called once at startup)"""
+        rows = await get_all_stats(db)
+        today = date.today()
+        self._stats_day = today
+        for row in rows:
+            if row.session_name not in self._accounts:
+                continue
+            uploads = getattr(row, 'today_uploads', 0) or 0
+            self._today_uploads[row.session_name] = uploads if getattr(row, 'last_upload_date', None) == today else 0
+        # Increments recorded before the load are not in the DB yet
+        for name, pending in self._pending_increments.items():
+            self._today_uploads[name] = self._today_uploads.get(name, 0) + pending
+        self._rebuild_heap()
+        logger.info(f"📊 Upload scheduler loaded daily stats for {len(rows)} accounts")
+
+    async def flush_stats(self, db: AsyncSession) -> int:
+        """Write pending upload increments in one transaction; returns number of accounts flushed"""
+        if not self._pending_increments:
+            return 0
+        batch = self._pending_increments
+        self._pending_increments = {}
+        if await increment_uploads_batch(db, batch):
+            logger.debug(f"💾 Flushed upload stats for {len(batch)} accounts")
+            return len(batch)
+        # Keep the increments for the next flush
+        for name, count in batch.items():
+            self._pending_increments[name] = self._pending_increments.get(name, 0) + count
+        return 0
+
+    async def stats_flush_worker(self):
+        while True:
+            await asyncio.sleep(UPLOAD_STATS_FLUSH_INTERVAL_SECONDS)
+            try:
+                async with get_db() as db:
+                    await self.flush_stats(db)
+            except Exception as e:
+                logger.error(f"❌ Error flushing upload stats: {e}")
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from backend.video_redirector.config import UPLOAD_WARM_POOL_CONFIG, MAX_CONCURRENT_DOWNLOADS
+from backend.video_redirector.hdrezka.hdrezka_merge_ts_into_mp4 import get_merge_etas
+from backend.video_redirector.utils.download_queue_manager import DownloadQueueManager, ACTIVE_COUNT_KEY
+from backend.video_redirector.utils.pyrogram_acc_manager import (
+    UPLOAD_ACCOUNT_POOL,
+    UPLOAD_SCHEDULER,
+    AllProxiesExhaustedError
+)
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+LOCAL_TZ = ZoneInfo('Europe/Kiev')
+
+
+class UploadClientWarmPool:
+    """
+    Keeps K Pyrogram clients connected ahead of demand, so uploads skip the proxy handshake.
+
+    K = parts of merges finishing within `merge_lead_seconds`
+        + downloads about to leave the queue
+        + the usual number of busy accounts at this hour (learned per hour of day).
+    The warm set is the head of UPLOAD_SCHEDULER.idle_accounts(), i.e. the accounts the
+    scheduler would hand out next. Clients outside the warm set are stopped after an idle
+    timeout that is long in busy hours and short in quiet ones.
+    """
+
+    def __init__(self):
+        self._hourly_busy = [0.0] * 24  # EWMA of average busy accounts per hour of day
+        self._hourly_seen = [False] * 24
+        self._current_hour: Optional[int] = None
+        self._hour_samples: list = []
+        self._warm_names: set = set()
+        self.target = 0
+
+    # --- demand model ---
+
+    def _observe_load(self, hour: int, busy: int):
+        """Fold the finished hour's average load into the per-hour profile"""
+        if self._current_hour is not None and hour != self._current_hour and self._hour_samples:
+            finished = self._current_hour
+            average = sum(self._hour_samples) / len(self._hour_samples)
+            if self._hourly_seen[finished]:
+                alpha = UPLOAD_WARM_POOL_CONFIG.get("hourly_ewma_alpha")
+                self._hourly_busy[finished] = alpha * average + (1 - alpha) * self._hourly_busy[finished]
+            else:
+                self._hourly_busy[finished] = average
+                self._hourly_seen[finished] = True
+            self._hour_samples = []
+        self._current_hour = hour
+        self._hour_samples.append(busy)
+
+    def _hour_activity(self, hour: int) -> float:
+        """0..1, how busy this hour usually is compared to the busiest hour"""
+        peak = max(self._hourly_busy)
+        if peak <= 0:
+            return 0.0
+        return self._hourly_busy[hour] / peak
+
+    @staticmethod
+    async def _queue_demand() -> int:
+        """Queued downloads the queue worker will start right away"""
+        redis = RedisClient.get_client()
+        queued = await DownloadQueueManager.queued_count()
+        active = int(await redis.get(ACTIVE_COUNT_KEY) or 0)
+        return min(queued, max(0, MAX_CONCURRENT_DOWNLOADS - active))
+
+    @staticmethod
+    def _merge_demand() -> int:
+        lead = UPLOAD_WARM_POOL_CONFIG.get("merge_lead_seconds")
+        return sum(parts for eta, parts in get_merge_etas() if eta is not None and eta <= lead)
+
+    async def compute_target(self, hour: int) -> int:
+        try:
+            queue_demand = await self._queue_demand()
+        except Exception as e:
+            logger.debug(f"Warm pool could not read the download queue: {e}")
+            queue_demand = 0
+        merge_demand = self._merge_demand()
+        # Upcoming hour counts too, so the pool is warm when the evening peak starts
+        usual_load = max(self._hourly_busy[hour], self._hourly_busy[(hour + 1) % 24])
+        baseline = math.ceil(max(0.0, usual_load - UPLOAD_SCHEDULER.active_reservations()))
+
+        target = min(
+            merge_demand + queue_demand + baseline,
+            UPLOAD_WARM_POOL_CONFIG.get("max_warm_clients"),
+            len(UPLOAD_ACCOUNT_POOL)
+        )
+        if target != self.target:
+            logger.info(f"🔥 Warm pool target {self.target} → {target} "
+                        f"(merges finishing: {merge_demand}, queue: {queue_demand}, usual load: {usual_load:.1f})")
+        self.target = target
+        return target
+
+    def idle_timeout(self, hour: int) -> float:
+        min_idle = UPLOAD_WARM_POOL_CONFIG.get("min_idle_seconds")
+        max_idle = UPLOAD_WARM_POOL_CONFIG.get("max_idle_seconds")
+        if self.target > 0:
+            return max_idle
+        return min_idle + (max_idle - min_idle) * self._hour_activity(hour)
+
+    # --- client management ---
+
+    async def _warm(self, accounts: list):
+        for account in accounts:
+            if account.client is not None or account.is_quarantined():
+                continue
+            if UPLOAD_SCHEDULER.active_reservations(account.session_name):
+                continue  # an upload picked it meanwhile and starts the client itself
+            try:
+                started = time.monotonic()
+                # Not a checkout: last_used stays as the last upload left it, so the idle stop isn't postponed
+                client = await account.ensure_client_ready(checkout=False)
+            except AllProxiesExhaustedError:
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ [{account.session_name}] Warm-up failed: {e}")
+                continue
+            if client is not None:
+                logger.info(f"🔥 [{account.session_name}] Client pre-connected in {time.monotonic() - started:.1f}s")
+
+    async def _stop_idle(self, timeout: float):
+        now = time.time()
+        for account in UPLOAD_ACCOUNT_POOL:
+            if account.client is None or account.session_name in self._warm_names:
+                continue
+            if UPLOAD_SCHEDULER.active_reservations(account.session_name):
+                continue  # long uploads don't touch last_used
+            if now - account.last_used > timeout:
+                logger.info(f"💤 [{account.session_name}] Stopping client idle for {now - account.last_used:.0f}s "
+                            f"(timeout {timeout:.0f}s)")
+                await account.stop_client()
+
+    async def run_once(self):
+        hour = datetime.now(LOCAL_TZ).hour
+        self._observe_load(hour, UPLOAD_SCHEDULER.active_reservations())
+
+        target = await self.compute_target(hour)
+        warm_accounts = UPLOAD_SCHEDULER.idle_accounts()[:target]
+        self._warm_names = {acc.session_name for acc in warm_accounts}
+
+        await self._stop_idle(self.idle_timeout(hour))
+        await self._warm(warm_accounts)
+
+    async def worker(self):
+        interval = UPLOAD_WARM_POOL_CONFIG.get("interval_seconds")
+        logger.info(f"🔥 Upload client warm pool started (every {interval}s, "
+                    f"at most {UPLOAD_WARM_POOL_CONFIG.get('max_warm_clients')} warm clients)")
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Warm pool iteration failed: {e}")
+            await asyncio.sleep(interval)
+
+
+UPLOAD_WARM_POOL = UploadClientWarmPool()
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from backend.video_redirector.config import UPLOAD_HEALTH_CONFIG
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+HEALTH_KEY = "upload_health:{session_name}"   # hash: per-proxy cooldowns/blacklist/counters + quarantine
+LEASE_KEY = "upload_lease:{session_name}"     # zset: lease_id -> expiry (ms, Redis clock)
+
+# Leases are scored with the Redis server clock so every worker agrees on expiry
+_ACQUIRE_LEASE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local force = tonumber(ARGV[4])
+if force == 1 or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[1]), ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[1]) * 2)
+    return 1
+end
+return 0
+"""
+
+_RENEW_LEASE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local renewed = 0
+for i = 2, #ARGV do
+    renewed = renewed + redis.call('ZADD', KEYS[1], 'XX', 'CH', now + tonumber(ARGV[1]), ARGV[i])
+end
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[1]) * 2)
+return renewed
+"""
+
+# Publishes one worker's state without losing what others published since it read: deadlines and
+# blacklist times keep the later value, counters are this worker's, cleared counters are removed.
+# ARGV: ttl seconds, number of max-merged pairs, number of overwritten pairs, the pairs, fields to delete
+_MERGE_HEALTH_LUA = """
+local n_max = tonumber(ARGV[2])
+local n_set = tonumber(ARGV[3])
+local i = 4
+for _ = 1, n_max do
+    local current = tonumber(redis.call('HGET', KEYS[1], ARGV[i]))
+    if not current or current < tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    i = i + 2
+end
+for _ = 1, n_set do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+for j = i, #ARGV do
+    redis.call('HDEL', KEYS[1], ARGV[j])
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[1]))
+end
+return 1
+"""
+
+COUNTER_PREFIXES = ("consecutive_failures:", "strikes:")
+
+
+def _proxy_key(proxy_info: dict) -> str:
+    # Keyed by address, not pool index, so editing upload_accounts.json can't move state to another proxy
+    return f"{proxy_info['ip']}:{proxy_info['port']}"
+
+
+class UploadHealthStore:
+    """
+    Redis-backed proxy/account health shared by every backend worker and kept across deploys.
+
+    UploadAccount keeps working on its in-memory fields (the local read cache). Mutations mark
+    the account dirty; sync_worker() pushes dirty accounts and pulls everyone else's changes.
+    Merging is conservative: blacklists are a union and cooldown/quarantine deadlines take the max,
+    also on the Redis side, where a Lua script merges a worker's state into the hash atomically.
+
+    Account reservations are Redis leases (Lua acquire/renew/release with TTL), so two workers
+    never book the same account and a crashed worker's reservations expire on their own.
+    If Redis is unavailable everything degrades to the previous process-local behaviour.
+    """
+
+    def __init__(self):
+        self._dirty: set = set()
+        self._dirty_lock = threading.Lock()
+        self._accounts: Dict[str, object] = {}
+        self._held_leases: Dict[str, List[str]] = {}
+        self._acquire_script = None
+        self._renew_script = None
+        self._merge_script = None
+
+    # --- health state ---
+
+    def mark_dirty(self, session_name: str):
+        """Thread-safe; may be called from Pyrogram callbacks"""
+        with self._dirty_lock:
+            self._dirty.add(session_name)
+
+    def _take_dirty(self) -> set:
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    @staticmethod
+    def snapshot(account) -> Dict[str, str]:
+        now = time.time()
+        fields: Dict[str, str] = {}
+        for idx, proxy_info in enumerate(account.proxy_pool):
+            key = _proxy_key(proxy_info)
+            if idx in account.blacklisted_proxies:
+                fields[f"blacklist:{key}"] = str(account.blacklisted_at.get(idx, now))
+            until = account.proxy_cooldowns.get(idx)
+            if until and until > now:
+                fields[f"cooldown:{key}"] = str(until)
+            if account.proxy_consecutive_failures.get(idx):
+                fields[f"consecutive_failures:{key}"] = str(account.proxy_consecutive_failures[idx])
+            if account.proxy_threshold_strikes.get(idx):
+                fields[f"strikes:{key}"] = str(account.proxy_threshold_strikes[idx])
+        if account.quarantine_until > now:
+            fields["quarantine_until"] = str(account.quarantine_until)
+        return fields
+
+    @staticmethod
+    def merge_args(account, fields: Dict[str, str]) -> list:
+        """ARGV of _MERGE_HEALTH_LUA (after the TTL) for publishing this snapshot of the account"""
+        maxed = [(field, value) for field, value in fields.items() if not field.startswith(COUNTER_PREFIXES)]
+        counters = [(field, value) for field, value in fields.items() if field.startswith(COUNTER_PREFIXES)]
+        cleared = [f"{prefix}{_proxy_key(proxy_info)}" for proxy_info in account.proxy_pool for prefix in COUNTER_PREFIXES]
+        cleared = [field for field in cleared if field not in fields]
+        return [len(maxed), len(counters), *(x for pair in maxed + counters for x in pair), *cleared]
+
+    @staticmethod
+    def _drop_expired(account, now: float, blacklist_ttl: float):
+        """Local blacklists and cooldowns that ran out, so they aren't published again"""
+        for idx in [i for i in account.blacklisted_proxies if now - account.blacklisted_at.get(i, now) >= blacklist_ttl]:
+            account.blacklisted_proxies.discard(idx)
+            account.blacklisted_at.pop(idx, None)
+            logger.info(f"🟢 [{account.session_name}] Blacklist of proxy {idx} expired")
+        for idx in [i for i, until in account.proxy_cooldowns.items() if until <= now]:
+            account.proxy_cooldowns.pop(idx, None)
+
+    @classmethod
+    def apply(cls, account, fields: Dict[str, str], overwrite_counters: bool):
+        """Merge remote state into the account's in-memory fields"""
+        now = time.time()
+        blacklist_ttl = UPLOAD_HEALTH_CONFIG.get("blacklist_ttl_hours") * 3600
+        cls._drop_expired(account, now, blacklist_ttl)
+        for idx, proxy_info in enumerate(account.proxy_pool):
+            key = _proxy_key(proxy_info)
+
+            blacklisted_at = fields.get(f"blacklist:{key}")
+            if blacklisted_at and now - float(blacklisted_at) < blacklist_ttl:
+                if idx not in account.blacklisted_proxies:
+                    logger.info(f"🔴 [{account.session_name}] Proxy {key} blacklisted by shared health state")
+                account.blacklisted_proxies.add(idx)
+                account.blacklisted_at[idx] = float(blacklisted_at)
+                account.proxy_cooldowns.pop(idx, None)
+                continue
+
+            cooldown_until = fields.get(f"cooldown:{key}")
+            if cooldown_until and float(cooldown_until) > now:
+                account.proxy_cooldowns[idx] = max(float(cooldown_until), account.proxy_cooldowns.get(idx, 0))
+
+            if overwrite_counters:
+                account.proxy_consecutive_failures[idx] = int(fields.get(f"consecutive_failures:{key}", 0))
+                account.proxy_threshold_strikes[idx] = int(fields.get(f"strikes:{key}", 0))
+
+        quarantine_until = fields.get("quarantine_until")
+        if quarantine_until:
+            account.quarantine_until = max(account.quarantine_until, float(quarantine_until))
+
+    async def load_all(self, accounts: Iterable):
+        """Hydrate accounts from Redis at startup so a restart remembers bad proxies"""
+        self._accounts = {acc.session_name: acc for acc in accounts}
+        try:
+            redis = RedisClient.get_client()
+            pipe = redis.pipeline(transaction=False)
+            for name in self._accounts:
+                pipe.hgetall(HEALTH_KEY.format(session_name=name))
+            results = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load shared upload health state, starting fresh: {e}")
+            return
+        restored = 0
+        for (name, account), fields in zip(self._accounts.items(), results):
+            if fields:
+                self.apply(account, fields, overwrite_counters=True)
+                restored += 1
+        logger.info(f"🩺 Restored shared health state for {restored}/{len(self._accounts)} upload accounts")
+
+    async def sync_once(self):
+        redis = RedisClient.get_client()
+        dirty = self._take_dirty()
+        names = list(self._accounts)
+
+        pipe = redis.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(HEALTH_KEY.format(session_name=name))
+        remote = dict(zip(names, await pipe.execute()))
+
+        ttl_seconds = UPLOAD_HEALTH_CONFIG.get("state_ttl_hours") * 3600
+        if self._merge_script is None:
+            self._merge_script = redis.register_script(_MERGE_HEALTH_LUA)
+        pipe = redis.pipeline(transaction=False)
+        for name in names:
+            account = self._accounts[name]
+            if name in dirty:
+                # Take in other workers' blacklists/cooldowns, then merge ours into Redis atomically:
+                # whatever they published after our read is kept by the script, not overwritten
+                self.apply(account, remote.get(name) or {}, overwrite_counters=False)
+                args = self.merge_args(account, self.snapshot(account))
+                await self._merge_script(keys=[HEALTH_KEY.format(session_name=name)], args=[ttl_seconds, *args], client=pipe)
+            elif remote.get(name):
+                self.apply(account, remote[name], overwrite_counters=True)
+        await pipe.execute()
+
+    async def sync_worker(self):
+        interval = UPLOAD_HEALTH_CONFIG.get("sync_interval_seconds")
+        renew_every = max(1, UPLOAD_HEALTH_CONFIG.get("lease_ttl_seconds") // 3)
+        last_renew = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.warning(f"⚠️ Upload health sync failed: {e}")
+            if time.monotonic() - last_renew >= renew_every:
+                last_renew = time.monotonic()
+                await self.renew_leases()
+
+    # --- reservations ---
+
+    async def acquire_lease(self, session_name: str, max_concurrent: int, force: bool = False) -> Optional[str]:
+        """Returns a lease id, or None if another worker holds all of this account's slots"""
+        lease_id = uuid.uuid4().hex
+        try:
+            redis = RedisClient.get_client()
+            if self._acquire_script is None:
+                self._acquire_script = redis.register_script(_ACQUIRE_LEASE_LUA)
+            granted = await self._acquire_script(
+                keys=[LEASE_KEY.format(session_name=session_name)],
+                args=[UPLOAD_HEALTH_CONFIG.get("lease_ttl_seconds") * 1000, max_concurrent, lease_id, 1 if force else 0]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ [{session_name}] Lease acquire failed, continuing with local reservation only: {e}")
+            granted = 1
+        if not granted:
+            return None
+        self._held_leases.setdefault(session_name, []).append(lease_id)
+        return lease_id
+
+    async def release_lease(self, session_name: str):
+        leases = self._held_leases.get(session_name)
+        if not leases:
+            return
+        lease_id = leases.pop()
+        try:
+            await RedisClient.get_client().zrem(LEASE_KEY.format(session_name=session_name), lease_id)
+        except Exception as e:
+            logger.warning(f"⚠️ [{session_name}] Lease release failed (it will expire on its own): {e}")
+
+    def release_lease_soon(self, session_name: str):
+        """For sync callers: release the lease on the running loop"""
+        try:
+            asyncio.get_running_loop().create_task(self.release_lease(session_name))
+        except RuntimeError:
+            logger.debug(f"[{session_name}] No running loop to release lease, it will expire on its own")
+
+    async def release_all_leases(self):
+        """On shutdown, so a restarted worker doesn't wait for its own stale leases to expire"""
+        for session_name, leases in list(self._held_leases.items()):
+            while leases:
+                await self.release_lease(session_name)
+
+    async def renew_leases(self):
+        if not any(self._held_leases.values()):
+            return
+        try:
+            redis = RedisClient.get_client()
+            if self._renew_script is None:
+                self._renew_script = redis.register_script(_RENEW_LEASE_LUA)
+            ttl_ms = UPLOAD_HEALTH_CONFIG.get("lease_ttl_seconds") * 1000
+            for session_name, leases in list(self._held_leases.items()):
+                if leases:
+                    await self._renew_script(keys=[LEASE_KEY.format(session_name=session_name)], args=[ttl_ms, *leases])
+        except Exception as e:
+            logger.warning(f"⚠️ Lease renewal failed: {e}")
+
+
+UPLOAD_HEALTH_STORE = UploadHealthStore()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from backend.video_redirector.utils.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "download:{parent_task_id}:upload_progress"  # hash: {file_task_id}:part{n} -> percent
+PROGRESS_TTL_SECONDS = 3600
+FLUSH_INTERVAL_MS = 500
+FORGET_AFTER_SECONDS = 3600  # drop local entries of downloads nobody updated for this long
+
+
+class UploadProgressAggregator:
+    """
+    In-memory table of per-part upload progress.
+
+    Pyrogram progress callbacks (often on executor threads) only touch a dict under a
+    threading.Lock. One flusher coroutine writes every changed download to Redis in a single
+    pipeline every FLUSH_INTERVAL_MS, and the status endpoint reads min/avg straight from here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress: Dict[str, Dict[str, int]] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._dirty: set = set()
+
+    def update(self, parent_task_id: str, file_task_id: str, part_num: int, percent: int):
+        field = f"{file_task_id}:part{part_num}"
+        percent = min(max(int(percent), 0), 100)
+        with self._lock:
+            parts = self._progress.setdefault(parent_task_id, {})
+            if parts.get(field) == percent:
+                return
+            parts[field] = percent
+            self._updated_at[parent_task_id] = time.time()
+            self._dirty.add(parent_task_id)
+
+    @staticmethod
+    def summarize(progress_map: Dict[str, object]) -> Optional[Dict[str, int]]:
+        percents = []
+        for value in progress_map.values():
+            try:
+                percents.append(min(max(int(value), 0), 100))
+            except (TypeError, ValueError):
+                continue
+        if not percents:
+            return None
+        return {
+            "min": min(percents),
+            "avg": round(sum(percents) / len(percents)),
+            "parts": len(percents),
+        }
+
+    def summary(self, parent_task_id: str) -> Optional[Dict[str, int]]:
+        """Slowest and average percent of a download's parts, or None if this process has no data"""
+        with self._lock:
+            parts = dict(self._progress.get(parent_task_id, {}))
+        return self.summarize(parts) if parts else None
+
+    async def get_summary(self, parent_task_id: str) -> Optional[Dict[str, int]]:
+        """Local table first; Redis when the upload runs in another worker process"""
+        local = self.summary(parent_task_id)
+        if local is not None:
+            return local
+        progress_map = await RedisClient.get_client().hgetall(PROGRESS_KEY.format(parent_task_id=parent_task_id))
+        return self.summarize(progress_map) if progress_map else None
+
+    async def flush_once(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            batch = {parent: dict(self._progress.get(parent, {})) for parent in dirty}
+            cutoff = time.time() - FORGET_AFTER_SECONDS
+            for parent, updated_at in list(self._updated_at.items()):
+                if updated_at < cutoff and parent not in dirty:
+                    self._progress.pop(parent, None)
+                    self._updated_at.pop(parent, None)
+        if not batch:
+            return
+
+        redis = RedisClient.get_client()
+        pipe = redis.pipeline(transaction=False)
+        for parent, fields in batch.items():
+            if not fields:
+                continue
+            key = PROGRESS_KEY.format(parent_task_id=parent)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, PROGRESS_TTL_SECONDS)
+        try:
+            await pipe.execute()
+        except Exception:
+            # Retry these downloads on the next tick
+            with self._lock:
+                self._dirty.update(batch.keys())
+            raise
+
+    async def flush_worker(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush_once()
+            except Exception as e:
+                logger.debug(f"Upload progress flush failed: {e}")
+
+
+UPLOAD_PROGRESS = UploadProgressAggregator()
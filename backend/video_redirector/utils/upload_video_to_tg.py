@@ -19,6 +19,7 @@ from backend.video_redirector.utils.pyrogram_acc_manager import (
     release_account_reservation,
     register_upload_start,
     register_upload_end,
+    plan_part_count,
     AllProxiesExhaustedError
 )
 from backend.video_redirector.utils.rate_limit_monitor import (
@@ -27,14 +28,16 @@ from backend.video_redirector.utils.rate_limit_monitor import (
     reset_network_failures_for_account
 )
 from backend.video_redirector.db.crud_upload_accounts import update_last_error
-from backend.video_redirector.utils.redis_client import RedisClient
-
-# Store reference to the main event loop to schedule cross-thread coroutines
-_MAIN_EVENT_LOOP: asyncio.AbstractEventLoop | None = None
-
-def set_main_event_loop(loop: asyncio.AbstractEventLoop) -> None:
-    global _MAIN_EVENT_LOOP
-    _MAIN_EVENT_LOOP = loop
+from backend.video_redirector.utils.upload_progress_aggregator import UPLOAD_PROGRESS
+from backend.video_redirector.utils.bandwidth_governor import BANDWIDTH_GOVERNOR
+from backend.video_redirector.utils.content_hash_index import (
+    ffmpeg_hash_output_args,
+    find_uploaded_duplicate,
+    remember_uploaded_content,
+    remove_hash_sidecar,
+    verify_content_hash
+)
+from backend.video_redirector.config import MAX_PARTS_PER_DELIVERY, MIN_UPLOAD_PART_MB
 
 logger = logging.getLogger(__name__)
 load_dotenv()
@@ -70,76 +73,90 @@ _upload_stats = {
 # Progress logging throttle state
 _progress_last_log_ts: dict[str, float] = {}
 
-async def _persist_upload_progress(parent_task_id: str, file_task_id: str, part_num: int, percent: int, current: int, total: int) -> None:
-    """Persist per-file/part upload progress to Redis without impacting the upload flow.
-
-    Key: download:{parent_task_id}:upload_progress (hash)
-    Field: {file_task_id}:part{part_num} -> percent (0..100)
-    """
-    try:
-        redis = RedisClient.get_client()
-        key = f"download:{parent_task_id}:upload_progress"
-        field = f"{file_task_id}:part{part_num}"
-        # Store percent as integer string
-        await redis.hset(key, field, int(percent))
-        # Ensure the key expires eventually
-        await redis.expire(key, 3600)
-        try:
-            logger.debug(f"[{parent_task_id}] progress persisted: {field}={percent}% ({current}/{total})")
-        except Exception:
-            pass
-    except Exception:
-        # Never let progress persistence break upload
-        pass
-
-def _upload_progress_logger(current: int, total: int, task_id: str, part_num: int, file_size: int):
+# Bytes already reported per upload, so the bandwidth governor is charged only for new ones
+_progress_last_bytes: dict[str, int] = {}
+
+# Last (timestamp, bytes) per upload used to turn progress callbacks into proxy speed samples
+_progress_rate_samples: dict[str, tuple[float, int]] = {}
+PROGRESS_SPEED_SAMPLE_SECONDS = 5
+PROGRESS_SPEED_SAMPLE_WEIGHT = 0.25  # a 5s window is noisier than a whole upload
+
+def _record_progress_speed(key: str, now: float, current: int, total: int, account, proxy_index):
+    """Feed the proxy's speed EWMA from progress callbacks so slow proxies show up mid-upload"""
+    if account is None:
+        return
+    previous = _progress_rate_samples.get(key)
+    if previous is None:
+        _progress_rate_samples[key] = (now, current)
+        return
+    last_ts, last_bytes = previous
+    if now - last_ts >= PROGRESS_SPEED_SAMPLE_SECONDS and current > last_bytes:
+        mbps = ((current - last_bytes) * 8 / (1024 * 1024)) / (now - last_ts)
+        account.record_proxy_throughput(proxy_index, mbps, weight=PROGRESS_SPEED_SAMPLE_WEIGHT)
+        _progress_rate_samples[key] = (now, current)
+    if current == total:
+        _progress_rate_samples.pop(key, None)
+
+def _upload_progress_logger(current: int, total: int, task_id: str, part_num: int, file_size: int,
+                            account=None, proxy_index: int | None = None):
     """Synchronous progress callback for Pyrogram send_video.
     Throttled to log about once per second.
     """
     try:
         now = time.time()
         key = f"{task_id}:{part_num}"
+        try:
+            _record_progress_speed(key, now, current, total, account, proxy_index)
+        except Exception:
+            pass
+        percent = int((current / total) * 100) if total else 0
+
+        # In-memory, thread-safe; UPLOAD_PROGRESS flushes to Redis in batches for frontend polling
+        # Parent task id is the portion before optional _fileX suffix
+        parent_task_id = task_id.split("_file")[0] if "_file" in task_id else task_id
+        UPLOAD_PROGRESS.update(parent_task_id, task_id, part_num, percent)
+
         last = _progress_last_log_ts.get(key, 0.0)
         if now - last >= 1.0 or current == total:
-            percent = int((current / total) * 100) if total else 0
             logger.debug(f"[{task_id}] [Part {part_num}] Upload progress: {percent}% ({current}/{total} bytes)")
             _progress_last_log_ts[key] = now
-
-            # Also persist to Redis for frontend polling (best-effort, fire-and-forget)
-            try:
-                # Parent task id is the portion before optional _fileX suffix
-                parent_task_id = task_id.split("_file")[0] if "_file" in task_id else task_id
-                # Try current loop first (if in coroutine context)
-                loop: asyncio.AbstractEventLoop | None = None
-                try:
-                    loop = asyncio.get_running_loop()
-                except RuntimeError:
-                    # Progress callback may run in a worker thread. Use main loop if available.
-                    loop = _MAIN_EVENT_LOOP
-                if loop is not None:
-                    loop.create_task(_persist_upload_progress(parent_task_id, task_id, part_num, percent, current, total))
-                else:
-                    # As a last resort, write synchronously using redis asyncio client (will still be awaited via loop run)
-                    # We cannot await here; skip to avoid blocking.
-                    pass
-            except Exception:
-                # Ignore any issues with scheduling persistence
-                pass
+        if current == total:
+            _progress_last_log_ts.pop(key, None)
     except Exception:
         # Never let progress logging break upload
         pass
 
+    # Pyrogram awaits this callback between chunks, so sleeping here paces the upload
+    try:
+        key = f"{task_id}:{part_num}"
+        sent = current - _progress_last_bytes.get(key, 0)
+        if current >= total:
+            _progress_last_bytes.pop(key, None)
+        else:
+            _progress_last_bytes[key] = current
+        BANDWIDTH_GOVERNOR.throttle_blocking("upload", sent)
+    except Exception:
+        pass
+
 # Create necessary directories
 os.makedirs(PARTS_DIR, exist_ok=True)
 
 async def log_upload_performance(task_id: str, file_size_mb: float, duration_seconds: float, 
-                                flood_wait_count: int, account_name: str, success: bool):
+                                flood_wait_count: int, account_name: str, success: bool,
+                                account=None, proxy_index: int | None = None,
+                                attempt_seconds: float | None = None):
     """
-    Log upload performance statistics for real movie uploads
+    Log upload performance statistics for real movie uploads.
+
+    When the account, proxy and the successful attempt's duration are given, the speed of
+    that attempt is recorded as a sample for the proxy's throughput EWMA.
     """
     global _upload_stats
     
     if success:
+        if account is not None and attempt_seconds and attempt_seconds > 0:
+            account.record_proxy_throughput(proxy_index, (file_size_mb * 8) / attempt_seconds)
+        
         # Update speed statistics
         _upload_stats["speed_stats"]["total_duration"] += duration_seconds
         _upload_stats["speed_stats"]["total_mb_uploaded"] += file_size_mb
@@ -242,17 +259,15 @@ async def check_system_resources() -> Dict[str, Any]:
 async def rotate_account_on_failure(task_id: str, db, current_account):
     """Rotate to a different account on failure"""
     try:
-        # Get a new account (already reserved by select_upload_account)
-        new_account_idx, new_account = await select_upload_account(db)
+        # Get a new account (already reserved by select_upload_account); don't wait for an idle one mid-upload
+        new_account_idx, new_account = await select_upload_account(
+            db, wait_seconds=0, exclude={current_account.session_name}
+        )
         
-        if new_account.session_name != current_account.session_name:
-            # Release the current account's reservation since we're switching
-            release_account_reservation(current_account.session_name)
-            logger.info(f"🔄 [{task_id}] Rotating from {current_account.session_name} to {new_account.session_name}")
-            return new_account
-        else:
-            logger.info(f"🔄 [{task_id}] Same account selected, no rotation needed")
-            return current_account
+        # Release the current account's reservation since we're switching
+        release_account_reservation(current_account.session_name)
+        logger.info(f"🔄 [{task_id}] Rotating from {current_account.session_name} to {new_account.session_name}")
+        return new_account
             
     except Exception as e:
         logger.error(f"❌ [{task_id}] Error rotating account: {e}")
@@ -263,23 +278,25 @@ async def rotate_account_on_proxy_exhaustion(task_id: str, db, current_account):
     try:
         logger.warning(f"🔄 [{task_id}] All proxies exhausted for {current_account.session_name}, attempting account rotation")
         
-        # Get a new account (already reserved by select_upload_account)
-        new_account_idx, new_account = await select_upload_account(db)
-        
-        if new_account.session_name != current_account.session_name:
-            logger.info(f"🔄 [{task_id}] Switched from {current_account.session_name} to {new_account.session_name} due to proxy exhaustion")
-            
-            # Release the current account's reservation since we're switching
-            release_account_reservation(current_account.session_name)
-            
-            # Reset rate limit events for the new account
-            from .pyrogram_acc_manager import reset_rate_limit_events_for_account
-            reset_rate_limit_events_for_account(new_account.session_name)
-            
-            return new_account
-        else:
+        # Get a new account (already reserved by select_upload_account); don't wait for an idle one mid-upload
+        try:
+            new_account_idx, new_account = await select_upload_account(
+                db, wait_seconds=0, exclude={current_account.session_name}
+            )
+        except Exception:
             logger.error(f"❌ [{task_id}] No alternative accounts available")
             return None
+        
+        logger.info(f"🔄 [{task_id}] Switched from {current_account.session_name} to {new_account.session_name} due to proxy exhaustion")
+        
+        # Release the current account's reservation since we're switching
+        release_account_reservation(current_account.session_name)
+        
+        # Reset rate limit events for the new account
+        from .pyrogram_acc_manager import reset_rate_limit_events_for_account
+        reset_rate_limit_events_for_account(new_account.session_name)
+        
+        return new_account
             
     except Exception as e:
         logger.error(f"❌ [{task_id}] Error rotating account on proxy exhaustion: {e}")
@@ -358,6 +375,9 @@ async def get_video_metadata_for_upload(file_path: str, task_id: str) -> Optiona
 async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: int, db, account, bot_username: str):
     """Upload a part with retry logic and comprehensive error handling.
 
+    Takes ownership of the `account` reservation: on rotation the old account is released
+    and the new one is held, and whichever account we end on is released when we return.
+
     Returns a tuple: (file_id or None, used_session_name)
     """
     
@@ -430,6 +450,7 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
                 logger.info(f"✅ [{task_id}] Client ready for {account.session_name}")
 
                 # Upload with timeout
+                upload_proxy_index = account.current_proxy_index
                 start_time = datetime.datetime.now()
                 logger.info(f"[{task_id}] [Part {part_num}] Starting upload at {start_time:%Y-%m-%d %H:%M:%S}")
 
@@ -441,7 +462,7 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
                     "disable_notification": True,
                     "supports_streaming": True,
                     "progress": _upload_progress_logger,
-                    "progress_args": (task_id, part_num, file_size)
+                    "progress_args": (task_id, part_num, file_size, account, upload_proxy_index)
                 }
 
                 # Add metadata if available
@@ -486,6 +507,7 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
                                 account._blacklist_proxy(pending_idx, reason)
                                 # Reset state after blacklisting
                                 account.proxy_threshold_strikes[pending_idx] = 0
+                                account.mark_health_dirty()
                                 account.pending_post_upload_cooldown_proxy_index = None
                                 # Stop client so future uploads cannot reuse the blacklisted proxy
                                 try:
@@ -513,6 +535,7 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
                             try:
                                 if account.current_proxy_index is not None:
                                     account.proxy_threshold_strikes[account.current_proxy_index] = 0
+                                    account.mark_health_dirty()
                             except Exception:
                                 pass
                     except Exception as post_cooldown_err:
@@ -526,7 +549,8 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
 
                     # Log performance statistics
                     total_duration = time.time() - upload_start_time
-                    await log_upload_performance(task_id, file_size_mb, total_duration, flood_wait_count, account.session_name, True)
+                    await log_upload_performance(task_id, file_size_mb, total_duration, flood_wait_count, account.session_name, True,
+                                                 account=account, proxy_index=upload_proxy_index, attempt_seconds=elapsed)
                     await get_upload_performance_summary()
                     return file_id, account.session_name
                 else:
@@ -700,6 +724,9 @@ async def upload_part_to_tg_with_retry(file_path: str, task_id: str, part_num: i
         # Clear current uploading account
         clear_current_uploading_account(task_id)
         
+        # Release the account we ended up on (rotations already released the previous ones)
+        release_account_reservation(account.session_name)
+        
         # Register upload end
         await register_upload_end(task_id)
 
@@ -755,15 +782,18 @@ async def split_video_by_duration(file_path: str, task_id: str, num_parts: int,
             ]
             
             # Only add duration for non-last parts
-            if not is_last_part:
-                cmd.extend(["-t", str(int(part_duration))])
+            duration = None if is_last_part else part_duration
+            if duration is not None:
+                cmd.extend(["-t", str(int(duration))])
             
             cmd.extend([
                 "-c", "copy",  # Just copy, no re-processing
                 "-avoid_negative_ts", "make_zero",
                 "-movflags", "+faststart",
                 "-y",
-                part_output
+                part_output,
+                # The hash output needs the part's -t too, output options don't carry over
+                *ffmpeg_hash_output_args(part_output, duration)
             ])
             
             if is_last_part:
@@ -797,6 +827,7 @@ async def split_video_by_duration(file_path: str, task_id: str, num_parts: int,
                         try:
                             if os.path.exists(cleanup_path):
                                 os.remove(cleanup_path)
+                                remove_hash_sidecar(cleanup_path)
                         except Exception as e:
                             logger.warning(f"⚠️ [{task_id}] Couldn't clean up {cleanup_path}: {e}")
                     
@@ -813,6 +844,7 @@ async def split_video_by_duration(file_path: str, task_id: str, num_parts: int,
                     return None
                 
                 logger.debug(f"✅ [{task_id}] Part {i+1} generated: {part_output} ({part_size / (1024*1024):.1f}MB) in {elapsed_time:.1f}s")
+                verify_content_hash(part_output, task_id)
                 
                 part_paths.append(part_output)
                 
@@ -834,12 +866,14 @@ async def split_video_by_duration(file_path: str, task_id: str, num_parts: int,
             try:
                 if os.path.exists(cleanup_path):
                     os.remove(cleanup_path)
+                    remove_hash_sidecar(cleanup_path)
             except Exception as cleanup_e:
                 logger.warning(f"⚠️ [{task_id}] Couldn't clean up {cleanup_path}: {cleanup_e}")
         
         return None
 
-async def check_size_upload_large_file(file_path: str, task_id: str, db, bot_config: dict):
+async def check_size_upload_large_file(file_path: str, task_id: str, db, bot_config: dict,
+                                       max_parts: int = MAX_PARTS_PER_DELIVERY, keep_file_on_failure: bool = False):
     """
     Upload a file to Telegram using the provided bot configuration.
     
@@ -848,6 +882,9 @@ async def check_size_upload_large_file(file_path: str, task_id: str, db, bot_con
         task_id: Unique task identifier
         db: Database session
         bot_config: Dictionary containing 'username' and 'token' keys for the delivery bot
+        max_parts: Most parts this file may be split into to use idle accounts in parallel
+                   (files above MAX_MB are always split as much as their size requires)
+        keep_file_on_failure: Leave the original file on disk when the upload fails, so the caller can retry it
     """
     if not file_path:
         logger.error(f"[{task_id}] File path is None or empty")
@@ -870,7 +907,6 @@ async def check_size_upload_large_file(file_path: str, task_id: str, db, bot_con
         raise Exception("Invalid bot configuration: missing username or token")
     
     parts_result = []
-    selected_account = None  # Track the selected account for permission management (single-part path)
     created_part_paths: list[str] = []  # Track generated split parts for cleanup on failure
 
     try:
@@ -882,196 +918,189 @@ async def check_size_upload_large_file(file_path: str, task_id: str, db, bot_con
             logger.error("No part number found.")
             raise Exception("No part number found.")
         
-        try:
-            # Single-part path: select and reserve one account and upload
-            if file_size_mb <= MAX_MB:
+        # Single-part path: select and reserve one account and upload (upload_part_to_tg releases it)
+        if file_size_mb <= MAX_MB:
+            file_id = await find_uploaded_duplicate(db, file_path, bot_token, task_id)
+            if file_id:
+                used_session = ""
+            else:
                 idx, account = await select_upload_account(db)
-                selected_account = account  # Store for reservation management
                 logger.info(f"[{task_id}] Selected account: {account.session_name}")
 
                 logger.info(f"[{task_id}] File is {round(file_size_mb)} MB — uploading as one part")
                 file_id, used_session = await upload_part_to_tg(file_path, task_id, 1, db, account, bot_username)
                 logger.info(f"✅ [{task_id}] Single-part upload complete. file_id: {file_id}")
+                await remember_uploaded_content(db, file_path, bot_token, file_id, task_id)
 
-                # Success cleanup: remove the uploaded file and per-task folder if applicable
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        logger.debug(f"[{task_id}] Cleaned uploaded file: {file_path}")
-                    parent_dir = os.path.dirname(file_path)
-                    # If YouTube used a per-task folder downloads/<task_id>, try to remove when empty
-                    if os.path.basename(parent_dir) == task_id and os.path.basename(os.path.dirname(parent_dir)) == 'downloads':
-                        try:
-                            if not os.listdir(parent_dir):
-                                os.rmdir(parent_dir)
-                                logger.debug(f"[{task_id}] Removed empty task directory: {parent_dir}")
-                        except Exception as _e:
-                            logger.debug(f"[{task_id}] Task folder cleanup skipped: {_e}")
-                except Exception as _e:
-                    logger.warning(f"[{task_id}] Single-part cleanup warning: {_e}")
+            # Success cleanup: remove the uploaded file and per-task folder if applicable
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    remove_hash_sidecar(file_path)
+                    logger.debug(f"[{task_id}] Cleaned uploaded file: {file_path}")
+                parent_dir = os.path.dirname(file_path)
+                # If YouTube used a per-task folder downloads/<task_id>, try to remove when empty
+                if os.path.basename(parent_dir) == task_id and os.path.basename(os.path.dirname(parent_dir)) == 'downloads':
+                    try:
+                        if not os.listdir(parent_dir):
+                            os.rmdir(parent_dir)
+                            logger.debug(f"[{task_id}] Removed empty task directory: {parent_dir}")
+                    except Exception as _e:
+                        logger.debug(f"[{task_id}] Task folder cleanup skipped: {_e}")
+            except Exception as _e:
+                logger.warning(f"[{task_id}] Single-part cleanup warning: {_e}")
 
-                return {
-                    "bot_token": bot_token,
-                    "parts": {part_num:[{"part": 0, "file_id": file_id}]},
-                    "session_name": used_session
-                }
+            return {
+                "bot_token": bot_token,
+                "parts": {part_num:[{"part": 0, "file_id": file_id}]},
+                "session_name": used_session
+            }
 
-            logger.debug(f"[{task_id}] File is {round(file_size_mb)} MB — splitting...")
+        logger.debug(f"[{task_id}] File is {round(file_size_mb)} MB — splitting...")
 
-            # Step 1: Get duration
-            try:
-                result = subprocess.run([
-                    "ffprobe", "-v", "error",
-                    "-show_entries", "format=duration",
-                    "-of", "default=noprint_wrappers=1:nokey=1",
-                    file_path
-                ], capture_output=True, text=True, check=True)
-                logger.debug(f"[{task_id}] ffprobe output: {result.stdout}")
-                logger.debug(f"[{task_id}] ffprobe errors: {result.stderr}")
-                if not result.stdout.strip():
-                    raise ValueError("FFprobe returned empty duration.")
-                duration = float(result.stdout.strip())
-                logger.debug(f"[{task_id}] Video duration: {duration:.2f} seconds ({duration/60:.1f} minutes)")
-                
-                # Validate duration
-                if duration <= 0:
-                    logger.error(f"❌ [{task_id}] Invalid video duration: {duration}")
-                    await notify_admin(f"❌ [Task {task_id}] Invalid video duration: {duration}")
-                    raise Exception(f"❌ [Task {task_id}] Invalid video duration: {duration}")
-                
-                if duration < 60:  # Less than 1 minute
-                    logger.warning(f"⚠️ [{task_id}] Very short video duration: {duration:.2f}s - this might be an error")
-            except Exception as ero:
-                logger.exception(f"[{task_id}] FFprobe failed")
-                await notify_admin(f"❌ [Task {task_id}] Failed to get video duration: {ero}")
-                raise Exception(f"❌ [Task {task_id}] Failed to get video duration: {ero}")
-
-            num_parts = math.ceil(file_size_mb / MAX_MB)
-            part_duration = duration / num_parts
+        # Step 1: Get duration
+        try:
+            result = subprocess.run([
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                file_path
+            ], capture_output=True, text=True, check=True)
+            logger.debug(f"[{task_id}] ffprobe output: {result.stdout}")
+            logger.debug(f"[{task_id}] ffprobe errors: {result.stderr}")
+            if not result.stdout.strip():
+                raise ValueError("FFprobe returned empty duration.")
+            duration = float(result.stdout.strip())
+            logger.debug(f"[{task_id}] Video duration: {duration:.2f} seconds ({duration/60:.1f} minutes)")
             
-            # Ensure each part has at least 10 seconds (to avoid very short parts)
-            min_part_duration = 10
-            if part_duration < min_part_duration:
-                logger.warning(f"⚠️ [{task_id}] Calculated part duration ({part_duration:.1f}s) is too short, adjusting...")
-                num_parts = max(1, int(duration / min_part_duration))
-                part_duration = duration / num_parts
-                logger.info(f"[{task_id}] Adjusted to {num_parts} parts, each ~{part_duration:.1f} seconds ({part_duration/60:.1f} minutes)")
+            # Validate duration
+            if duration <= 0:
+                logger.error(f"❌ [{task_id}] Invalid video duration: {duration}")
+                await notify_admin(f"❌ [Task {task_id}] Invalid video duration: {duration}")
+                raise Exception(f"❌ [Task {task_id}] Invalid video duration: {duration}")
             
-            logger.info(f"[{task_id}] Splitting into {num_parts} parts, each ~{part_duration:.1f} seconds ({part_duration/60:.1f} minutes)")
-
-            part_paths = await split_video_by_duration(file_path, task_id, num_parts, part_duration)
-            if not part_paths:
-                await notify_admin(f"❌ [Task {task_id}] Failed to split movie during ffmpeg slicing.")
-                raise Exception(f"❌ [Task {task_id}] Failed to split movie during ffmpeg slicing.")
-            created_part_paths = part_paths[:]
+            if duration < 60:  # Less than 1 minute
+                logger.warning(f"⚠️ [{task_id}] Very short video duration: {duration:.2f}s - this might be an error")
+        except Exception as ero:
+            logger.exception(f"[{task_id}] FFprobe failed")
+            await notify_admin(f"❌ [Task {task_id}] Failed to get video duration: {ero}")
+            raise Exception(f"❌ [Task {task_id}] Failed to get video duration: {ero}")
+
+        num_parts = plan_part_count(math.ceil(file_size_mb / MAX_MB), int(file_size_mb // MIN_UPLOAD_PART_MB), cap=max_parts)
+        part_duration = duration / num_parts
+        
+        # Ensure each part has at least 10 seconds (to avoid very short parts)
+        min_part_duration = 10
+        if part_duration < min_part_duration:
+            logger.warning(f"⚠️ [{task_id}] Calculated part duration ({part_duration:.1f}s) is too short, adjusting...")
+            num_parts = max(1, int(duration / min_part_duration))
+            part_duration = duration / num_parts
+            logger.info(f"[{task_id}] Adjusted to {num_parts} parts, each ~{part_duration:.1f} seconds ({part_duration/60:.1f} minutes)")
+        
+        logger.info(f"[{task_id}] Splitting into {num_parts} parts, each ~{part_duration:.1f} seconds ({part_duration/60:.1f} minutes)")
 
-            #TODO: AS I understand if video is splited into 3 parts and parts are bigger then 1900MB we split each of 3 video parts
-            # by 2 (so 6 parts total) (we can split more than by 2 if video parts are really big total video 21 GB, 3 parts 7 gb, each part splits into 4 pieces)
-            # and we will get here and this logic upload each part sequntially, so probably 3 parallel uploads each will sequentially upload 2 parts
-            # so all total 6 parts are uploaded (has not tested this scenario yet)
+        part_paths = await split_video_by_duration(file_path, task_id, num_parts, part_duration)
+        if not part_paths:
+            await notify_admin(f"❌ [Task {task_id}] Failed to split movie during ffmpeg slicing.")
+            raise Exception(f"❌ [Task {task_id}] Failed to split movie during ffmpeg slicing.")
+        created_part_paths = part_paths[:]
 
-            # Upload parts in parallel — select a separate account per part
-            used_sessions = set()
+        #TODO: AS I understand if video is splited into 3 parts and parts are bigger then 1900MB we split each of 3 video parts
+        # by 2 (so 6 parts total) (we can split more than by 2 if video parts are really big total video 21 GB, 3 parts 7 gb, each part splits into 4 pieces)
+        # and we will get here and this logic upload each part sequntially, so probably 3 parallel uploads each will sequentially upload 2 parts
+        # so all total 6 parts are uploaded (has not tested this scenario yet)
 
-            async def upload_one(idx: int, part_path: str):
-                reserved_account = None
-                try:
-                    # Create an isolated DB session for this task
-                    async with get_db() as local_db:
+        # Upload parts in parallel — select a separate account per part
+        used_sessions = set()
 
-                        # Reserve a separate account for this part
-                        _, reserved_account = await select_upload_account(local_db)
-                        used_sessions.add(reserved_account.session_name)
-
-                        file_id, used_session = await upload_part_to_tg(
-                            part_path, task_id, idx + 1, local_db, reserved_account, bot_username
-                        )
-                        return {"part": idx, "file_id": file_id, "used_session": used_session, "success": True}
-                except Exception as e:
-                    logger.exception(f"[{task_id}] Error uploading part {idx + 1}")
-                    return {"part": idx, "error": str(e), "success": False}
-                finally:
-                    # Release reservation for this part's account
-                    try:
-                        if reserved_account is not None:
-                            release_account_reservation(reserved_account.session_name)
-                    except Exception as release_err:
-                        logger.warning(f"[{task_id}] Error releasing reservation for part {idx + 1}: {release_err}")
-
-            tasks = [asyncio.create_task(upload_one(idx, p)) for idx, p in enumerate(part_paths or [])]
-            results = await asyncio.gather(*tasks)
-
-            failures = [r for r in results if not r.get("success")]
-            if failures:
-                first_err = failures[0].get("error", "Unknown error")
-                await notify_admin(f"❌ [Task {task_id}] Parallel upload failed for {len(failures)} part(s): {first_err}")
-                raise Exception(f"❌ [{task_id}] Some parts failed: {first_err}")
-
-            # Aggregate successful results in order
-            parts_result = [
-                {"part": r["part"], "file_id": r["file_id"]}
-                for r in sorted(results, key=lambda x: x["part"])
-            ]
+        async def upload_one(idx: int, part_path: str):
+            try:
+                # Create an isolated DB session for this task
+                async with get_db() as local_db:
+                    file_id = await find_uploaded_duplicate(local_db, part_path, bot_token, task_id)
+                    if file_id:
+                        return {"part": idx, "file_id": file_id, "used_session": "", "success": True}
+
+                    # Reserve a separate account for this part (released by upload_part_to_tg)
+                    _, reserved_account = await select_upload_account(local_db)
+
+                    file_id, used_session = await upload_part_to_tg(
+                        part_path, task_id, idx + 1, local_db, reserved_account, bot_username
+                    )
+                    used_sessions.add(used_session)
+                    await remember_uploaded_content(local_db, part_path, bot_token, file_id, task_id)
+                    return {"part": idx, "file_id": file_id, "used_session": used_session, "success": True}
+            except Exception as e:
+                logger.exception(f"[{task_id}] Error uploading part {idx + 1}")
+                return {"part": idx, "error": str(e), "success": False}
+
+        tasks = [asyncio.create_task(upload_one(idx, p)) for idx, p in enumerate(part_paths or [])]
+        results = await asyncio.gather(*tasks)
+
+        failures = [r for r in results if not r.get("success")]
+        if failures:
+            first_err = failures[0].get("error", "Unknown error")
+            await notify_admin(f"❌ [Task {task_id}] Parallel upload failed for {len(failures)} part(s): {first_err}")
+            raise Exception(f"❌ [{task_id}] Some parts failed: {first_err}")
+
+        # Aggregate successful results in order
+        parts_result = [
+            {"part": r["part"], "file_id": r["file_id"]}
+            for r in sorted(results, key=lambda x: x["part"])
+        ]
 
-            if len(parts_result) == num_parts:
-                # Success cleanup: original big file and generated split parts
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                except Exception as errr:
-                    logger.warning(f"[{task_id}] Couldn't clean up original movie file: {errr}")
-                for p in part_paths:
-                    try:
-                        if os.path.exists(p):
-                            os.remove(p)
-                    except Exception as _e:
-                        logger.warning(f"[{task_id}] Couldn't clean up split part {p}: {_e}")
-                logger.info(f"[{task_id}] Upload successful with bot: {bot_username}")
-                logger.debug(f"✅ [{task_id}] Multipart upload complete. {len(parts_result)} parts uploaded.")
-                # Use the first used session for reporting; actual parts may span multiple sessions
-                first_used_session = None
+        if len(parts_result) == num_parts:
+            # Success cleanup: original big file and generated split parts
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    remove_hash_sidecar(file_path)
+            except Exception as errr:
+                logger.warning(f"[{task_id}] Couldn't clean up original movie file: {errr}")
+            for p in part_paths:
                 try:
-                    first_used_session = next(iter(used_sessions))
-                except StopIteration:
-                    first_used_session = None
-                return {
-                    "bot_token": bot_token,
-                    "parts": {part_num: parts_result},
-                    "session_name": first_used_session or ""
-                }
-            else:
-                logger.error(f"[{task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
-                await notify_admin(f"❌ [Task {task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
-                raise Exception(f"❌ [Task {task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
-
-        finally:
-            # Release all reserved accounts used during this task
+                    if os.path.exists(p):
+                        os.remove(p)
+                        remove_hash_sidecar(p)
+                except Exception as _e:
+                    logger.warning(f"[{task_id}] Couldn't clean up split part {p}: {_e}")
+            logger.info(f"[{task_id}] Upload successful with bot: {bot_username}")
+            logger.debug(f"✅ [{task_id}] Multipart upload complete. {len(parts_result)} parts uploaded.")
+            # Use the first used session for reporting; actual parts may span multiple sessions
+            first_used_session = None
             try:
-                # Always release the initially selected account
-                if selected_account:
-                    release_account_reservation(selected_account.session_name)
-                # Also release any additional accounts used through rotation
-                for used_session in locals().get('used_sessions', set()):
-                    if not selected_account or used_session != selected_account.session_name:
-                        release_account_reservation(used_session)
-            except Exception as release_err:
-                logger.warning(f"[{task_id}] Error releasing account reservations: {release_err}")
+                first_used_session = next(iter(used_sessions))
+            except StopIteration:
+                first_used_session = None
+            return {
+                "bot_token": bot_token,
+                "parts": {part_num: parts_result},
+                "session_name": first_used_session or ""
+            }
+        else:
+            logger.error(f"[{task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
+            await notify_admin(f"❌ [Task {task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
+            raise Exception(f"❌ [Task {task_id}] Upload incomplete. Uploaded {len(parts_result)} of {num_parts} parts.")
 
     except Exception as e:
         logger.exception(f"[{task_id}] Critical error during upload")
         await notify_admin(f"🧨 Critical failure while handling {task_id}:\n{e}")
         # Failure cleanup: remove original file, split parts, and per-task dir if applicable
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as _e:
-            logger.debug(f"[{task_id}] Failure cleanup (file): {_e}")
         for p in created_part_paths:
             try:
                 if os.path.exists(p):
                     os.remove(p)
+                    remove_hash_sidecar(p)
             except Exception as _e:
                 logger.debug(f"[{task_id}] Failure cleanup (part): {p} {_e}")
+        if keep_file_on_failure:
+            raise Exception(f"🧨 Critical failure while handling {task_id}:\n{e}")
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                remove_hash_sidecar(file_path)
+        except Exception as _e:
+            logger.debug(f"[{task_id}] Failure cleanup (file): {_e}")
         try:
             parent_dir = os.path.dirname(file_path)
             if os.path.basename(parent_dir) == task_id and os.path.basename(os.path.dirname(parent_dir)) == 'downloads':
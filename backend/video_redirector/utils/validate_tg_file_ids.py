@@ -6,7 +6,7 @@ Telegram File ID Validation System
 1. Uses aiogram Bot like delivery bot
 2. Sends to admin chat for validation
 3. Only treats "wrong file identifier" as expired
-4. Uses same cleanup API as delivery bot
+4. Uses same cleanup API as delivery bot (which also starts repairing the expired title)
 5. Proper timing: 1-2 sec between parts, 5-7 sec between files
 
 """
@@ -316,8 +316,11 @@ class FileIDValidator:
                     logger.debug(f"🗑️ Successfully cleaned up file: {cleanup_result['message']}")
                     logger.debug(f"Deleted {cleanup_result['deleted_parts']} parts and file record: {cleanup_result['deleted_file']}")
                     expired_count += 1
+                    # The cleanup endpoint also starts repairing the title (cache re-upload or priority re-download)
+                    repair_note = (f" Repair {cleanup_result.get('repair_mode')} started: {cleanup_result.get('repair_task_id')}"
+                                   if cleanup_result.get('repairing') else "")
                     await notify_admin(f"Expired file cleaned up during validation. "
-                                     f"Deleted {cleanup_result['deleted_parts']} parts, file_id: {cleanup_result['downloaded_file_id']}")
+                                     f"Deleted {cleanup_result['deleted_parts']} parts, file_id: {cleanup_result['downloaded_file_id']}.{repair_note}")
                 else:
                     logger.error(f"❌ Failed to cleanup expired file ID through API")
                     error_count += 1
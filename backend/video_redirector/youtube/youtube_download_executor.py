@@ -12,9 +12,11 @@ from backend.video_redirector.db.crud_downloads import get_file_id
 from backend.video_redirector.hdrezka.hdrezka_download_executor import (
     process_parallel_uploads,
     consolidate_upload_results,
+    publish_download_result,
 )
 from backend.video_redirector.utils.notify_admin import notify_admin
 from backend.video_redirector.utils.redis_client import RedisClient
+from backend.video_redirector.utils.media_retention_cache import RETENTION_CACHE
 import re
 
 logger = logging.getLogger(__name__)
@@ -1394,6 +1396,9 @@ async def handle_youtube_download_task(task_id: str, video_url: str, tmdb_id: in
         logger.debug(f"[{task_id}] ✅ Status set to 'uploading' at {datetime.now().isoformat()}")
 
         # Upload using the shared HDRezka upload pipeline with delivery-bot rotation
+        # Keep a hard-linked copy for re-uploads after the file_id expires (committed once saved)
+        RETENTION_CACHE.stage(task_id, [output_path])
+
         try:
             upload_results = await process_parallel_uploads([output_path], task_id)
             consolidated = await consolidate_upload_results(upload_results, task_id)
@@ -1455,22 +1460,22 @@ async def handle_youtube_download_task(task_id: str, video_url: str, tmdb_id: in
                     session.add(DownloadedFilePart(
                         downloaded_file_id=db_id_to_get_parts,
                         part_number=part["part"],
-                        telegram_file_id=part["file_id"]
+                        telegram_file_id=part["file_id"],
+                        tg_bot_token_file_owner=part.get("bot_token")
                     ))
 
                 await session.commit()
 
+            RETENTION_CACHE.commit(task_id, tmdb_id, lang, dub, {
+                "quality": actual_quality or "unknown",
+                "movie_title": video_title,
+                "movie_poster": video_poster,
+                "movie_url": video_url,
+            })
+
             await redis.set(f"download:{task_id}:status", "done", ex=3600)
 
-            if len(parts) == 1:
-                await redis.set(f"download:{task_id}:result", json.dumps({
-                    "tg_bot_token_file_owner": tg_bot_token_file_owner,
-                    "telegram_file_id": parts[0]["file_id"]
-                }), ex=86400)
-            else:
-                await redis.set(f"download:{task_id}:result", json.dumps({
-                    "db_id_to_get_parts": db_id_to_get_parts,
-                }), ex=86400)
+            await publish_download_result(task_id, tg_bot_token_file_owner, parts, db_id_to_get_parts)
 
             logger.info(f"[{task_id}] YouTube download completed successfully")
 
@@ -1486,6 +1491,9 @@ async def handle_youtube_download_task(task_id: str, video_url: str, tmdb_id: in
         await notify_admin(f"[Download Task {task_id}] YouTube download failed: {e}")
         raise e
     finally:
+        # Staged cache files of a download that wasn't saved (no-op after a commit)
+        RETENTION_CACHE.discard(task_id)
+
         # Get the task-specific download directory for cleanup
         task_download_dir = get_task_download_dir(task_id)
         
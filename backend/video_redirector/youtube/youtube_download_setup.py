@@ -6,8 +6,10 @@ from fastapi.responses import JSONResponse
 from backend.video_redirector.utils.signed_token_manager import SignedTokenManager
 from backend.video_redirector.utils.redis_client import RedisClient
 from backend.video_redirector.hdrezka.hdrezka_download_setup import check_duplicate_download, get_user_download_limit
+from backend.video_redirector.hdrezka.hdrezka_download_executor import delivery_bot_username
 from backend.video_redirector.db.session import get_db
 from backend.video_redirector.db.crud_downloads import get_youtube_file_id, get_parts_for_downloaded_file
+from backend.video_redirector.utils.file_repair import get_active_repair, add_repair_waiter
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +49,7 @@ async def youtube_download_setup(data: str, sig: str):
                     "status": "already_exists",
                     "file_type": "single",
                     "tg_bot_token_file_owner": existing_file.tg_bot_token_file_owner,
+                    "delivery_bot_username": delivery_bot_username(existing_file.tg_bot_token_file_owner),
                     "telegram_file_id": file_parts[0].telegram_file_id,
                     "quality": existing_file.quality,
                     "movie_title": existing_file.movie_title or video_title
@@ -58,6 +61,7 @@ async def youtube_download_setup(data: str, sig: str):
                     "status": "already_exists", 
                     "file_type": "multi_part",
                     "db_id_to_get_parts": existing_file.id,
+                    "delivery_bot_username": delivery_bot_username(existing_file.tg_bot_token_file_owner),
                     "quality": existing_file.quality,
                     "movie_title": existing_file.movie_title or video_title
                 })
@@ -65,6 +69,12 @@ async def youtube_download_setup(data: str, sig: str):
 
     # --- Check for duplicate downloads ---
     is_duplicate = await check_duplicate_download(tg_user_id, tmdb_id, lang, dub)
+    if not is_duplicate:
+        # An expired copy is being repaired: deliver that one instead of downloading it twice
+        repair_task_id = await get_active_repair(tmdb_id, lang, dub)
+        if repair_task_id:
+            await add_repair_waiter(repair_task_id, tg_user_id)
+            is_duplicate = True
     if is_duplicate:
         return JSONResponse({
             "error": f"🎬 You're already downloading this video. Please wait for it to finish and you will enjoy content 🥰",
@@ -474,7 +474,8 @@ async def handle_hdrezka_link_input(message: types.Message):
                     "tg_user_id": user_id,
                     "movie_title": "Movie",
                     "movie_poster": None,
-                    "movie_url": link
+                    "movie_url": link,
+                    "delivery_bot_username": file.get("delivery_bot_username")
                 }), ex=3600)
 
                 emoji = "🇺🇦" if user_lang == 'uk' else ("🇺🇸" if user_lang == 'en' else "🎙")
@@ -751,12 +752,14 @@ async def handle_youtube_link_input(message: types.Message):
                         
                         # Create signed token with just the short token (much shorter)
                         signed_file_data = f"{short_token}_{hmac.new(backend_secret.encode(), short_token.encode(), hashlib.sha256).hexdigest()[:10]}"
-                        delivery_bot_link = f"https://t.me/{DELIVERY_BOT_USERNAME}?start=3_{signed_file_data}"
+                        delivery_bot_username = backend_response.get("delivery_bot_username") or DELIVERY_BOT_USERNAME
+                        delivery_bot_link = f"https://t.me/{delivery_bot_username}?start=3_{signed_file_data}"
                     else:
                         # Multi-part file - create DB access token
                         db_id = backend_response["db_id_to_get_parts"]
                         signed_db_id = f"{db_id}_{hmac.new(backend_secret.encode(), str(db_id).encode(), hashlib.sha256).hexdigest()[:10]}"
-                        delivery_bot_link = f"https://t.me/{DELIVERY_BOT_USERNAME}?start=1_{signed_db_id}"
+                        delivery_bot_username = backend_response.get("delivery_bot_username") or DELIVERY_BOT_USERNAME
+                        delivery_bot_link = f"https://t.me/{delivery_bot_username}?start=1_{signed_db_id}"
                     
                     # Analytics: CTA shown for delivery start (direct flow)
                     try:
@@ -809,7 +812,9 @@ async def handle_youtube_link_input(message: types.Message):
                 )
                 return
             signed_task_id = f"{task_id_str}_{hmac.new(backend_secret.encode(), task_id_str.encode(), hashlib.sha256).hexdigest()[:10]}"
-            delivery_bot_link = f"https://t.me/{DELIVERY_BOT_USERNAME}?start=1_{signed_task_id}"
+            # Open the delivery bot that owns the uploaded file (uploads are spread over several bots)
+            delivery_bot_username = result.get("delivery_bot_username") or DELIVERY_BOT_USERNAME
+            delivery_bot_link = f"https://t.me/{delivery_bot_username}?start=1_{signed_task_id}"
             # Analytics: CTA shown for delivery start (direct HDRezka)
             try:
                 from common.analytics.analytics import Analytics
@@ -122,7 +122,8 @@ async def watch_mirror_handler(query: types.CallbackQuery):
         task_id=task_id,
         status_url=STATUS_API_URL,
         loading_gif_msg=loading_gif_msg,
-        query=query
+        query=query,
+        cancel_url=EXTRACT_API_URL
     )
     if not config:
         # user interaction handled by poll_watch_until_ready
@@ -248,7 +249,8 @@ async def download_mirror_handler(query: types.CallbackQuery):
                 "tg_user_id": user_id,
                 "movie_title": movie_title,
                 "movie_poster": movie_poster,
-                "movie_url": movie_url
+                "movie_url": movie_url,
+                "delivery_bot_username": dub_dict.get("delivery_bot_username")
             }), ex=3600)
 
             emoji = "🇺🇦" if user_lang == 'uk' else ("🇺🇸" if user_lang == 'en' else "🎙")
@@ -481,7 +483,8 @@ async def fetch_dubs_handler(query: types.CallbackQuery):
                 "tg_user_id": user_id,
                 "movie_title": movie_title,
                 "movie_poster": movie_poster,
-                "movie_url": movie_url
+                "movie_url": movie_url,
+                "delivery_bot_username": dub_dict.get("delivery_bot_username")
             }), ex=3600)
 
             emoji = "🇺🇦" if (user_lang == 'uk' and 'no Ukrainian dubs' not in dubs_scrapper_result.get('message','')) else ("🇺🇸" if user_lang == 'en' else "🎙")
@@ -536,11 +539,14 @@ async def watch_downloaded_handler(query: types.CallbackQuery):
     if selected_data_json:
         selected_data = json.loads(selected_data_json)
         movie_title = selected_data.get("movie_title")
+        delivery_bot_username = selected_data.get("delivery_bot_username") or DELIVERY_BOT_USERNAME
     else:
         movie_title = "movie"  # fallback
+        delivery_bot_username = DELIVERY_BOT_USERNAME
 
     signed = f"{token}_{hmac.new(os.getenv('BACKEND_DOWNLOAD_SECRET').encode(), token.encode(), hashlib.sha256).hexdigest()[:10]}"  # type: ignore
-    delivery_bot_link = f"https://t.me/{DELIVERY_BOT_USERNAME}?start=2_{signed}"
+    # The bot that owns the parts has to send them, so the link opens that one
+    delivery_bot_link = f"https://t.me/{delivery_bot_username}?start=2_{signed}"
 
     if query is not None and getattr(query, 'bot', None) is not None:
         await query.bot.send_message(
@@ -724,7 +730,9 @@ async def select_dub_handler(query: types.CallbackQuery):
 
         if result:
             signed_task_id = f"{task_id}_{hmac.new(os.getenv('BACKEND_DOWNLOAD_SECRET').encode(), task_id.encode(), hashlib.sha256).hexdigest()[:10]}"  # type: ignore
-            delivery_bot_link = f"https://t.me/{DELIVERY_BOT_USERNAME}?start=1_{signed_task_id}"
+            # Open the delivery bot that owns the uploaded file (uploads are spread over several bots)
+            delivery_bot_username = result.get("delivery_bot_username") or DELIVERY_BOT_USERNAME
+            delivery_bot_link = f"https://t.me/{delivery_bot_username}?start=1_{signed_task_id}"
             if query.message is not None:
                 await query.message.answer(
                     gettext(MOVIE_READY_START_DELIVERY_BOT).format(movie_title=movie_title),
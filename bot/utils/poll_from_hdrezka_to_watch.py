@@ -20,9 +20,11 @@ async def poll_watch_until_ready(
     loading_gif_msg,
     query,
     max_attempts: int = 150, #300 secs
-    poll_interval: float = 2.0) -> dict | None:
+    poll_interval: float = 2.0,
+    cancel_url: str | None = None) -> dict | None:
     """
     Polls a background task status endpoint until completion or failure.
+    On timeout the backend job is cancelled through cancel_url, so it stops holding a browser.
 
     Returns:
         dict with "config" on success, or None if error/timeout.
@@ -90,10 +92,19 @@ async def poll_watch_until_ready(
             return None
 
         elif attempt % 15 == 0 and attempt > 0:
-            logger.info(f"[{user_id}] Extraction still running after {attempt * poll_interval:.0f}s")
+            queue_position = status_data.get("queue_position")
+            logger.info(f"[{user_id}] Extraction still running after {attempt * poll_interval:.0f}s"
+                        + (f", queue position {queue_position}" if queue_position else ""))
             await query.message.answer(gettext(POLL_STILL_WORKING_WAIT))
 
     logger.error(f"[{user_id}] Timed out after {max_attempts * poll_interval:.0f}s – no success or failure.")
+    if cancel_url:
+        try:
+            async with ClientSession() as session:
+                async with session.post(f"{cancel_url}/{task_id}/cancel") as resp:
+                    logger.info(f"[{user_id}] Cancelled abandoned extraction {task_id}: {await resp.json()}")
+        except Exception as e:
+            logger.warning(f"[{user_id}] Failed to cancel extraction {task_id}: {e}")
     keyboard = get_main_menu_keyboard()
 
     await loading_gif_msg.delete()
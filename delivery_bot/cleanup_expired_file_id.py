@@ -4,15 +4,19 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("delivery_bot")
 
-async def clean_up_expired_file_id(telegram_file_id: str):
+async def clean_up_expired_file_id(telegram_file_id: str, tg_user_id: int | None = None, user_lang: str | None = None,
+                                   delivery_bot_id: int | None = None):
     """
-    Call the backend API to clean up expired Telegram file ID
+    Call the backend API to clean up expired Telegram file ID.
+    The backend starts repairing the title and, when tg_user_id is given, queues it for that user once ready;
+    it is sent through delivery_bot_id, the bot the user was talking to.
     """
     try:
         async with aiohttp.ClientSession() as session:
             async with session.post(
                 "https://moviebot.click/cleanup-expired-file",
-                json={"telegram_file_id": telegram_file_id}
+                json={"telegram_file_id": telegram_file_id, "tg_user_id": tg_user_id, "user_lang": user_lang,
+                      "delivery_bot_id": delivery_bot_id}
             ) as resp:
                 if resp.status == 200:
                     cleanup_result = await resp.json()
@@ -67,6 +67,11 @@ TEXTS = {
         'video_not_ready': '😭 The video is not ready yet or the link expired. Please, tap"📥 Download" again, it will work 😇',
         'enjoy_content': 'Enjoy your content❤️',
         'video_expired_retry': '😭 This video has expired. Please, tap"📥 Download" again, it will work 😇',
+        'video_repairing': '⏳ This video has expired, but I am already getting it back. I will send it to you right here as soon as it is ready 😇',
+        'video_repaired': '🎉 Your video is back! Enjoy your content❤️',
+        'video_repair_failed': '😭 I could not get this video back. Please, tap "📥 Download" again, it will work 😇',
+        'video_repaired_open_bot': '🎉 Your video is back! It is waiting for you in my other bot, open it here: {link}',
+        'open_owner_bot': '📦 This video is stored in my other bot. Open it here and it will send it to you: {link}',
         'could_not_give_full_movie': '😭 I could not give you all content. Please, tap "📥 Download" again, it will work 😇',
         'delivery_error': '😭 An error occurred while delivering your video. Please, tap "📥 Download" again, it will work 😇',
         'malformed_watch_link': '😭 Malformed watch link. Please, tap "📥 Download" again, it will work 😇',
@@ -92,6 +97,11 @@ TEXTS = {
         'video_not_ready': '😭 Видео еще не готово или ссылка истекла. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
         'enjoy_content': 'Наслаждайтесь контентом❤️',
         'video_expired_retry': '😭 Это видео истекло. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
+        'video_repairing': '⏳ Это видео истекло, но я уже восстанавливаю его. Я пришлю его вам сюда, как только оно будет готово 😇',
+        'video_repaired': '🎉 Ваше видео снова доступно! Приятного просмотра❤️',
+        'video_repair_failed': '😭 Не получилось восстановить это видео. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
+        'video_repaired_open_bot': '🎉 Ваше видео снова доступно! Оно ждёт вас в моём другом боте, откройте его здесь: {link}',
+        'open_owner_bot': '📦 Это видео хранится в моём другом боте. Откройте его здесь, и он пришлёт вам видео: {link}',
         'could_not_give_full_movie': '😭 Я не смогла дать вам весь контент. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
         'delivery_error': '😭 Произошла ошибка при доставке вашего видео. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
         'malformed_watch_link': '😭 Неправильная ссылка для просмотра. Пожалуйста, нажмите "📥 Скачать" снова, это сработает 😇',
@@ -117,6 +127,11 @@ TEXTS = {
         'video_not_ready': '😭 Відео ще не готове або посилання втрачене. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
         'enjoy_content': 'Насолоджуйтесь контентом❤️',
         'video_expired_retry': '😭 Це відео втрачене. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
+        'video_repairing': '⏳ Це відео втрачене, але я вже відновлюю його. Я надішлю його вам сюди, щойно воно буде готове 😇',
+        'video_repaired': '🎉 Ваше відео знову доступне! Приємного перегляду❤️',
+        'video_repair_failed': '😭 Не вдалося відновити це відео. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
+        'video_repaired_open_bot': '🎉 Ваше відео знову доступне! Воно чекає на вас у моєму іншому боті, відкрийте його тут: {link}',
+        'open_owner_bot': '📦 Це відео зберігається в моєму іншому боті. Відкрийте його тут, і він надішле вам відео: {link}',
         'could_not_give_full_movie': '😭 Я не змогла дати вам весь контент. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
         'delivery_error': '😭 Сталася помилка при доставці вашого відео. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
         'malformed_watch_link': '😭 Неправильне посилання для перегляду. Будь ласка, натисніть "📥 Завантажити" знову, це спрацює 😇',
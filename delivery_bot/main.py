@@ -4,12 +4,13 @@ import logging
 import hmac
 import hashlib
 import aiohttp
+from uuid import uuid4
 from urllib.parse import quote
 from aiogram import Bot, Dispatcher
-from aiogram.types import Message
+from aiogram.types import Message, InputMediaVideo
 from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from redis.asyncio import Redis
 from dotenv import load_dotenv
 from aiogram.client.default import DefaultBotProperties
@@ -40,6 +41,111 @@ dp = Dispatcher()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("delivery_bot")
 
+# Same file the backend uploads with, the repo is mounted at /app
+DELIVERY_BOTS_CONFIG = os.getenv("DELIVERY_BOTS_CONFIG", "/app/backend/video_redirector/utils/delivery_bots.json")
+
+
+def load_delivery_bot_tokens() -> list:
+    """Tokens of every delivery bot in delivery_bots.json; only the main bot if the file can't be read"""
+    try:
+        with open(DELIVERY_BOTS_CONFIG, 'r', encoding='utf-8') as f:
+            bots_config = json.load(f)
+        tokens = [entry["token"] for entry in bots_config if isinstance(entry, dict) and entry.get("token")]
+    except Exception as e:
+        logger.warning(f"⚠️ Can't read {DELIVERY_BOTS_CONFIG} ({e}), running the main delivery bot only")
+        tokens = []
+    return [BOT_TOKEN] + [token for token in dict.fromkeys(tokens) if token != BOT_TOKEN]
+
+
+# Uploads are spread over all delivery bots and a file_id only works through the bot that owns it,
+# so every bot is polled here; a file goes out through its owner only if the user has started that bot
+_owner_bots: dict = {BOT_TOKEN: bot}
+for _token in load_delivery_bot_tokens():
+    if _token not in _owner_bots:
+        _owner_bots[_token] = Bot(
+            token=_token,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+
+
+def bot_for_owner(owner_token):
+    if not owner_token or owner_token == BOT_TOKEN:
+        return bot
+    if owner_token not in _owner_bots:
+        _owner_bots[owner_token] = Bot(
+            token=owner_token,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+    return _owner_bots[owner_token]
+
+
+DELIVERY_BOT_STARTED_KEY = "delivery_bots:started:{tg_user_id}"  # ids of the delivery bots the user started, the backend uploads to those first
+
+
+@dp.message.outer_middleware()
+async def remember_started_bot(handler, message: Message, data: dict):
+    """Telegram only lets a bot message users who started it, so remember which delivery bots each user has"""
+    user_id = getattr(message.from_user, "id", None)
+    if user_id:
+        try:
+            await redis.sadd(DELIVERY_BOT_STARTED_KEY.format(tg_user_id=user_id), data["bot"].id)
+        except Exception as e:
+            logger.warning(f"⚠️ Couldn't remember the delivery bot user {user_id} talks to: {e}")
+    return await handler(message, data)
+
+
+async def bot_for_user(user_id: int, delivery_bot_id=None) -> Bot:
+    """The delivery bot to talk to this user through: the one they last used, else any they started"""
+    bots_by_id = {b.id: b for b in _owner_bots.values()}
+    if delivery_bot_id and int(delivery_bot_id) in bots_by_id:
+        return bots_by_id[int(delivery_bot_id)]
+    for bot_id in await redis.smembers(DELIVERY_BOT_STARTED_KEY.format(tg_user_id=user_id)):
+        if int(bot_id) in bots_by_id:
+            return bots_by_id[int(bot_id)]
+    return bot
+
+
+async def senders_for_parts(parts: list, user_id: int, user_bot: Bot, default_owner_token=None):
+    """
+    Owner token -> bot to send its files to this user through, and the owners the user can't get files from.
+
+    A file_id only works through the bot that uploaded it: that is the bot the user is talking to, or another
+    one they started. Owners they never started can't message them at all.
+    """
+    started = await redis.smembers(DELIVERY_BOT_STARTED_KEY.format(tg_user_id=user_id))
+    senders, unreachable = {}, []
+    for part in parts:
+        owner = part.get("tg_bot_token_file_owner") or default_owner_token
+        if owner in senders or owner in unreachable:
+            continue
+        owner_bot = bot_for_owner(owner)
+        if owner_bot.id == user_bot.id:
+            senders[owner] = user_bot
+        elif str(owner_bot.id) in started:
+            senders[owner] = owner_bot
+        else:
+            unreachable.append(owner)
+    return senders, unreachable
+
+
+async def owner_bot_link(owner_token, start_args: str) -> str:
+    owner = await bot_for_owner(owner_token).me()
+    return f"https://t.me/{owner.username}?start={start_args}"
+
+
+async def redirect_to_owner_bot(message: Message, owner_token, start_args: str, user_lang):
+    """The file lives on a delivery bot the user never started; send them to it with the same start link"""
+    link = await owner_bot_link(owner_token, start_args)
+    logger.info(f"User {message.from_user.id} hasn't started the bot that owns their file, sent them to {link}")
+    await message.answer(get_text('open_owner_bot', user_lang).format(link=link))
+
+
+def expired_text_key(cleanup_result, default_key: str) -> str:
+    """The backend repairs expired titles after cleanup and the repair worker below delivers them"""
+    if cleanup_result and cleanup_result.get("repairing"):
+        return 'video_repairing'
+    return default_key
+
 _delivery_analytics_dispatcher = None
 try:
     from common.analytics.daily_analytics_dispatcher import DailyAnalyticsDispatcher
@@ -86,6 +192,162 @@ async def notify_admin(message: str):
     except Exception as e:
         logger.warning(f"⚠️ Failed to notify admin: {e}")
 
+REPAIR_NOTIFICATIONS_KEY = "repair:notifications"  # pushed by the backend when an expired title was repaired
+MEDIA_GROUP_MAX_ITEMS = 10  # Telegram limit for sendMediaGroup
+
+
+def album_chunks(parts: list, default_owner_token=None) -> list:
+    """Parts in part_number order, split into albums of one owner bot and at most MEDIA_GROUP_MAX_ITEMS videos"""
+    chunks = []
+    for part in sorted(parts, key=lambda p: p.get("part_number") or 0):
+        owner = part.get("tg_bot_token_file_owner") or default_owner_token
+        if chunks and chunks[-1][0] == owner and len(chunks[-1][1]) < MEDIA_GROUP_MAX_ITEMS:
+            chunks[-1][1].append(part)
+        else:
+            chunks.append((owner, [part]))
+    return chunks
+
+
+async def send_parts_as_albums(user_id: int, parts: list, send_single, senders: dict, default_owner_token=None,
+                               on_sent=None) -> bool:
+    """
+    Send a multi-part title as albums instead of one send_video per part, each album through senders[owner].
+
+    An album Telegram rejects (an expired file_id in it, a flood wait, a forbidden chat) is re-sent part by part through
+    `send_single(part)`, which handles expired ids like before and returns False to stop the delivery.
+    `on_sent(part, message)` is called for every part that went out in an album.
+    Returns False if send_single stopped the delivery.
+    """
+    for owner, chunk in album_chunks(parts, default_owner_token):
+        if len(chunk) > 1:
+            try:
+                messages = await senders[owner].send_media_group(
+                    chat_id=user_id,
+                    media=[InputMediaVideo(media=part["telegram_file_id"]) for part in chunk]
+                )
+                if on_sent:
+                    for part, msg in zip(chunk, messages):
+                        await on_sent(part, msg)
+                continue
+            except TelegramRetryAfter as e:
+                logger.warning(f"Album of {len(chunk)} parts hit flood wait for user {user_id}, sending them one by one in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                logger.warning(f"Album of {len(chunk)} parts rejected for user {user_id} ({e}), sending them one by one")
+            except TelegramForbiddenError as e:
+                logger.warning(f"Album of {len(chunk)} parts refused for user {user_id} ({e}), sending them one by one")
+        for part in chunk:
+            if not await send_single(part):
+                return False
+    return True
+
+
+async def persist_refreshed_file_id(part: dict, msg):
+    """Telegram may answer a send with a new file_id for the same video; keep the backend in sync"""
+    try:
+        new_id = getattr(getattr(msg, "video", None), "file_id", None)
+        if new_id and new_id != part["telegram_file_id"]:
+            old_id = part["telegram_file_id"]
+            logger.info(f"🔄 TG returned new file_id for user send: {old_id[:16]}... → {new_id[:16]}...")
+            # Secure backend update
+            async with aiohttp.ClientSession() as session:
+                await session.post(
+                    "https://moviebot.click/update-file-id",
+                    json={"old_telegram_file_id": old_id, "new_telegram_file_id": new_id}
+                )
+            # Also update local structure for subsequent loops
+            part["telegram_file_id"] = new_id
+    except Exception as _e:
+        logger.warning(f"⚠️ Failed to persist refreshed id after user send: {_e}")
+
+
+async def repaired_title_link(user_id: int, tmdb_id, lang: str, dub: str, owner_token):
+    """Watch link (flow 2) that opens the owner bot of a repaired title the user can't get from their bot"""
+    if not TASK_ID_SECRET:
+        return None
+    watch_token = uuid4().hex[:12]
+    await redis.set(f"downloaded_dub_info:{watch_token}", json.dumps({
+        "tmdb_id": tmdb_id,
+        "lang": lang,
+        "dub": dub,
+        "tg_user_id": user_id,
+    }), ex=86400)
+    sig = hmac.new(TASK_ID_SECRET.encode(), watch_token.encode(), hashlib.sha256).hexdigest()[:10]
+    return await owner_bot_link(owner_token, f"2_{watch_token}_{sig}")
+
+
+async def deliver_repaired_title(notification: dict):
+    user_id = int(notification["tg_user_id"])
+    user_lang = notification.get("user_lang")
+    user_bot = await bot_for_user(user_id, notification.get("delivery_bot_id"))
+    if not notification.get("success"):
+        await user_bot.send_message(chat_id=user_id, text=get_text('video_repair_failed', user_lang))
+        return
+
+    tmdb_id, lang, dub = notification["tmdb_id"], notification["lang"], notification["dub"]
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+                f"https://moviebot.click/all_movie_parts?tmdb_id={tmdb_id}&lang={lang}&dub={quote(dub)}"
+        ) as resp:
+            if resp.status != 200:
+                logger.error(f"Repaired title not found for user {user_id}: tmdb_id={tmdb_id}, lang={lang}, dub={dub}, status={resp.status}")
+                await user_bot.send_message(chat_id=user_id, text=get_text('video_repair_failed', user_lang))
+                return
+            data = await resp.json()
+
+    parts = data.get("parts", [])
+    senders, unreachable = await senders_for_parts(parts, user_id, user_bot)
+    if unreachable:
+        link = await repaired_title_link(user_id, tmdb_id, lang, dub, unreachable[0])
+        if not link:
+            logger.error("TASK_ID_SECRET is not set, can't link the repaired title's bot")
+            await user_bot.send_message(chat_id=user_id, text=get_text('video_repair_failed', user_lang))
+            return
+        await user_bot.send_message(chat_id=user_id, text=get_text('video_repaired_open_bot', user_lang).format(link=link))
+        logger.info(f"Repaired title tmdb_id={tmdb_id} {lang}/{dub} is on a bot user {user_id} hasn't started, sent them its link")
+        return
+    await user_bot.send_message(chat_id=user_id, text=get_text('video_repaired', user_lang))
+
+    async def send_single(part) -> bool:
+        await senders[part.get("tg_bot_token_file_owner")].send_video(chat_id=user_id, video=part["telegram_file_id"])
+        return True
+
+    await send_parts_as_albums(user_id, parts, send_single, senders)
+    logger.info(f"Delivered repaired title tmdb_id={tmdb_id} {lang}/{dub} to user {user_id}")
+
+
+async def repair_notification_worker():
+    logger.info("🛠️ Repair notification worker started")
+    while True:
+        try:
+            item = await redis.blpop(REPAIR_NOTIFICATIONS_KEY, timeout=5)
+            if not item:
+                continue
+            notification = json.loads(item[1])
+            try:
+                await deliver_repaired_title(notification)
+            except Exception as e:
+                logger.error(f"Failed to deliver repaired title to user {notification.get('tg_user_id')}: {e}")
+                await notify_admin(f"❌ Failed to deliver repaired title to user {notification.get('tg_user_id')}: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Repair notification worker error: {e}")
+            await asyncio.sleep(5)
+
+
+_repair_worker_task = None
+
+@dp.startup.register
+async def _start_repair_worker(*_args, **_kwargs):
+    global _repair_worker_task
+    _repair_worker_task = asyncio.create_task(repair_notification_worker())
+
+@dp.shutdown.register
+async def _stop_repair_worker(*_args, **_kwargs):
+    if _repair_worker_task:
+        _repair_worker_task.cancel()
+
 def verify_task_id(signed: str, secret: str) -> str | None:
     try:
         task_id, sig = signed.split("_")
@@ -189,14 +451,20 @@ async def handle_start(message: Message):
                 logger.info(f"Parsed result for user {user_id}: {result}")
 
                 if "telegram_file_id" in result:
+                    owner = result.get("tg_bot_token_file_owner")
+                    senders, unreachable = await senders_for_parts([{"tg_bot_token_file_owner": owner}], user_id, message.bot)
+                    if unreachable:
+                        await redirect_to_owner_bot(message, owner, args, user_lang)
+                        return
                     await message.answer(get_text('enjoy_content', user_lang))
                     try:
-                        await bot.send_video(chat_id=user_id, video=result["telegram_file_id"])
+                        await senders[owner].send_video(chat_id=user_id, video=result["telegram_file_id"])
                     except TelegramBadRequest as e:
                         if "wrong file identifier" in str(e).lower():
                             logger.warning(f"Expired file ID detected for user {user_id}: {result['telegram_file_id']}")
-                            await clean_up_expired_file_id(result["telegram_file_id"])
-                            await message.answer(get_text('video_expired_retry', user_lang))
+                            cleanup_result = await clean_up_expired_file_id(result["telegram_file_id"], user_id, user_lang,
+                                                                            message.bot.id)
+                            await message.answer(get_text(expired_text_key(cleanup_result, 'video_expired_retry'), user_lang))
                             await notify_admin(f"Expired file ID cleaned up for user {user_id}, task_id: {task_id}")
                         else:
                             raise e
@@ -216,32 +484,45 @@ async def handle_start(message: Message):
                                 raise Exception("Failed to retrieve multipart file info from backend")
                             data = await resp.json()
                     parts = data.get("parts", [])
+                    default_owner = result.get("tg_bot_token_file_owner")
+                    senders, unreachable = await senders_for_parts(parts, user_id, message.bot, default_owner)
+                    if unreachable:
+                        await redirect_to_owner_bot(message, unreachable[0], args, user_lang)
+                        return
                     logger.info(f"Sending {len(parts)} parts to user {user_id}")
                     
                     expired_parts = []
-                    for part in parts:
+                    cleanup_result = None
+
+                    async def send_single(part) -> bool:
+                        nonlocal cleanup_result
                         try:
-                            await bot.send_video(chat_id=user_id, video=part["telegram_file_id"])
+                            part_bot = senders[part.get("tg_bot_token_file_owner") or default_owner]
+                            await part_bot.send_video(chat_id=user_id, video=part["telegram_file_id"])
                         except TelegramBadRequest as e:
                             if "wrong file identifier" in str(e).lower():
                                 logger.warning(f"Expired file ID detected in multipart for user {user_id}: {part['telegram_file_id']}")
                                 expired_parts.append(part["telegram_file_id"])
                                 
-                                # Clean up expired file and break loop if successful
-                                cleanup_result = await clean_up_expired_file_id(part["telegram_file_id"])
+                                # Clean up expired file and stop if successful
+                                cleanup_result = await clean_up_expired_file_id(part["telegram_file_id"], user_id, user_lang,
+                                                                                message.bot.id)
                                 if cleanup_result and cleanup_result.get('success') == True:
                                     logger.info(f"Successfully cleaned up file: {cleanup_result['message']}")
                                     logger.info(f"Deleted {cleanup_result['deleted_parts']} parts and file record: {cleanup_result['deleted_file']}")
                                     await notify_admin(f"Expired file cleaned up for user {user_id}, task_id: {task_id}. "
                                                      f"Deleted {cleanup_result['deleted_parts']} parts, file_id: {cleanup_result['downloaded_file_id']}")
-                                    break  # Exit loop since all parts for this file are now deleted
+                                    return False  # All parts for this file are now deleted
                                 else:
                                     logger.error(f"Failed to cleanup expired file ID: {part['telegram_file_id']}")
                             else:
                                 raise e
+                        return True
+
+                    await send_parts_as_albums(user_id, parts, send_single, senders, default_owner_token=default_owner)
                     
                     if expired_parts:
-                        await message.answer(get_text('could_not_give_full_movie', user_lang))
+                        await message.answer(get_text(expired_text_key(cleanup_result, 'could_not_give_full_movie'), user_lang))
                     else:
                         await message.answer(get_text('enjoy_content', user_lang))
                 else:
@@ -315,28 +596,22 @@ async def handle_start(message: Message):
                             raise Exception("Failed to fetch movie parts")
                         data = await resp.json()
                 parts = data.get("parts", [])
+                senders, unreachable = await senders_for_parts(parts, user_id, message.bot)
+                if unreachable:
+                    await redirect_to_owner_bot(message, unreachable[0], args, user_lang)
+                    return
                 logger.info(f"Sending {len(parts)} parts to user {user_id}")
                 
                 expired_parts = []
-                for part in parts:
+                cleanup_result = None
+
+                async def send_single(part) -> bool:
+                    nonlocal cleanup_result
+                    part_bot = senders[part.get("tg_bot_token_file_owner")]
                     try:
-                        msg = await bot.send_video(chat_id=user_id, video=part["telegram_file_id"]) 
+                        msg = await part_bot.send_video(chat_id=user_id, video=part["telegram_file_id"]) 
                         # Persist refreshed ID if Telegram returns a new one
-                        try:
-                            new_id = getattr(getattr(msg, "video", None), "file_id", None)
-                            if new_id and new_id != part["telegram_file_id"]:
-                                old_id = part["telegram_file_id"]
-                                logger.info(f"🔄 TG returned new file_id for user send: {old_id[:16]}... → {new_id[:16]}...")
-                                # Secure backend update
-                                async with aiohttp.ClientSession() as session:
-                                    await session.post(
-                                        "https://moviebot.click/update-file-id",
-                                        json={"old_telegram_file_id": old_id, "new_telegram_file_id": new_id}
-                                    )
-                                # Also update local structure for subsequent loops
-                                part["telegram_file_id"] = new_id
-                        except Exception as _e:
-                            logger.warning(f"⚠️ Failed to persist refreshed id after user send: {_e}")
+                        await persist_refreshed_file_id(part, msg)
                     except TelegramBadRequest as e:
                         if "wrong file identifier" in str(e).lower():
                             logger.warning(f"Expired file ID detected in watch flow for user {user_id}: {part['telegram_file_id']}")
@@ -350,7 +625,7 @@ async def handle_start(message: Message):
                             refreshed = False
                             if admin_chat:
                                 try:
-                                    admin_msg = await bot.send_video(chat_id=admin_chat, video=old_id, disable_notification=True)
+                                    admin_msg = await part_bot.send_video(chat_id=admin_chat, video=old_id, disable_notification=True)
                                     new_id = getattr(getattr(admin_msg, "video", None), "file_id", None)
                                     if new_id and new_id != old_id:
                                         logger.info(f"🔄 Refresh succeeded via admin send: {old_id[:16]}... → {new_id[:16]}...")
@@ -368,27 +643,30 @@ async def handle_start(message: Message):
                             # If refreshed, retry once to user
                             if refreshed:
                                 try:
-                                    await bot.send_video(chat_id=user_id, video=part["telegram_file_id"]) 
-                                    continue
+                                    await part_bot.send_video(chat_id=user_id, video=part["telegram_file_id"]) 
+                                    return True
                                 except TelegramBadRequest as _e2:
                                     logger.warning(f"Retry after refresh still failed for user {user_id}: {_e2}")
 
                             expired_parts.append(old_id)
-                            # Clean up expired file and break loop if successful
-                            cleanup_result = await clean_up_expired_file_id(old_id)
+                            # Clean up expired file and stop if successful
+                            cleanup_result = await clean_up_expired_file_id(old_id, user_id, user_lang, message.bot.id)
                             if cleanup_result and cleanup_result.get('success') == True:
                                 logger.info(f"Successfully cleaned up file: {cleanup_result['message']}")
                                 logger.info(f"Deleted {cleanup_result['deleted_parts']} parts and file record: {cleanup_result['deleted_file']}")
                                 await notify_admin(f"Expired file cleaned up for user {user_id}, watch_token: {watch_token}. "
                                                  f"Deleted {cleanup_result['deleted_parts']} parts, file_id: {cleanup_result['downloaded_file_id']}")
-                                break
+                                return False
                             else:
                                 logger.error(f"Failed to cleanup expired file ID: {old_id}")
                         else:
                             raise e
+                    return True
+
+                await send_parts_as_albums(user_id, parts, send_single, senders, on_sent=persist_refreshed_file_id)
                 
                 if expired_parts:
-                    await message.answer(get_text('could_not_give_full_movie', user_lang))
+                    await message.answer(get_text(expired_text_key(cleanup_result, 'could_not_give_full_movie'), user_lang))
                 else:
                     await message.answer(get_text('enjoy_content', user_lang))
 
@@ -431,9 +709,14 @@ async def handle_start(message: Message):
                 logger.info(f"Retrieved file data for user {user_id}: {file_data}")
                 
                 # Send the video directly
+                owner = file_data.get("tg_bot_token_file_owner")
+                senders, unreachable = await senders_for_parts([{"tg_bot_token_file_owner": owner}], user_id, message.bot)
+                if unreachable:
+                    await redirect_to_owner_bot(message, owner, args, user_lang)
+                    return
                 await message.answer(get_text('enjoy_content', user_lang))
                 try:
-                    await bot.send_video(
+                    await senders[owner].send_video(
                         chat_id=user_id, 
                         video=file_data["telegram_file_id"]
                     )
@@ -441,8 +724,9 @@ async def handle_start(message: Message):
                 except TelegramBadRequest as e:
                     if "wrong file identifier" in str(e).lower():
                         logger.warning(f"Expired file ID detected for user {user_id}: {file_data['telegram_file_id']}")
-                        await clean_up_expired_file_id(file_data["telegram_file_id"])
-                        await message.answer(get_text('video_expired_retry', user_lang))
+                        cleanup_result = await clean_up_expired_file_id(file_data["telegram_file_id"], user_id, user_lang,
+                                                                        message.bot.id)
+                        await message.answer(get_text(expired_text_key(cleanup_result, 'video_expired_retry'), user_lang))
                         await notify_admin(f"Expired YouTube file ID cleaned up for user {user_id}")
                     else:
                         raise e
@@ -477,4 +761,5 @@ async def handle_start_no_deep_link(message: Message):
 # === Run the bot ===
 if __name__ == "__main__":
     import asyncio
-    asyncio.run(dp.start_polling(bot))
+    logger.info(f"Polling {len(_owner_bots)} delivery bot(s)")
+    asyncio.run(dp.start_polling(*_owner_bots.values()))